@@ -4,5 +4,8 @@ set -o errexit
 
 pip install -r requirements.txt
 
+# Deploy version shared by every worker (part of the page ETags, see core_config/settings.py)
+echo "${RENDER_GIT_COMMIT:-$(git rev-parse HEAD 2>/dev/null || date +%s)}" > .version_despliegue
+
 python manage.py collectstatic --no-input
 python manage.py migrate
\ No newline at end of file
@@ -3,6 +3,27 @@ ASGI config for core_config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Servida así, el alta y la edición de productos usan las vistas asíncronas
+(ventas/views.py): mientras esperan a S3 y a Rekognition el worker atiende
+otras peticiones, en lugar de quedar bloqueado como un worker síncrono de
+gunicorn. El resto de vistas siguen siendo síncronas y Django las ejecuta en
+un hilo.
+
+Despliegue con gunicorn gestionando workers de uvicorn (comando de inicio en
+Render, en lugar de "gunicorn core_config.wsgi"):
+
+    gunicorn core_config.asgi:application -k uvicorn_worker.UvicornWorker --workers 2
+
+La clase de worker es del paquete uvicorn-worker (en requirements.txt): la de
+uvicorn.workers está obsoleta desde uvicorn 0.30.
+
+o solo con uvicorn:
+
+    uvicorn core_config.asgi:application --host 0.0.0.0 --port $PORT --workers 2
+
+Con ASGI no hay conexiones persistentes a la base de datos (ver settings.py).
+El comando benchmark_subidas compara el rendimiento de las dos variantes.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +33,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core_config.settings')
+os.environ.setdefault('VENTAS_ASGI', '1')
 
 application = get_asgi_application()
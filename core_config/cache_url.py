@@ -0,0 +1,47 @@
+"""
+Convierte una URL (variable de entorno CACHE_URL) en la configuración de CACHES,
+del mismo modo que dj_database_url hace con DATABASE_URL.
+
+    locmem://[nombre]            memoria local del proceso (por defecto y en pruebas)
+    file:///ruta/al/directorio   caché en disco compartida por los workers de la máquina
+    redis://host:6379/0          Redis o compatible (requiere el paquete 'redis')
+    rediss://...                 igual, con TLS
+    dummy://                     sin caché
+
+Parámetros opcionales en la query: ?timeout=300&prefijo=ventas&max_entradas=10000
+"""
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def parse(url, timeout=300):
+    partes = urlsplit(url)
+    if partes.scheme not in BACKENDS:
+        raise ImproperlyConfigured(f'Esquema de CACHE_URL no soportado: {partes.scheme!r}')
+
+    config = {'BACKEND': BACKENDS[partes.scheme], 'TIMEOUT': timeout}
+    if partes.scheme == 'locmem':
+        config['LOCATION'] = partes.netloc or 'default'
+    elif partes.scheme == 'file':
+        config['LOCATION'] = partes.path
+    elif partes.scheme in ('redis', 'rediss'):
+        # Redis recibe la URL completa, sin los parámetros propios.
+        config['LOCATION'] = partes._replace(query='').geturl()
+
+    parametros = parse_qs(partes.query)
+    if 'timeout' in parametros:
+        config['TIMEOUT'] = int(parametros['timeout'][0])
+    if 'prefijo' in parametros:
+        config['KEY_PREFIX'] = parametros['prefijo'][0]
+    if 'max_entradas' in parametros:
+        config['OPTIONS'] = {'MAX_ENTRIES': int(parametros['max_entradas'][0])}
+    return config
@@ -0,0 +1,75 @@
+// Selectores con autocompletado (ver CampoAutocompletar en ventas/forms.py).
+// El <select> llega solo con la opción elegida; encima se añade un buscador
+// que, al escribir, pide las opciones que coinciden al endpoint JSON indicado
+// en data-autocompletar y las pone en el <select>.
+(function () {
+  const ESPERA_MS = 200;
+
+  function preparar(select) {
+    if (select.dataset.preparado) {
+      return;
+    }
+    select.dataset.preparado = '1';
+
+    const buscador = document.createElement('input');
+    buscador.type = 'search';
+    buscador.className = 'form-control form-control-sm mb-1';
+    buscador.placeholder = 'Escribe para buscar...';
+    buscador.setAttribute('aria-label', 'Buscar ' + (select.getAttribute('aria-label') || ''));
+    select.before(buscador);
+
+    let temporizador = null;
+    let ultima = 0;
+    buscador.addEventListener('input', function () {
+      clearTimeout(temporizador);
+      temporizador = setTimeout(async function () {
+        const texto = buscador.value.trim();
+        if (!texto) {
+          return;
+        }
+        const numero = ++ultima;
+        const respuesta = await fetch(select.dataset.autocompletar + '?q=' + encodeURIComponent(texto), {
+          headers: {'Accept': 'application/json'},
+          credentials: 'same-origin',
+        });
+        // Si mientras tanto se escribió otra cosa, esta respuesta ya no sirve.
+        if (!respuesta.ok || numero !== ultima) {
+          return;
+        }
+        const datos = await respuesta.json();
+        const elegido = select.value;
+        for (const opcion of Array.from(select.options)) {
+          if (opcion.value && opcion.value !== elegido) {
+            opcion.remove();
+          }
+        }
+        for (const resultado of datos.resultados) {
+          if (String(resultado.id) !== elegido) {
+            select.add(new Option(resultado.texto, resultado.id));
+          }
+        }
+        if (!elegido && datos.resultados.length) {
+          select.value = String(datos.resultados[0].id);
+        }
+      }, ESPERA_MS);
+    });
+  }
+
+  function prepararDentroDe(raiz) {
+    raiz.querySelectorAll('select[data-autocompletar]').forEach(preparar);
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    prepararDentroDe(document);
+    // Las filas que añade el botón "Añadir Producto" también se preparan.
+    new MutationObserver(function (cambios) {
+      cambios.forEach(function (cambio) {
+        cambio.addedNodes.forEach(function (nodo) {
+          if (nodo.querySelectorAll) {
+            prepararDentroDe(nodo);
+          }
+        });
+      });
+    }).observe(document.body, {childList: true, subtree: true});
+  });
+})();
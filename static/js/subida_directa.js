@@ -0,0 +1,69 @@
+// Subida directa de la imagen del producto al storage (ver ventas/subidas.py).
+// Al elegir el archivo se pide un POST prefirmado al endpoint indicado en
+// data-subida-directa, se sube el archivo al bucket con esos campos y se guarda
+// el token en el campo oculto imagen_subida. Al enviar el formulario se
+// desactiva el <input type="file"> para que ya no lleve la foto. Si algo falla,
+// la foto se envía con el formulario como siempre.
+(function () {
+  function preparar(entrada) {
+    const formulario = entrada.form;
+    const token = formulario.querySelector('input[name="imagen_subida"]');
+    const estado = formulario.querySelector('[data-estado-subida]');
+    const boton = formulario.querySelector('[type="submit"]');
+    const csrf = formulario.querySelector('input[name="csrfmiddlewaretoken"]').value;
+
+    function mostrar(texto) {
+      if (estado) {
+        estado.textContent = texto;
+      }
+    }
+
+    entrada.addEventListener('change', async function () {
+      token.value = '';
+      const archivo = entrada.files[0];
+      if (!archivo) {
+        return;
+      }
+      boton.disabled = true;
+      mostrar('Subiendo imagen...');
+      try {
+        const respuesta = await fetch(entrada.dataset.subidaDirecta, {
+          method: 'POST',
+          headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrf},
+          credentials: 'same-origin',
+          body: JSON.stringify({nombre: archivo.name, tipo: archivo.type, tamano: archivo.size}),
+        });
+        const firmado = await respuesta.json();
+        if (!respuesta.ok) {
+          throw new Error(firmado.error);
+        }
+        const cuerpo = new FormData();
+        for (const [campo, valor] of Object.entries(firmado.campos)) {
+          cuerpo.append(campo, valor);
+        }
+        // S3 exige que el archivo sea el último campo.
+        cuerpo.append('file', archivo);
+        const subida = await fetch(firmado.url, {method: 'POST', body: cuerpo});
+        if (!subida.ok) {
+          throw new Error('El storage rechazó la imagen.');
+        }
+        token.value = firmado.token;
+        mostrar('Imagen subida: ' + archivo.name);
+      } catch (error) {
+        mostrar((error.message ? error.message + ' ' : '') + 'La imagen se enviará con el formulario.');
+      } finally {
+        boton.disabled = false;
+      }
+    });
+
+    formulario.addEventListener('submit', function () {
+      if (token.value) {
+        entrada.disabled = true;
+      }
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('input[type="file"][data-subida-directa]').forEach(preparar);
+  });
+})();
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Cliente, Producto, Factura, DetalleFactura, Pago, Perfil
+from .forms import BaseDetalleFacturaFormSet, DetalleFacturaForm
 
 admin.site.register(Perfil)
 
@@ -14,8 +15,16 @@ class MultiTenantModelAdmin(admin.ModelAdmin):
 
 class DetalleFacturaInline(admin.TabularInline):
     model = DetalleFactura
+    # Guarda las líneas en bloque y actualiza los totales una sola vez.
+    formset = BaseDetalleFacturaFormSet
+    # El formset pasa a cada línea el usuario y los productos ya leídos: necesita el
+    # formulario de detalle de la app (producto con autocompletado, solo los del usuario).
+    form = DetalleFacturaForm
     extra = 1
 
+    class Media:
+        js = ('js/autocompletar.js',)
+
 # --- NUEVA FORMA DE REGISTRAR Y CONFIGURAR ---
 
 # El decorador @admin.register es una forma más limpia de hacer admin.site.register()
@@ -41,6 +50,13 @@ class FacturaAdmin(MultiTenantModelAdmin):
     # EXCLUIMOS EL CAMPO 'usuario' DEL FORMULARIO
     exclude = ('usuario',)
 
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        # Al crear la factura todavía no tiene usuario: las líneas se limitan a los productos de quien la crea.
+        if isinstance(inline, DetalleFacturaInline):
+            kwargs['user'] = request.user
+        return kwargs
+
 # Estos modelos no necesitan la lógica multi-inquilino directamente
 admin.site.register(DetalleFactura)
 admin.site.register(Pago)
\ No newline at end of file
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class VentasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ventas'
+
+    def ready(self):
+        # Registra los receptores de señales (invalidación de caché) y el que
+        # instala la medición de consultas en cada conexión (ver metricas.py).
+        from . import metricas, signals  # noqa: F401
@@ -0,0 +1,72 @@
+"""
+Clientes de AWS compartidos por todo el proceso.
+
+Construir un cliente de boto3 carga los modelos de servicio de botocore, crea
+una sesión y un pool de conexiones nuevo: cientos de milisegundos y varios MB.
+Aquí se construye cada cliente una sola vez, de forma perezosa, y se reutiliza
+en todas las peticiones e hilos (los clientes de boto3 son thread-safe, las
+sesiones no, por eso la construcción va bajo un lock).
+
+Todos los clientes (también el de AlmacenS3, el storage de producción) pasan
+por ventas.metricas.instrumentar_eventos para medir el tiempo de sus llamadas.
+
+En las pruebas se puede sustituir un cliente con registrar_cliente() (por
+ejemplo uno con botocore.stub.Stubber) o toda la construcción con el setting
+VENTAS_AWS_FABRICA, una ruta a una función fabrica(servicio) -> cliente.
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+from django.utils.module_loading import import_string
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .metricas import instrumentar_eventos
+
+_clientes = {}
+_lock = threading.Lock()
+
+
+def obtener_cliente(servicio):
+    """Cliente compartido de 'servicio' ('rekognition', 's3', ...)."""
+    cliente = _clientes.get(servicio)
+    if cliente is None:
+        with _lock:
+            cliente = _clientes.get(servicio)
+            if cliente is None:
+                cliente = _clientes[servicio] = _construir(servicio)
+    return cliente
+
+
+def registrar_cliente(servicio, cliente):
+    """Sustituye el cliente de 'servicio' (pruebas)."""
+    with _lock:
+        _clientes[servicio] = cliente
+
+
+def reiniciar_clientes():
+    with _lock:
+        _clientes.clear()
+
+
+def _construir(servicio):
+    fabrica = getattr(settings, 'VENTAS_AWS_FABRICA', None)
+    if fabrica:
+        return import_string(fabrica)(servicio)
+    sesion = boto3.session.Session()
+    cliente = sesion.client(
+        servicio,
+        region_name=getattr(settings, 'AWS_S3_REGION_NAME', None),
+        config=Config(**settings.AWS_CLIENT_CONFIG),
+    )
+    instrumentar_eventos(cliente.meta.events)
+    return cliente
+
+
+class AlmacenS3(S3Boto3Storage):
+    """S3Boto3Storage con sus llamadas medidas por ventas.metricas."""
+    def _create_session(self):
+        sesion = super()._create_session()
+        instrumentar_eventos(sesion.events)
+        return sesion
@@ -0,0 +1,161 @@
+"""
+Búsqueda de clientes, productos y facturas del usuario.
+
+En PostgreSQL cada búsqueda es una sola consulta que combina:
+
+  - texto completo (SearchVector / SearchQuery con la configuración 'spanish')
+    sobre todos los campos de texto, para palabras completas en cualquier orden
+    y con sus variantes ("camisetas" encuentra "camiseta"), y
+  - icontains sobre los campos cortos (nombre, apellido, email), para el
+    autocompletado con palabras a medio escribir.
+
+Las dos usan índices GIN creados por la migración 0012 (el de texto completo
+sobre la misma expresión que genera vector() y los de trigramas de pg_trgm
+sobre UPPER(campo), que es como Django escribe icontains), así que ninguna
+recorre la tabla entera.
+
+En otras bases de datos (SQLite en desarrollo y en las pruebas) se usa un
+índice de trigramas en memoria del proceso, construido por usuario con una
+sola consulta y guardado junto con la versión de sus datos (ver cache.py): se
+reconstruye solo cuando el usuario cambia algo. Cada palabra buscada debe
+aparecer, sin distinguir mayúsculas ni tildes, en alguno de los campos.
+"""
+import json
+import unicodedata
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .cache import version_tenant
+from .models import Cliente, Factura, Producto
+
+TIPOS = {'productos': 'Productos', 'clientes': 'Clientes', 'facturas': 'Facturas'}
+
+# Campos de texto completo y campos con índice de trigramas de cada modelo. Si
+# cambian hay que rehacer los índices de la migración 0012.
+CAMPOS = {
+    Cliente: (('nombre', 'apellido', 'email', 'telefono'), ('nombre', 'apellido', 'email')),
+    Producto: (('nombre', 'descripcion'), ('nombre',)),
+}
+CONFIGURACION = 'spanish'
+
+# Índices en memoria que se conservan a la vez (uno por usuario y modelo).
+MAX_INDICES = 32
+_indices = {}
+
+
+def buscar(usuario, texto, tipo):
+    """Queryset (sin ordenar) de los objetos de tipo 'tipo' del usuario que coinciden con 'texto'."""
+    texto = texto.strip()
+    if tipo == 'facturas':
+        facturas = Factura.objects.filter(usuario=usuario)
+        if not texto:
+            return facturas.none()
+        # Por el cliente o por el número de factura ("#123" o "123").
+        condicion = Q(cliente__in=buscar(usuario, texto, 'clientes'))
+        numero = texto.lstrip('#')
+        if numero.isdigit():
+            condicion |= Q(pk=int(numero))
+        return facturas.filter(condicion)
+
+    modelo = Producto if tipo == 'productos' else Cliente
+    objetos = modelo.objects.filter(usuario=usuario)
+    if not texto:
+        return objetos.none()
+    if connection.vendor == 'postgresql':
+        return _buscar_postgresql(objetos, texto)
+    return objetos.filter(pk__in=_lista_ids(_indice(modelo, usuario.pk).buscar(texto)))
+
+
+def vector(modelo):
+    """Expresión de texto completo del modelo; coincide con la del índice GIN de la migración 0012."""
+    from django.contrib.postgres.search import SearchVector
+
+    campos_texto, _ = CAMPOS[modelo]
+    return SearchVector(*campos_texto, config=CONFIGURACION)
+
+
+def _buscar_postgresql(objetos, texto):
+    from django.contrib.postgres.search import SearchQuery
+
+    _, campos_trigramas = CAMPOS[objetos.model]
+    consulta = SearchQuery(texto, config=CONFIGURACION, search_type='websearch')
+    parecidos = reduce(or_, (Q(**{f'{campo}__icontains': texto}) for campo in campos_trigramas))
+    # alias() y no annotate(): el vector solo se usa en el WHERE, no se devuelve.
+    return objetos.alias(documento=vector(objetos.model)).filter(Q(documento=consulta) | parecidos)
+
+
+# ==============================================================================
+# ÍNDICE DE TRIGRAMAS EN MEMORIA (bases de datos distintas de PostgreSQL)
+# ==============================================================================
+def normalizar(texto):
+    """Minúsculas y sin tildes, para comparar como lo haría un usuario."""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Texto normalizado de cada objeto y, por cada trigrama, la lista de ids que lo
+    contienen. Una palabra de tres o más letras solo puede aparecer en los ids
+    que tienen todos sus trigramas; se parte de la lista más corta y luego se
+    comprueba la subcadena solo en esos candidatos.
+    """
+    def __init__(self, filas):
+        self.textos = {}
+        self.posiciones = defaultdict(list)
+        for pk, texto in filas:
+            texto = normalizar(texto)
+            self.textos[pk] = texto
+            for trigrama in _trigramas(texto):
+                self.posiciones[trigrama].append(pk)
+
+    def buscar(self, texto):
+        encontrados = None
+        for palabra in normalizar(texto).split():
+            trigramas = _trigramas(palabra)
+            if encontrados is not None:
+                candidatos = encontrados
+            elif trigramas:
+                listas = sorted((self.posiciones.get(t, ()) for t in trigramas), key=len)
+                candidatos = set(listas[0]).intersection(*listas[1:])
+            else:
+                candidatos = self.textos
+            encontrados = {pk for pk in candidatos if palabra in self.textos[pk]}
+            if not encontrados:
+                break
+        return encontrados or set()
+
+
+def _lista_ids(ids):
+    if connection.vendor == 'sqlite':
+        # Un solo parámetro JSON en lugar de uno por id: con decenas de miles de
+        # coincidencias, compilar el IN cuesta más que la propia consulta.
+        return RawSQL('SELECT value FROM json_each(%s)', (json.dumps(list(ids)),))
+    return ids
+
+
+def _indice(modelo, usuario_id):
+    clave = (modelo._meta.label, usuario_id)
+    version = version_tenant(usuario_id)
+    guardado = _indices.get(clave)
+    if guardado is not None and guardado[0] == version:
+        return guardado[1]
+
+    campos_texto, _ = CAMPOS[modelo]
+    filas = modelo.objects.filter(usuario_id=usuario_id).values_list('pk', *campos_texto)
+    # Separados por un salto de línea para que una palabra no empiece en un campo y termine en otro.
+    indice = IndiceTrigramas((fila[0], '\n'.join(fila[1:])) for fila in filas.iterator(chunk_size=5000))
+    _indices.pop(clave, None)
+    while len(_indices) >= MAX_INDICES:
+        _indices.pop(next(iter(_indices)))
+    _indices[clave] = (version, indice)
+    return indice
@@ -0,0 +1,112 @@
+"""
+Caché por usuario (inquilino) de la app.
+
+Cada usuario tiene una versión de sus datos guardada en la caché. Todas las
+claves derivadas (resumen del dashboard, fragmentos de plantilla) incluyen esa
+versión, de modo que invalidar todo lo de un usuario es un solo incr(): las
+entradas viejas dejan de usarse y caducan solas. ventas.signals sube la versión
+cuando cambian clientes, productos, facturas o pagos.
+
+La misma versión sirve de ETag de las páginas del usuario (ver
+pagina_condicional): el navegador guarda la página y, si nada cambió, Django
+responde 304 sin ejecutar la vista.
+"""
+import decimal
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import Cliente, Factura
+
+# Tiempo máximo que un resumen vive en caché aunque nadie lo invalide.
+RESUMEN_TTL = 60 * 5
+
+
+def _clave_version(usuario_id):
+    return f'ventas:version:{usuario_id}'
+
+
+def version_tenant(usuario_id):
+    """Versión actual de los datos del usuario."""
+    clave = _clave_version(usuario_id)
+    version = cache.get(clave)
+    if version is None:
+        # Si la clave se perdió (reinicio, desalojo) se parte de un valor nuevo
+        # basado en la hora, para no reutilizar una versión que ya existió.
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def invalidar_tenant(usuario_id):
+    """Sube la versión del usuario: todo lo cacheado para él queda obsoleto."""
+    clave = _clave_version(usuario_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+def etag_tenant(request, *args, **kwargs):
+    """
+    ETag de una página del usuario. Además de la versión de sus datos incluye la
+    fecha (cuotas por vencer depende del día), el despliegue (plantillas nuevas)
+    y el token CSRF (los formularios de la página lo llevan).
+    """
+    # Crea la cookie CSRF ya en la primera respuesta, para que el ETag no cambie en la siguiente.
+    get_token(request)
+    partes = (
+        request.user.pk,
+        version_tenant(request.user.pk),
+        timezone.localdate().isoformat(),
+        settings.VENTAS_VERSION_DESPLIEGUE,
+        request.META.get('CSRF_COOKIE', ''),
+    )
+    return hashlib.sha256(repr(partes).encode()).hexdigest()[:32]
+
+
+def pagina_condicional(vista):
+    """
+    Para vistas GET que solo muestran datos del usuario: respuestas privadas que
+    el navegador revalida con If-None-Match y 304 si la versión no cambió.
+
+    Si hay mensajes pendientes la página se genera entera y no se guarda: los
+    mensajes se muestran una sola vez y no deben quedar en la copia del navegador.
+    Tampoco sin caché compartida (VENTAS_CACHE_COMPARTIDA): la versión del ETag
+    sería la del worker que atiende y no vería los cambios hechos en otro.
+    """
+    condicional = cache_control(private=True, no_cache=True)(condition(etag_func=etag_tenant)(vista))
+    sin_cache = cache_control(no_cache=True, must_revalidate=True, no_store=True)(vista)
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not settings.VENTAS_CACHE_COMPARTIDA or len(get_messages(request)):
+            return sin_cache(request, *args, **kwargs)
+        return condicional(request, *args, **kwargs)
+    return envoltura
+
+
+def resumen_dashboard(usuario):
+    """Contadores del dashboard: una consulta de clientes y una agregación condicional de facturas."""
+    clave = f'ventas:resumen:{usuario.pk}:{version_tenant(usuario.pk)}'
+    resumen = cache.get(clave) if settings.VENTAS_CACHE_COMPARTIDA else None
+    if resumen is None:
+        # Las atrasadas también están pendientes de cobro.
+        pendientes = Q(estado__in=['PENDIENTE', 'ATRASADA'])
+        resumen = Factura.objects.filter(usuario=usuario).aggregate(
+            facturas_pendientes=Count('id', filter=pendientes),
+            total_por_cobrar=Coalesce(Sum('saldo_pendiente', filter=pendientes), decimal.Decimal('0.00')),
+        )
+        resumen['total_clientes'] = Cliente.objects.filter(usuario=usuario).count()
+        cache.set(clave, resumen, RESUMEN_TTL)
+    return resumen
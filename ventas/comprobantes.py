@@ -0,0 +1,104 @@
+"""
+Comprobantes de factura en PDF.
+
+El PDF se genera con xhtml2pdf (Python puro, sin navegador ni binarios del
+sistema) a partir de la misma plantilla comprobante.html que se imprime desde
+el navegador, y se guarda en el storage por defecto bajo una clave que
+depende del id de la factura y de todo lo que se imprime en él:
+Factura.actualizado, el cliente, el nombre del almacén (Perfil) y las líneas con
+el nombre de cada producto, que pueden cambiar sin tocar la factura. Mientras la factura no cambie,
+las peticiones se sirven desde esa copia; al cambiar, la clave es otra y el
+PDF se vuelve a generar. El comando generar_comprobantes los prepara por
+adelantado.
+"""
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Prefetch
+from django.template.loader import render_to_string
+
+from xhtml2pdf import pisa
+
+from .models import DetalleFactura, Factura, Pago
+
+
+class PdfNoDisponible(Exception):
+    pass
+
+
+def facturas_con_detalles(*relacionados):
+    """
+    Facturas con su cliente, sus detalles (con el producto y el importe calculado
+    en la base de datos) y sus pagos, en un número fijo de consultas sin importar
+    cuántas líneas o pagos tengan.
+    """
+    detalles = (
+        DetalleFactura.objects
+        .select_related('producto')
+        .only('factura', 'cantidad', 'precio_unitario', 'producto__nombre')
+        .annotate(importe=F('cantidad') * F('precio_unitario'))
+        .order_by('pk')
+    )
+    pagos = Pago.objects.only('factura', 'fecha_pago', 'monto', 'metodo_pago').order_by('fecha_pago')
+    return (
+        Factura.objects
+        .select_related('cliente', *relacionados)
+        .prefetch_related(Prefetch('detalles', queryset=detalles), Prefetch('pagos', queryset=pagos))
+    )
+
+
+def ruta_pdf(factura):
+    """
+    Clave del PDF en el storage para el estado actual de la factura. 'factura'
+    debe venir de facturas_con_detalles('usuario__perfil'): las líneas ya están
+    cargadas y no cuestan consultas.
+    """
+    perfil = getattr(factura.usuario, 'perfil', None)
+    estado = '|'.join([
+        factura.actualizado.isoformat(),
+        str(factura.cliente),
+        perfil.nombre_almacen if perfil else '',
+        *(f'{d.producto.nombre}:{d.cantidad}:{d.precio_unitario}' for d in factura.detalles.all()),
+    ])
+    return f'comprobantes/{factura.pk}/{hashlib.sha256(estado.encode()).hexdigest()[:20]}.pdf'
+
+
+def generar_pdf(factura):
+    """Devuelve los bytes del PDF del comprobante. 'factura' debe venir de facturas_con_detalles('usuario__perfil')."""
+    html = render_to_string('ventas/comprobante.html', {'factura': factura, 'pdf': True})
+    salida = BytesIO()
+    resultado = pisa.CreatePDF(html, dest=salida, encoding='utf-8')
+    if resultado.err:
+        raise PdfNoDisponible(f'No se pudo generar el PDF de la factura #{factura.pk}.')
+    return salida.getvalue()
+
+
+def obtener_pdf(factura):
+    """
+    Nombre en el storage del PDF de la factura, generándolo y guardándolo si la
+    versión actual todavía no existe. Devuelve (nombre, generado).
+    """
+    ruta = ruta_pdf(factura)
+    if default_storage.exists(ruta):
+        return ruta, False
+
+    nombre = default_storage.save(ruta, ContentFile(generar_pdf(factura)))
+    if nombre != ruta:
+        # Otra petición lo guardó a la vez y el storage renombró el nuestro: sobra.
+        default_storage.delete(nombre)
+    _borrar_versiones_anteriores(factura.pk, ruta)
+    return ruta, True
+
+
+def _borrar_versiones_anteriores(factura_id, actual):
+    carpeta = f'comprobantes/{factura_id}'
+    try:
+        _, archivos = default_storage.listdir(carpeta)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for archivo in archivos:
+        ruta = f'{carpeta}/{archivo}'
+        if ruta != actual:
+            default_storage.delete(ruta)
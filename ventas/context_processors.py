@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cache import version_tenant
+
+
+def cache_tenant(request):
+    """
+    Expone 'version_cache', la versión de los datos del usuario, para usarla como
+    parte de la clave de los fragmentos {% cache %}. Solo se consulta la caché si
+    la plantilla la usa.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'version_cache': SimpleLazyObject(lambda: version_tenant(request.user.pk))}
@@ -0,0 +1,100 @@
+"""
+Plan de cuotas de las facturas (modelo Cuota).
+
+Cada factura se divide en numero_cuotas plazos mensuales desde su emisión;
+Factura.fecha_vencimiento es el de la primera cuota sin pagar. El plan se genera de una vez,
+con un DELETE y un bulk_create, cuando cambia el total o el número de cuotas;
+los pagos se reparten de forma incremental, llenando primero las cuotas más
+antiguas y, si se borra o se reduce un pago, vaciando primero las más recientes.
+"""
+import decimal
+
+from django.db import transaction
+
+from .models import Cuota, Factura
+
+CENTAVO = decimal.Decimal('0.01')
+
+
+def repartir(total, numero_cuotas):
+    """Importes de las cuotas: partes iguales en centavos, con los centavos sobrantes en las primeras."""
+    numero_cuotas = max(numero_cuotas, 1)
+    base, resto = divmod(int(decimal.Decimal(total).quantize(CENTAVO) / CENTAVO), numero_cuotas)
+    return [(base + (1 if i < resto else 0)) * CENTAVO for i in range(numero_cuotas)]
+
+
+def _estado(importe, pagado):
+    return 'PAGADA' if pagado >= importe else 'PENDIENTE'
+
+
+def construir_cuotas(factura_id, usuario_id, fecha_emision, numero_cuotas, total, pagado):
+    """Cuotas (sin guardar) del plan de la factura, con lo ya pagado repartido desde la primera."""
+    if total <= 0:
+        return []
+    cuotas = []
+    restante = max(decimal.Decimal(pagado), 0)
+    for numero, importe in enumerate(repartir(total, numero_cuotas), start=1):
+        abonado = min(importe, restante)
+        restante -= abonado
+        cuotas.append(Cuota(
+            factura_id=factura_id, usuario_id=usuario_id, numero=numero,
+            fecha_vencimiento=Factura.calcular_vencimiento(fecha_emision, numero),
+            importe=importe, pagado=abonado, estado=_estado(importe, abonado),
+        ))
+    return cuotas
+
+
+def proximo_vencimiento(fecha_emision, numero_cuotas, total, pagado):
+    """
+    Vencimiento de la primera cuota sin pagar (el de la última si están todas pagadas).
+    Los pagos llenan las cuotas por orden, así que es la menor fecha_vencimiento de las
+    cuotas PENDIENTE de la factura, calculada sin consultarlas.
+    """
+    if total <= 0:
+        return Factura.calcular_vencimiento(fecha_emision, 1)
+    restante = decimal.Decimal(pagado)
+    importes = repartir(total, numero_cuotas)
+    for numero, importe in enumerate(importes, start=1):
+        if restante < importe:
+            return Factura.calcular_vencimiento(fecha_emision, numero)
+        restante -= importe
+    return Factura.calcular_vencimiento(fecha_emision, len(importes))
+
+
+def regenerar_cuotas(factura_id, usuario_id, fecha_emision, numero_cuotas, total, pagado):
+    """Rehace el plan de cuotas de la factura y reparte en él lo ya pagado."""
+    with transaction.atomic():
+        Cuota.objects.filter(factura_id=factura_id).delete()
+        cuotas = construir_cuotas(factura_id, usuario_id, fecha_emision, numero_cuotas, total, pagado)
+        if cuotas:
+            Cuota.objects.bulk_create(cuotas)
+
+
+def asignar_pago(factura_id, pagado_anterior, delta):
+    """
+    Reparte en las cuotas una variación 'delta' de lo pagado (negativa si se borra
+    o se reduce un pago). 'pagado_anterior' es lo pagado antes del cambio; lo que
+    excede el total de la factura no está en ninguna cuota y se descuenta primero.
+    """
+    delta = decimal.Decimal(delta)
+    with transaction.atomic():
+        cuotas = list(Cuota.objects.select_for_update().filter(factura_id=factura_id).order_by('numero'))
+        if not cuotas:
+            return
+        if delta < 0:
+            sin_asignar = max(decimal.Decimal(pagado_anterior) - sum(c.pagado for c in cuotas), 0)
+            delta += min(sin_asignar, -delta)
+
+        modificadas = []
+        for cuota in (cuotas if delta > 0 else reversed(cuotas)):
+            if not delta:
+                break
+            cambio = min(cuota.importe - cuota.pagado, delta) if delta > 0 else -min(cuota.pagado, -delta)
+            if not cambio:
+                continue
+            cuota.pagado += cambio
+            cuota.estado = _estado(cuota.importe, cuota.pagado)
+            delta -= cambio
+            modificadas.append(cuota)
+        if modificadas:
+            Cuota.objects.bulk_update(modificadas, ['pagado', 'estado'])
@@ -0,0 +1,48 @@
+"""
+WhiteNoise para servir los estáticos también con ASGI.
+
+WhiteNoiseMiddleware solo es síncrono: con ASGI, Django pasaría cada petición
+por un hilo para atravesarlo y las vistas asíncronas se ejecutarían dentro de
+ese hilo, bloqueándolo mientras esperan. Esta subclase declara las dos
+variantes; la asíncrona busca el archivo igual que WhiteNoise y lo lee en un
+hilo (los estáticos son pequeños: se devuelven enteros en lugar de en streaming,
+que con ASGI también se leería entero, pero con un aviso).
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        return await sync_to_async(self.servir_entero, thread_sensitive=False)(static_file, request)
+
+    def servir_entero(self, static_file, request):
+        servida = self.serve(static_file, request)
+        try:
+            respuesta = HttpResponse(b''.join(servida.streaming_content), status=servida.status_code)
+        finally:
+            servida.close()
+        del respuesta['Content-Type']
+        for cabecera, valor in servida.items():
+            respuesta[cabecera] = valor
+        return respuesta
@@ -0,0 +1,103 @@
+"""
+Exportación a CSV de facturas, pagos y líneas de detalle.
+
+Las filas se leen con values_list() (tuplas, nunca instancias del modelo) y
+iterator(chunk_size=...), que en PostgreSQL usa un cursor del lado del
+servidor, y se envían al navegador a medida que llegan con un
+StreamingHttpResponse: la memoria y el tiempo hasta el primer byte no
+dependen del número de filas exportadas.
+"""
+import csv
+from itertools import islice
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import DetalleFactura, Factura, Pago
+
+# Filas que se piden a la base de datos (y se envían) de cada vez.
+FILAS_POR_BLOQUE = 2000
+
+
+class Eco:
+    """Objeto tipo archivo para csv.writer: devuelve lo escrito en lugar de guardarlo."""
+    def write(self, valor):
+        return valor
+
+
+# Por cada exportación: columnas del CSV y campos de values_list() en el mismo orden.
+COLUMNAS = {
+    'facturas': [
+        ('Factura', 'id'),
+        ('Fecha emisión', 'fecha_emision'),
+        ('Cliente', 'cliente__nombre'),
+        ('Apellido', 'cliente__apellido'),
+        ('Email', 'cliente__email'),
+        ('Cuotas', 'numero_cuotas'),
+        ('Total', 'total'),
+        ('Saldo pendiente', 'saldo_pendiente'),
+        ('Estado', 'estado'),
+    ],
+    'pagos': [
+        ('Pago', 'id'),
+        ('Factura', 'factura_id'),
+        ('Fecha pago', 'fecha_pago'),
+        ('Cliente', 'factura__cliente__nombre'),
+        ('Apellido', 'factura__cliente__apellido'),
+        ('Monto', 'monto'),
+        ('Método', 'metodo_pago'),
+    ],
+    'detalles': [
+        ('Línea', 'id'),
+        ('Factura', 'factura_id'),
+        ('Fecha emisión', 'factura__fecha_emision'),
+        ('Producto', 'producto_id'),
+        ('Nombre producto', 'producto__nombre'),
+        ('Cantidad', 'cantidad'),
+        ('Precio unitario', 'precio_unitario'),
+        ('Subtotal', 'subtotal'),
+    ],
+}
+
+
+def consulta(tipo, usuario, filtros):
+    """Queryset de values_list() de la exportación 'tipo', filtrado con un FiltroFacturasForm."""
+    if tipo == 'facturas':
+        queryset = filtros.filtrar(Factura.objects.filter(usuario=usuario)).order_by('-fecha_emision', 'id')
+    elif tipo == 'pagos':
+        queryset = filtros.filtrar(
+            Pago.objects.filter(factura__usuario=usuario), prefijo='factura__', campo_fecha='fecha_pago__date'
+        ).order_by('fecha_pago', 'id')
+    elif tipo == 'detalles':
+        queryset = filtros.filtrar(
+            DetalleFactura.objects.filter(factura__usuario=usuario), prefijo='factura__', campo_fecha='factura__fecha_emision'
+        ).annotate(
+            subtotal=ExpressionWrapper(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=12, decimal_places=2))
+        ).order_by('factura_id', 'id')
+    else:
+        raise KeyError(tipo)
+    return queryset.values_list(*[campo for _, campo in COLUMNAS[tipo]])
+
+
+# Campos DateTimeField: la base de datos los devuelve en UTC y se exportan en la hora local.
+FECHAS_HORA = {'fecha_pago'}
+
+
+def _hora_local(valor):
+    return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S') if valor else valor
+
+
+def lineas_csv(tipo, queryset):
+    """Genera el CSV por bloques de texto; la cabecera sale antes de lanzar la consulta."""
+    escritor = csv.writer(Eco())
+    # BOM para que Excel reconozca el UTF-8.
+    yield '\ufeff' + escritor.writerow([titulo for titulo, _ in COLUMNAS[tipo]])
+    con_hora = [i for i, (_, campo) in enumerate(COLUMNAS[tipo]) if campo in FECHAS_HORA]
+    filas = queryset.iterator(chunk_size=FILAS_POR_BLOQUE)
+    while bloque := list(islice(filas, FILAS_POR_BLOQUE)):
+        if con_hora:
+            bloque = [list(fila) for fila in bloque]
+            for fila in bloque:
+                for i in con_hora:
+                    fila[i] = _hora_local(fila[i])
+        yield ''.join(escritor.writerow(fila) for fila in bloque)
@@ -1,8 +1,87 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import AuthenticationForm
+from django.db import transaction
+from django.db.models import Sum, F
+from django.urls import reverse_lazy
+from functools import cached_property
 import os
 from .models import Cliente, Producto, Factura, DetalleFactura, Pago
+from .resumenes import acumular_lineas
+from .stock import mover_stock
+from .subidas import SubidaNoValida, clave_subida
+
+# ==============================================================================
+# SELECTORES CON AUTOCOMPLETADO (PARA CLIENTES Y PRODUCTOS EN LAS FACTURAS)
+# ==============================================================================
+
+class SelectorAutocompletar(forms.Select):
+    """
+    <select> que solo trae la opción elegida (y la vacía) en lugar de todo el
+    queryset. static/js/autocompletar.js le añade un buscador que pide las
+    demás opciones al endpoint JSON de 'url' (la vista autocompletar).
+    """
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        contexto = super().get_context(name, value, attrs)
+        contexto['widget']['attrs']['data-autocompletar'] = str(self.url)
+        return contexto
+
+    def optgroups(self, name, value, attrs=None):
+        campo = self.choices.field
+        opciones = [('', campo.empty_label or '')]
+        for valor in value:
+            etiqueta = campo.etiqueta(valor) if valor else None
+            if etiqueta is not None:
+                opciones.append((valor, etiqueta))
+        return [
+            (None, [self.create_option(name, valor, etiqueta, valor in value, indice, attrs=attrs)], indice)
+            for indice, (valor, etiqueta) in enumerate(opciones)
+        ]
+
+
+class CampoAutocompletar(forms.ModelChoiceField):
+    """
+    ModelChoiceField que nunca recorre su queryset: para validar y para mostrar
+    la opción elegida busca solo ese id. 'conocidos' guarda los objetos ya
+    leídos (pk -> objeto o None); el formset de detalles lo llena de una vez con
+    los productos de todas sus líneas.
+    """
+    def __init__(self, queryset, url, **kwargs):
+        kwargs.setdefault('widget', SelectorAutocompletar(url))
+        super().__init__(queryset, **kwargs)
+        self.conocidos = {}
+
+    def __deepcopy__(self, memo):
+        # Cada formulario empieza con su propio diccionario.
+        resultado = super().__deepcopy__(memo)
+        resultado.conocidos = {}
+        return resultado
+
+    def objeto(self, valor):
+        try:
+            pk = int(valor)
+        except (TypeError, ValueError):
+            return None
+        if pk not in self.conocidos:
+            self.conocidos[pk] = self.queryset.filter(pk=pk).first()
+        return self.conocidos[pk]
+
+    def etiqueta(self, valor):
+        objeto = self.objeto(valor)
+        return None if objeto is None else self.label_from_instance(objeto)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        objeto = self.objeto(value)
+        if objeto is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+        return objeto
+
 
 # ==============================================================================
 # FORMULARIOS PARA CLIENTES
@@ -19,10 +98,37 @@ class ClienteForm(forms.ModelForm):
 # ==============================================================================
 
 class ProductoForm(forms.ModelForm):
+    # Token de una imagen que el navegador ya subió directamente al storage (ver ventas/subidas.py).
+    imagen_subida = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Producto
         fields = ['nombre', 'descripcion', 'precio', 'stock', 'imagen']
 
+    def __init__(self, *args, **kwargs):
+        self.usuario = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+
+    def clean_imagen_subida(self):
+        token = self.cleaned_data.get('imagen_subida')
+        if not token:
+            return ''
+        try:
+            clave = clave_subida(self.usuario, token)
+        except SubidaNoValida as e:
+            raise ValidationError(str(e))
+        if Producto.objects.filter(imagen_original=clave).exclude(pk=self.instance.pk).exists():
+            raise ValidationError('Esa imagen ya está asignada a otro producto. Vuelve a elegirla.')
+        return clave
+
+    def save(self, commit=True):
+        # Una imagen enviada con el formulario tiene prioridad (Producto.save la deja en cola).
+        clave = self.cleaned_data.get('imagen_subida')
+        if clave and not self.cleaned_data.get('imagen'):
+            self.instance.imagen_original.name = clave
+            self.instance.encolar_imagen()
+        return super().save(commit)
+
     def clean_imagen(self):
         """
         Añade validaciones de seguridad al campo de la imagen para prevenir
@@ -49,9 +155,11 @@ class ProductoForm(forms.ModelForm):
 # ==============================================================================
 
 class FacturaForm(forms.ModelForm):
+    cliente = CampoAutocompletar(Cliente.objects.none(), url=reverse_lazy('ventas:autocompletar', args=['clientes']), label='Cliente')
+
     def __init__(self, *args, **kwargs):
         """
-        Filtra el queryset del campo 'cliente' para mostrar solo los clientes
+        Filtra el queryset del campo 'cliente' para aceptar solo los clientes
         que pertenecen al usuario que está creando la factura.
         """
         usuario = kwargs.pop('user', None)
@@ -64,20 +172,199 @@ class FacturaForm(forms.ModelForm):
         fields = ['cliente', 'numero_cuotas']
 
 
+class DetalleFacturaForm(forms.ModelForm):
+    producto = CampoAutocompletar(Producto.objects.none(), url=reverse_lazy('ventas:autocompletar', args=['productos']), label='Producto')
+
+    def __init__(self, *args, usuario_id=None, productos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['producto'].queryset = Producto.objects.filter(usuario_id=usuario_id)
+        if productos is not None:
+            self.fields['producto'].conocidos = productos
+
+    def _get_validation_exclusions(self):
+        # El campo ya comprobó que el producto existe y es del usuario; así el
+        # modelo no repite la comprobación con una consulta por línea.
+        exclusiones = super()._get_validation_exclusions()
+        exclusiones.add('producto')
+        return exclusiones
+
+    class Meta:
+        model = DetalleFactura
+        fields = ('producto', 'cantidad')
+
+
+class BaseDetalleFacturaFormSet(forms.BaseInlineFormSet):
+    """
+    Guarda todas las líneas de la factura en bloque: un INSERT, un UPDATE y un
+    DELETE como máximo, y ajusta los totales de la factura una sola vez al
+    final en lugar de hacerlo por cada DetalleFactura. Si algún producto no
+    tiene stock suficiente lanza StockInsuficiente sin guardar nada.
+
+    Los productos de todas las líneas (enviadas o ya guardadas) se leen en una
+    sola consulta y solo entre los del usuario 'user' (por defecto, el de la
+    factura).
+    """
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.usuario_id = user.pk if user is not None else self.instance.usuario_id
+
+    @cached_property
+    def productos_elegidos(self):
+        ids = {detalle.producto_id for detalle in self.get_queryset()}
+        if self.is_bound:
+            sufijo = '-producto'
+            for clave, valor in self.data.items():
+                if clave.startswith(f'{self.prefix}-') and clave.endswith(sufijo) and str(valor).isdigit():
+                    ids.add(int(valor))
+        if not ids:
+            return {}
+        encontrados = Producto.objects.filter(usuario_id=self.usuario_id).in_bulk(ids)
+        return {pk: encontrados.get(pk) for pk in ids}
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs.update(usuario_id=self.usuario_id, productos=self.productos_elegidos)
+        return kwargs
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+
+        nuevos, modificados, borrados = [], [], []
+        self.changed_objects = []
+        for form in self.initial_forms:
+            obj = form.instance
+            if obj.pk is None:
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                borrados.append(obj)
+            elif form.has_changed():
+                modificados.append(self._preparar_detalle(form))
+                self.changed_objects.append((obj, form.changed_data))
+        for form in self.extra_forms:
+            if not form.has_changed() or (self.can_delete and self._should_delete_form(form)):
+                continue
+            nuevos.append(self._preparar_detalle(form))
+
+        with transaction.atomic():
+            # El importe previo de las líneas tocadas se lee antes de escribir, para
+            # aplicar a la factura solo la diferencia (ver Factura.aplicar_delta).
+            # Se agrupa por producto para los resúmenes de ventas (ver resumenes.py).
+            lineas_anteriores = []
+            tocados = [obj.pk for obj in borrados + modificados]
+            if tocados:
+                lineas_anteriores = list(
+                    DetalleFactura.objects.filter(pk__in=tocados)
+                    .values('producto')
+                    .annotate(unidades=Sum('cantidad'), importe=Sum(F('cantidad') * F('precio_unitario')))
+                    .values_list('producto', 'unidades', 'importe')
+                )
+            anterior = sum((importe for _, _, importe in lineas_anteriores), 0)
+            # Todas las líneas descuentan (o devuelven) stock en un solo UPDATE.
+            mover_stock([
+                (producto_id, -unidades) for producto_id, unidades, _ in lineas_anteriores
+            ] + [
+                (detalle.producto_id, detalle.cantidad) for detalle in nuevos + modificados
+            ])
+            if borrados:
+                DetalleFactura.objects.filter(pk__in=[obj.pk for obj in borrados]).delete()
+            if modificados:
+                DetalleFactura.objects.bulk_update(modificados, ['producto', 'cantidad', 'precio_unitario'])
+            if nuevos:
+                DetalleFactura.objects.bulk_create(nuevos)
+            nuevo = sum((detalle.subtotal for detalle in nuevos + modificados), 0)
+            self.instance.aplicar_delta(delta_total=nuevo - anterior)
+            acumular_lineas(self.instance, [
+                (producto_id, -unidades, -importe) for producto_id, unidades, importe in lineas_anteriores
+            ] + [
+                (detalle.producto_id, detalle.cantidad, detalle.subtotal) for detalle in nuevos + modificados
+            ])
+
+        # Los mismos atributos que rellena BaseModelFormSet (el admin los usa para su historial).
+        self.new_objects = nuevos
+        self.deleted_objects = borrados
+        return nuevos + modificados
+
+    def _preparar_detalle(self, form):
+        detalle = form.save(commit=False)
+        setattr(detalle, self.fk.name, self.instance)
+        if detalle.precio_unitario is None:
+            detalle.precio_unitario = detalle.producto.precio
+        return detalle
+
+
 DetalleFacturaFormSet = forms.inlineformset_factory(
     Factura,
     DetalleFactura,
+    form=DetalleFacturaForm,
+    formset=BaseDetalleFacturaFormSet,
     fields=('producto', 'cantidad'),
     extra=1, # Muestra un formulario vacío para empezar
     can_delete=True # Permite eliminar detalles de una factura existente
 )
 
+class FiltroFacturasForm(forms.Form):
+    """
+    Filtros del listado de facturas (estado, cliente y rango de fechas). Se
+    aplican en la base de datos antes de paginar.
+    """
+    estado = forms.ChoiceField(choices=[('', 'Todos los estados')] + Factura.ESTADO_CHOICES, required=False)
+    # Con autocompletado: la página no lleva un <option> por cada cliente del usuario.
+    cliente = CampoAutocompletar(
+        Cliente.objects.none(), url=reverse_lazy('ventas:autocompletar', args=['clientes']),
+        required=False, empty_label='Todos los clientes',
+    )
+    fecha_desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    fecha_hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        usuario = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if usuario:
+            self.fields['cliente'].queryset = Cliente.objects.filter(usuario=usuario)
+
+    def filtrar(self, queryset, prefijo='', campo_fecha='fecha_emision'):
+        """
+        Aplica los filtros a 'queryset'. Para filtrar modelos relacionados con la
+        factura (pagos, detalles) se indica la ruta hasta ella en 'prefijo', p. ej.
+        'factura__', y en 'campo_fecha' el campo al que se aplica el rango de fechas.
+        """
+        if not self.is_valid():
+            return queryset
+        datos = self.cleaned_data
+        if datos['estado']:
+            queryset = queryset.filter(**{f'{prefijo}estado': datos['estado']})
+        if datos['cliente']:
+            queryset = queryset.filter(**{f'{prefijo}cliente': datos['cliente']})
+        if datos['fecha_desde']:
+            queryset = queryset.filter(**{f'{campo_fecha}__gte': datos['fecha_desde']})
+        if datos['fecha_hasta']:
+            queryset = queryset.filter(**{f'{campo_fecha}__lte': datos['fecha_hasta']})
+        return queryset
+
+
 class PagoForm(forms.ModelForm):
     class Meta:
         model = Pago
         fields = ['monto', 'metodo_pago']
 
 
+# ==============================================================================
+# FORMULARIO DE IMPORTACIÓN MASIVA (ver ventas/importacion.py)
+# ==============================================================================
+
+class ImportacionForm(forms.Form):
+    tipo = forms.ChoiceField(choices=[('clientes', 'Clientes'), ('productos', 'Productos')])
+    archivo = forms.FileField(help_text='Archivo .csv o .xlsx con una fila de cabecera con los nombres de los campos.')
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        ext = os.path.splitext(archivo.name)[1]
+        if ext.lower() not in ['.csv', '.xlsx']:
+            raise ValidationError("Tipo de archivo no válido. Solo se permiten archivos .csv o .xlsx.")
+        return archivo
+
+
 # ==============================================================================
 # FORMULARIO DE AUTENTICACIÓN
 # ==============================================================================
@@ -0,0 +1,307 @@
+"""
+Procesamiento de imágenes de productos fuera de la petición.
+
+Producto.save() solo guarda la subida original y marca el producto como
+PENDIENTE; la tabla de productos hace de cola. El comando procesar_imagenes
+reclama productos pendientes con select_for_update(skip_locked=True), así que
+pueden correr varios workers a la vez, y para cada uno:
+
+  1. modera la imagen con AWS Rekognition (con caché por contenido),
+  2. genera sus versiones de 96/240/640px en JPEG y WebP (publicar_derivados),
+  3. publica la de 640px en JPEG como Producto.imagen y marca el producto como LISTA.
+
+Con ASGI las vistas asíncronas guardan con guardar_con_moderacion(), que además
+modera la subida durante la petición (ver su docstring).
+"""
+import asyncio
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .aws import obtener_cliente
+from .cache import invalidar_tenant
+from .models import Producto, VeredictoModeracion
+
+logger = logging.getLogger(__name__)
+
+# Anchos publicados de cada imagen: miniatura de listado, tarjeta y detalle.
+ANCHOS_DERIVADOS = (96, 240, 640)
+FORMATOS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+# Segundos que se espera el veredicto de otra moderación de la misma imagen en curso.
+ESPERA_MODERACION = 30
+# Un producto en PROCESANDO más tiempo que esto se da por abandonado (worker caído) y vuelve a la cola.
+TIEMPO_MAXIMO_PROCESO = datetime.timedelta(minutes=10)
+MENSAJE_RECHAZO = 'La imagen contiene contenido inapropiado y fue rechazada.'
+
+_hilos_storage = None
+_lock_hilos = threading.Lock()
+
+
+class ImagenRechazada(Exception):
+    pass
+
+
+def huella_contenido(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def moderar(image_bytes):
+    """Devuelve las etiquetas de moderación que Rekognition encuentra en la imagen."""
+    response = obtener_cliente('rekognition').detect_moderation_labels(Image={'Bytes': image_bytes})
+    return response.get('ModerationLabels', [])
+
+
+def moderar_con_cache(image_bytes):
+    """
+    Como moderar(), pero reutiliza el veredicto de una imagen idéntica ya
+    moderada (VeredictoModeracion, por hash del contenido y con caducidad).
+
+    Si varias imágenes iguales llegan a la vez solo una va a Rekognition: la
+    primera marca la huella como "en vuelo" en la caché (cache.add es atómico,
+    también entre procesos si la caché es compartida) y las demás esperan su
+    veredicto en la base de datos.
+    """
+    huella = huella_contenido(image_bytes)
+    etiquetas = _veredicto_guardado(huella)
+    if etiquetas is not None:
+        _contar('aciertos')
+        return etiquetas
+
+    clave_en_vuelo = f'ventas:moderacion:en_vuelo:{huella}'
+    propio = cache.add(clave_en_vuelo, True, timeout=ESPERA_MODERACION)
+    if not propio:
+        limite = time.monotonic() + ESPERA_MODERACION
+        while time.monotonic() < limite and cache.get(clave_en_vuelo):
+            time.sleep(0.1)
+        etiquetas = _veredicto_guardado(huella)
+        if etiquetas is not None:
+            _contar('aciertos')
+            return etiquetas
+        # La otra comprobación falló o tardó demasiado: se hace aquí. Si la marca
+        # sigue siendo de otro worker no se toca; solo la borra quien la puso.
+        propio = cache.add(clave_en_vuelo, True, timeout=ESPERA_MODERACION)
+    try:
+        _contar('fallos')
+        etiquetas = moderar(image_bytes)
+        VeredictoModeracion.objects.update_or_create(
+            huella=huella,
+            defaults={'etiquetas': etiquetas, 'expira': timezone.now() + _ttl_moderacion()},
+        )
+    finally:
+        if propio:
+            cache.delete(clave_en_vuelo)
+    return etiquetas
+
+
+def estadisticas_moderacion():
+    """Aciertos y fallos de la caché de moderación desde la última purga de la caché."""
+    return {tipo: cache.get(f'ventas:moderacion:{tipo}', 0) for tipo in ('aciertos', 'fallos')}
+
+
+def _veredicto_guardado(huella):
+    return (
+        VeredictoModeracion.objects
+        .filter(huella=huella, expira__gt=timezone.now())
+        .values_list('etiquetas', flat=True)
+        .first()
+    )
+
+
+def _contar(tipo):
+    clave = f'ventas:moderacion:{tipo}'
+    cache.add(clave, 0, timeout=None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        pass
+
+
+def _ttl_moderacion():
+    return datetime.timedelta(days=getattr(settings, 'VENTAS_MODERACION_TTL_DIAS', 30))
+
+
+def generar_derivados(image_bytes):
+    """
+    Decodifica la imagen una sola vez y genera todas las versiones publicadas:
+    cada ancho de ANCHOS_DERIVADOS (sin ampliar) en cada formato de FORMATOS.
+    Devuelve {(formato, ancho): (nombre, bytes)}; el nombre depende solo del
+    contenido original, así que la misma foto siempre produce los mismos archivos.
+    """
+    huella = huella_contenido(image_bytes)[:20]
+    img = Image.open(BytesIO(image_bytes))
+    # Un JPEG se decodifica ya reducido (1/2, 1/4 o 1/8) si sigue siendo más
+    # ancho que la versión mayor: la memoria del worker no crece con los
+    # megapíxeles de la foto. Otros formatos ignoran draft().
+    mayor = max(ANCHOS_DERIVADOS)
+    if img.width > mayor:
+        img.draft('RGB', (mayor, max(1, round(img.height * mayor / img.width))))
+    img.load()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    derivados = {}
+    # De mayor a menor, cada versión se reduce a partir de la anterior.
+    for ancho in sorted({min(ancho, img.width) for ancho in ANCHOS_DERIVADOS}, reverse=True):
+        if img.width > ancho:
+            img = img.resize((ancho, max(1, round(img.height * ancho / img.width))), Image.Resampling.LANCZOS)
+        for formato, (formato_pil, extension, opciones) in FORMATOS.items():
+            buffer = BytesIO()
+            img.save(buffer, format=formato_pil, **opciones)
+            derivados[(formato, ancho)] = (f'productos/derivados/{huella}-{ancho}.{extension}', buffer.getvalue())
+    return derivados
+
+
+def publicar_derivados(image_bytes):
+    """
+    Genera y guarda en el storage las versiones de la imagen (las que ya existen
+    no se vuelven a subir) y devuelve el mapa para Producto.imagenes_derivadas.
+    """
+    mapa = {}
+    for (formato, ancho), (nombre, contenido) in generar_derivados(image_bytes).items():
+        if not default_storage.exists(nombre):
+            nombre = default_storage.save(nombre, ContentFile(contenido))
+        mapa.setdefault(formato, {})[str(ancho)] = nombre
+    return mapa
+
+
+def reclamar_pendientes(limite=10):
+    """Marca como PROCESANDO hasta 'limite' productos pendientes y devuelve sus ids."""
+    abandonados = timezone.now() - TIEMPO_MAXIMO_PROCESO
+    with transaction.atomic():
+        ids = list(
+            Producto.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(estado_imagen='PENDIENTE') | Q(estado_imagen='PROCESANDO', procesando_desde__lt=abandonados))
+            .order_by('pk')
+            .values_list('pk', flat=True)[:limite]
+        )
+        Producto.objects.filter(pk__in=ids).update(estado_imagen='PROCESANDO', procesando_desde=timezone.now())
+    return ids
+
+
+def procesar_producto(producto_id):
+    """Modera, redimensiona y publica la imagen original del producto."""
+    producto = Producto.objects.get(pk=producto_id)
+    if not producto.imagen_original:
+        Producto.objects.filter(pk=producto_id).update(estado_imagen='', procesando_desde=None)
+        return
+
+    try:
+        with producto.imagen_original.open('rb') as original:
+            image_bytes = original.read()
+        if moderar_con_cache(image_bytes):
+            raise ImagenRechazada(MENSAJE_RECHAZO)
+        derivadas = publicar_derivados(image_bytes)
+    except ImagenRechazada as e:
+        producto.imagen_original.delete(save=False)
+        _finalizar(producto, 'RECHAZADA', str(e))
+        return
+    except Exception as e:
+        logger.exception('Error procesando la imagen del producto %s', producto_id)
+        _finalizar(producto, 'ERROR', f'Hubo un error al procesar la imagen: {e}'[:255])
+        return
+
+    producto.imagenes_derivadas = derivadas
+    producto.imagen.name = imagen_principal(derivadas)
+    _finalizar(producto, 'LISTA', '')
+
+
+def imagen_principal(derivadas):
+    """La versión JPEG más grande, que es la que se guarda en Producto.imagen."""
+    jpeg = derivadas['jpeg']
+    return jpeg[max(jpeg, key=int)]
+
+
+def _finalizar(producto, estado, error):
+    # Solo se actualizan las columnas de la imagen: el usuario pudo editar el
+    # producto mientras se procesaba. Si entretanto llegó otra subida (el producto
+    # ya no está en PROCESANDO) el resultado se descarta.
+    actualizados = Producto.objects.filter(pk=producto.pk, estado_imagen='PROCESANDO').update(
+        imagen=producto.imagen.name or '',
+        imagenes_derivadas=producto.imagenes_derivadas,
+        imagen_original=producto.imagen_original.name or '',
+        estado_imagen=estado,
+        error_imagen=error,
+        procesando_desde=None,
+    )
+    if actualizados:
+        # update() no dispara post_save: se invalida la caché del usuario a mano.
+        invalidar_tenant(producto.usuario_id)
+
+
+# ==============================================================================
+# GUARDADO DESDE LAS VISTAS ASÍNCRONAS (ASGI)
+# ==============================================================================
+async def guardar_con_moderacion(producto):
+    """
+    producto.save() para las vistas asíncronas. Si trae una imagen nueva, la
+    subida del original al storage y la moderación con Rekognition van a la vez
+    (asyncio.gather): la petición tarda lo que la más lenta de las dos y,
+    mientras espera, el event loop atiende otras peticiones.
+
+    Si la imagen se rechaza se borra el original, no se guarda nada y se lanza
+    ImagenRechazada. Si Rekognition falla, la moderación queda para el worker.
+    El veredicto se guarda en la caché de moderación, así que el worker que
+    luego genera las versiones no vuelve a llamar a Rekognition.
+    """
+    if not producto.imagen or producto.imagen._committed:
+        await producto.asave()
+        return
+
+    subida = producto.imagen.file
+    contenido = await _en_hilo_storage(subida.read)()
+    campo = producto._meta.get_field('imagen_original')
+    nombre = campo.generate_filename(producto, producto.nombre_original(subida.name))
+    # El storage no toca la base de datos: va a un hilo propio, en paralelo al
+    # de la petición, que es donde moderar_con_cache consulta el veredicto.
+    etiquetas, nombre = await asyncio.gather(
+        _moderar_o_aplazar(contenido),
+        _en_hilo_storage(campo.storage.save)(nombre, ContentFile(contenido), max_length=campo.max_length),
+    )
+    if etiquetas:
+        await _en_hilo_storage(campo.storage.delete)(nombre)
+        raise ImagenRechazada(MENSAJE_RECHAZO)
+
+    producto.imagen_original.name = nombre
+    producto.imagen = await sync_to_async(producto.imagen_publicada)()
+    producto.encolar_imagen()
+    await producto.asave()
+
+
+def _en_hilo_storage(funcion):
+    # El ejecutor por defecto de asyncio tiene min(32, CPUs + 4) hilos: con una
+    # CPU solo habría 5 subidas en curso por worker. Las subidas esperan a la
+    # red, no a la CPU, así que tienen su propio grupo (VENTAS_HILOS_STORAGE).
+    global _hilos_storage
+    if _hilos_storage is None:
+        with _lock_hilos:
+            if _hilos_storage is None:
+                _hilos_storage = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'VENTAS_HILOS_STORAGE', 32), thread_name_prefix='storage',
+                )
+    return sync_to_async(funcion, thread_sensitive=False, executor=_hilos_storage)
+
+
+async def _moderar_o_aplazar(image_bytes):
+    try:
+        return await sync_to_async(moderar_con_cache)(image_bytes)
+    except Exception:
+        logger.warning('No se pudo moderar la imagen durante la petición; la moderará el worker', exc_info=True)
+        return None
@@ -0,0 +1,136 @@
+"""
+Importación masiva de clientes y productos desde CSV o Excel (.xlsx).
+
+El archivo se lee fila a fila y se procesa en lotes de TAMANO_LOTE: cada fila
+se valida con las mismas reglas que los formularios de alta (ClienteForm,
+ProductoForm) y las válidas de cada lote se insertan con un bulk_create dentro
+de su propia transacción. Nunca hay más de un lote en memoria, así que un
+archivo de cientos de MB no cambia el consumo; las filas con errores se
+informan con su número de línea y no impiden importar las demás.
+"""
+import csv
+import io
+import os
+import zipfile
+from itertools import islice
+
+from django.forms import modelform_factory
+
+from .cache import invalidar_tenant
+from .forms import ClienteForm, ProductoForm
+from .models import Cliente, Producto
+
+TAMANO_LOTE = 500
+
+# Modelo y formulario de alta de cada tipo importable. La imagen de los
+# productos no se importa: se sube después desde la ficha del producto.
+TIPOS = {
+    'clientes': (Cliente, ClienteForm, ['nombre', 'apellido', 'email', 'telefono', 'direccion']),
+    'productos': (Producto, ProductoForm, ['nombre', 'descripcion', 'precio', 'stock']),
+}
+
+
+class ArchivoNoValido(ValueError):
+    pass
+
+
+class ResultadoLote:
+    """Filas creadas y errores de un lote: errores es una lista de (línea, mensajes)."""
+    def __init__(self, creados, errores):
+        self.creados = creados
+        self.errores = errores
+
+
+def importar(archivo, nombre_archivo, tipo, usuario, tamano_lote=TAMANO_LOTE):
+    """
+    Importa 'archivo' (abierto en binario) como registros 'tipo' del usuario y
+    va devolviendo un ResultadoLote por cada lote procesado.
+    """
+    modelo, formulario, campos = TIPOS[tipo]
+    Formulario = modelform_factory(modelo, form=formulario, fields=campos)
+
+    filas = leer_filas(archivo, nombre_archivo)
+    cabecera = [str(columna or '').strip().lower() for columna in next(filas, [])]
+    faltan = [campo for campo in campos if campo not in cabecera and Formulario.base_fields[campo].required]
+    if faltan:
+        raise ArchivoNoValido(f'Faltan columnas obligatorias: {", ".join(faltan)}.')
+    columnas = [(i, columna) for i, columna in enumerate(cabecera) if columna in campos]
+
+    # La cabecera es la línea 1 del archivo.
+    numeradas = enumerate(filas, start=2)
+    while lote := list(islice(numeradas, tamano_lote)):
+        objetos, errores = [], []
+        for linea, fila in lote:
+            if not any(fila):
+                continue
+            datos = {columna: _texto(fila[i]) if i < len(fila) else '' for i, columna in columnas}
+            form = Formulario(datos)
+            if form.is_valid():
+                objeto = form.save(commit=False)
+                objeto.usuario = usuario
+                objetos.append(objeto)
+            else:
+                errores.append((linea, [
+                    f'{campo}: {mensaje}' if campo != '__all__' else mensaje
+                    for campo, mensajes in form.errors.items() for mensaje in mensajes
+                ]))
+        if objetos:
+            # bulk_create no pasa por save() ni por post_save: la caché del usuario se invalida a mano.
+            modelo.objects.bulk_create(objetos)
+            invalidar_tenant(usuario.pk)
+        yield ResultadoLote(len(objetos), errores)
+
+
+def leer_filas(archivo, nombre_archivo):
+    """Generador de filas (listas de valores) de un CSV o un .xlsx, incluida la cabecera."""
+    extension = os.path.splitext(nombre_archivo)[1].lower()
+    if extension == '.csv':
+        return _filas_csv(archivo)
+    if extension == '.xlsx':
+        return _filas_xlsx(archivo)
+    raise ArchivoNoValido('Formato no soportado. Use un archivo .csv o .xlsx.')
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(getattr(archivo, 'file', archivo), encoding='utf-8-sig', newline='')
+    try:
+        # Excel en español exporta con ';': se detecta el separador en el principio del archivo.
+        muestra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(texto, dialecto)
+    except UnicodeDecodeError as e:
+        raise ArchivoNoValido('El archivo CSV debe estar codificado en UTF-8.') from e
+    except csv.Error as e:
+        raise ArchivoNoValido(f'El archivo CSV no es válido ({e}).') from e
+    finally:
+        # Se suelta el archivo sin cerrarlo: es de quien lo abrió.
+        texto.detach()
+
+
+def _filas_xlsx(archivo):
+    # Se importa aquí para no cargar openpyxl en cada arranque, solo al importar un .xlsx.
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # read_only lee la hoja en streaming en lugar de cargar el libro entero.
+    try:
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    # KeyError: un .zip que no es un libro de Excel (le falta [Content_Types].xml u otra parte).
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ArchivoNoValido('El archivo no es un .xlsx válido. Guárdelo de nuevo desde Excel o expórtelo a CSV.') from e
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
@@ -0,0 +1,212 @@
+import datetime
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from ventas.cache import invalidar_tenant
+from ventas.models import Cliente, Factura, Pago, Producto
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Código de estado esperado de cada escenario (los POST correctos redirigen al detalle).
+ESPERADO = {'dashboard': 200, 'lista_facturas': 200, 'detalle_factura': 200, 'crear_factura': 302, 'añadir_pago': 302}
+
+
+def _rss_max_mb():
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes.
+    return round(maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide las vistas más usadas (dashboard, lista_facturas, detalle_factura, crear_factura con '
+        'varias líneas y añadir_pago) con el cliente de pruebas de Django sobre los datos de '
+        'sembrar_datos. Guarda en un JSON la latencia p50/p95/p99, las consultas por petición y la '
+        'memoria máxima del proceso; con --comparar muestra la diferencia con un resultado anterior. '
+        'Las facturas y pagos creados se borran al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', default='bench_0', help='Usuario sembrado con sembrar_datos.')
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones medidas por escenario.')
+        parser.add_argument('--calentamiento', type=int, default=20, help='Peticiones previas sin medir.')
+        parser.add_argument('--lineas', type=int, default=5, help='Líneas de cada factura creada.')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', default='benchmark.json', help='Archivo JSON de resultados.')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior con el que comparar.')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario "{options["usuario"]}"; ejecuta antes sembrar_datos.')
+        facturas = list(Factura.objects.filter(usuario=usuario).order_by('pk').values_list('pk', flat=True))
+        pendientes = list(
+            Factura.objects.filter(usuario=usuario, estado__in=['PENDIENTE', 'ATRASADA']).order_by('pk').values_list('pk', flat=True)
+        )
+        clientes = list(Cliente.objects.filter(usuario=usuario).order_by('pk').values_list('pk', flat=True))
+        productos = list(Producto.objects.filter(usuario=usuario).order_by('pk').values_list('pk', flat=True))
+        if not (facturas and pendientes and len(productos) >= options['lineas']):
+            raise CommandError(f'"{usuario.username}" no tiene datos suficientes; ejecuta antes sembrar_datos.')
+        # Se lee antes de medir: --comparar puede ser el mismo archivo que --salida, que se sobrescribe al final.
+        anterior = self.cargar(options['comparar']) if options['comparar'] else {}
+
+        aleatorio = random.Random(options['semilla'])
+        navegador = Client()
+        navegador.force_login(usuario)
+        escenarios = {
+            'dashboard': lambda: navegador.get(reverse('ventas:dashboard')),
+            'lista_facturas': lambda: navegador.get(reverse('ventas:lista_facturas')),
+            'detalle_factura': lambda: navegador.get(reverse('ventas:detalle_factura', args=[aleatorio.choice(facturas)])),
+            'crear_factura': lambda: navegador.post(
+                reverse('ventas:crear_factura'),
+                self.datos_factura(aleatorio.choice(clientes), aleatorio.sample(productos, options['lineas'])),
+            ),
+            'añadir_pago': lambda: navegador.post(
+                reverse('ventas:añadir_pago', args=[aleatorio.choice(pendientes)]), {'monto': '0.01', 'metodo_pago': 'EFECTIVO'},
+            ),
+        }
+
+        ultima_factura = Factura.objects.aggregate(maximo=Max('pk'))['maximo'] or 0
+        ultimo_pago = Pago.objects.aggregate(maximo=Max('pk'))['maximo'] or 0
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                resultados = self.medir(escenarios, options['peticiones'], options['calentamiento'])
+        finally:
+            self.limpiar(usuario, ultima_factura, ultimo_pago)
+
+        informe = {
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'parametros': {clave: options[clave] for clave in ('usuario', 'peticiones', 'calentamiento', 'lineas', 'semilla')},
+            'datos': {'facturas': len(facturas), 'clientes': len(clientes), 'productos': len(productos)},
+            'escenarios': resultados,
+            'rss_max_mb': _rss_max_mb(),
+        }
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+
+        self.mostrar(informe, anterior)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}.'))
+
+    def datos_factura(self, cliente_id, productos):
+        datos = {
+            'cliente': cliente_id, 'numero_cuotas': 1,
+            'detalles-TOTAL_FORMS': len(productos), 'detalles-INITIAL_FORMS': 0,
+            'detalles-MIN_NUM_FORMS': 0, 'detalles-MAX_NUM_FORMS': 1000,
+        }
+        for i, producto_id in enumerate(productos):
+            datos[f'detalles-{i}-producto'] = producto_id
+            datos[f'detalles-{i}-cantidad'] = 1
+        return datos
+
+    def medir(self, escenarios, peticiones, calentamiento):
+        """Una petición de cada escenario por vuelta, para que las escrituras afecten a las lecturas como en uso real."""
+        tiempos = {nombre: [] for nombre in escenarios}
+        consultas = {nombre: 0 for nombre in escenarios}
+        errores = {nombre: 0 for nombre in escenarios}
+        contador = [0]
+
+        def contar(execute, sql, params, many, context):
+            contador[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            for vuelta in range(calentamiento + peticiones):
+                for nombre, peticion in escenarios.items():
+                    contador[0] = 0
+                    inicio = time.perf_counter()
+                    respuesta = peticion()
+                    duracion = time.perf_counter() - inicio
+                    if vuelta < calentamiento:
+                        continue
+                    tiempos[nombre].append(duracion * 1000)
+                    consultas[nombre] += contador[0]
+                    if respuesta.status_code != ESPERADO[nombre]:
+                        errores[nombre] += 1
+
+        resultados = {}
+        for nombre, muestras in tiempos.items():
+            cortes = statistics.quantiles(muestras, n=100, method='inclusive')
+            resultados[nombre] = {
+                'peticiones': len(muestras),
+                'p50_ms': round(cortes[49], 2),
+                'p95_ms': round(cortes[94], 2),
+                'p99_ms': round(cortes[98], 2),
+                'media_ms': round(statistics.mean(muestras), 2),
+                'consultas_por_peticion': round(consultas[nombre] / len(muestras), 2),
+                'errores': errores[nombre],
+            }
+        return resultados
+
+    def limpiar(self, usuario, ultima_factura, ultimo_pago):
+        # Uno a uno para que se devuelvan stock, saldos, cuotas y resúmenes: la
+        # siguiente ejecución encuentra los mismos datos.
+        for pago in Pago.objects.filter(pk__gt=ultimo_pago).select_related('factura'):
+            pago.delete()
+        for factura in Factura.objects.filter(pk__gt=ultima_factura):
+            factura.delete()
+        # Las ventas de hoy dejan filas de resumen a cero (o casi, en SQLite las
+        # restas son en coma flotante): se rehacen como al sembrar.
+        call_command('reconstruir_resumenes', usuario=usuario.username, stdout=StringIO())
+        invalidar_tenant(usuario.pk)
+
+    def cargar(self, ruta):
+        """Escenarios de un JSON guardado por una ejecución anterior."""
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                return json.load(archivo).get('escenarios', {})
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer "{ruta}" para comparar: {e}')
+
+    def mostrar(self, informe, anterior):
+        self.stdout.write(f'{"escenario":<16} {"p50":>9} {"p95":>9} {"p99":>9} {"consultas":>10} {"errores":>8}')
+        for nombre, r in informe['escenarios'].items():
+            linea = (
+                f'{nombre:<16} {r["p50_ms"]:>7.2f}ms {r["p95_ms"]:>7.2f}ms {r["p99_ms"]:>7.2f}ms '
+                f'{r["consultas_por_peticion"]:>10.2f} {r["errores"]:>8}'
+            )
+            previo = anterior.get(nombre)
+            if previo:
+                cambio = (r['p95_ms'] - previo['p95_ms']) / previo['p95_ms'] * 100 if previo['p95_ms'] else 0
+                linea += f'   p95 {cambio:+.1f}%, consultas {previo["consultas_por_peticion"]:.2f} -> {r["consultas_por_peticion"]:.2f}'
+                # Más de un 10 % peor en p95 o más consultas: posible regresión.
+                if cambio > 10 or r['consultas_por_peticion'] > previo['consultas_por_peticion']:
+                    linea = self.style.WARNING(f'{linea}   posible regresión')
+            self.stdout.write(linea)
+        if informe['rss_max_mb'] is not None:
+            self.stdout.write(f'Memoria máxima (RSS): {informe["rss_max_mb"]} MB')
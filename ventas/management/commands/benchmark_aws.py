@@ -0,0 +1,51 @@
+import os
+import statistics
+import time
+
+import boto3
+from botocore.stub import Stubber
+from django.core.management.base import BaseCommand
+
+from ventas.aws import obtener_cliente, reiniciar_clientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de la verificación de una subida creando un cliente de Rekognition '
+        'en cada llamada (comportamiento anterior) frente al cliente compartido de ventas.aws. '
+        'Las respuestas de AWS se simulan con botocore Stubber: solo se mide el coste local.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Stubber no firma ni envía nada, pero botocore exige región al crear el cliente.
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        imagen = b'\x89PNG' + b'\x00' * 1024
+        reiniciar_clientes()
+
+        def por_llamada():
+            return boto3.client('rekognition')
+
+        antes = self.medir(por_llamada, imagen, options['iteraciones'])
+        despues = self.medir(lambda: obtener_cliente('rekognition'), imagen, options['iteraciones'])
+
+        for etiqueta, tiempos in (('Cliente por subida', antes), ('Cliente compartido', despues)):
+            tiempos = sorted(tiempos)
+            p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+            self.stdout.write(
+                f'{etiqueta:>20}: media {statistics.mean(tiempos) * 1000:8.2f} ms  '
+                f'p50 {statistics.median(tiempos) * 1000:8.2f} ms  p95 {p95 * 1000:8.2f} ms'
+            )
+
+    def medir(self, obtener, imagen, iteraciones):
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            cliente = obtener()
+            with Stubber(cliente) as stub:
+                stub.add_response('detect_moderation_labels', {'ModerationLabels': []}, {'Image': {'Bytes': imagen}})
+                cliente.detect_moderation_labels(Image={'Bytes': imagen})
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
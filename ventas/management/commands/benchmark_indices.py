@@ -0,0 +1,104 @@
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q, Sum
+
+from ventas.models import Cliente, Factura, Pago, Producto
+from ventas.sembrado import sembrar
+
+# Índices añadidos en 0004_indices_por_usuario.
+INDICES = {
+    Cliente: ['cliente_usuario_id_idx'],
+    Producto: ['producto_usuario_id_idx'],
+    Factura: ['factura_usuario_estado_idx', 'factura_usuario_fecha_idx', 'factura_pendientes_idx'],
+    Pago: ['pago_factura_fecha_idx'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra un conjunto de datos grande (usuarios bench_*) y compara los planes EXPLAIN '
+        'y los tiempos de las consultas de las vistas con y sin los índices compuestos. Mientras '
+        'mide, la base de datos se queda sin esos índices: solo se ejecuta sobre una base de datos '
+        'de benchmark (con "bench" en el nombre) o con --permitir-bd-actual.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=5)
+        parser.add_argument('--facturas', type=int, default=50000, help='Facturas por usuario.')
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--permitir-bd-actual', action='store_true',
+                            help='Ejecutar aunque la base de datos no sea de benchmark.')
+
+    def handle(self, *args, **options):
+        nombre_bd = os.path.basename(str(connection.settings_dict['NAME']))
+        if 'bench' not in nombre_bd.lower() and not options['permitir_bd_actual']:
+            raise CommandError(
+                f'La base de datos "{nombre_bd}" no parece de benchmark: el comando quita índices y siembra '
+                f'usuarios bench_* en ella. Usa una con "bench" en el nombre (DATABASE_URL) o --permitir-bd-actual.'
+            )
+        # Una línea por factura: estas consultas no leen los detalles y así se siembra más rápido.
+        usuarios = sembrar(
+            options['usuarios'], clientes=options['facturas'] // 20, productos=options['facturas'] // 50,
+            facturas=options['facturas'], lineas=1, semilla=options['semilla'], escribir=self.stdout.write,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        consultas = self.consultas(usuarios[0])
+        despues = self.medir(consultas, options['repeticiones'])
+        # Se quitan los índices para medir la situación anterior y se vuelven a crear siempre.
+        indices = [
+            (modelo, indice) for modelo, nombres in INDICES.items()
+            for indice in modelo._meta.indexes if indice.name in nombres
+        ]
+        with connection.schema_editor() as editor:
+            for modelo, indice in indices:
+                editor.remove_index(modelo, indice)
+        try:
+            antes = self.medir(consultas, options['repeticiones'])
+        finally:
+            with connection.schema_editor() as editor:
+                for modelo, indice in indices:
+                    editor.add_index(modelo, indice)
+
+        for nombre in consultas:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {nombre}'))
+            for etiqueta, resultado in (('SIN índices', antes[nombre]), ('CON índices', despues[nombre])):
+                mediana, plan = resultado
+                self.stdout.write(f'-- {etiqueta}: mediana {mediana * 1000:.2f} ms')
+                self.stdout.write(plan)
+
+    # --------------------------------------------------------------------------
+    def consultas(self, usuario):
+        factura = Factura.objects.filter(usuario=usuario).order_by('-id').first()
+        cliente_medio = Cliente.objects.filter(usuario=usuario).order_by('id')[100:101].first()
+        return {
+            # Mismo plan que el aggregate() del dashboard, pero como queryset para poder usar explain().
+            'dashboard: contadores': Factura.objects.filter(usuario=usuario).values('usuario').annotate(
+                pendientes=Count('id', filter=Q(estado='PENDIENTE')),
+                por_cobrar=Sum('saldo_pendiente', filter=Q(estado='PENDIENTE')),
+            ),
+            'dashboard: saldo de las pendientes': Factura.objects.filter(usuario=usuario, estado='PENDIENTE').values('saldo_pendiente'),
+            'lista_facturas: primera página': Factura.objects.filter(usuario=usuario).order_by('-fecha_emision', 'id')[:25],
+            'lista_clientes: página intermedia': Cliente.objects.filter(
+                usuario=usuario, id__gt=cliente_medio.id if cliente_medio else 0
+            ).order_by('id')[:25],
+            'pagos de una factura': Pago.objects.filter(factura=factura).order_by('fecha_pago'),
+        }
+
+    def medir(self, consultas, repeticiones):
+        resultados = {}
+        for nombre, consulta in consultas.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                list(consulta.all())
+                tiempos.append(time.perf_counter() - inicio)
+            resultados[nombre] = (statistics.median(tiempos), consulta.explain())
+        return resultados
+
@@ -0,0 +1,169 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from ventas import views
+from ventas.aws import registrar_cliente, reiniciar_clientes
+from ventas.imagenes import huella_contenido
+from ventas.models import Producto, VeredictoModeracion
+
+USUARIO = 'bench_subidas'
+RUTA = '/ventas/productos/crear/'
+
+
+class AlmacenConLatencia(InMemoryStorage):
+    """Storage en memoria que tarda 'latencia' segundos en cada subida, como S3."""
+    def __init__(self, latencia=0, **kwargs):
+        super().__init__(**kwargs)
+        self.latencia = latencia
+
+    def _save(self, name, content):
+        time.sleep(self.latencia)
+        return super()._save(name, content)
+
+
+class RekognitionConLatencia:
+    def __init__(self, latencia):
+        self.latencia = latencia
+
+    def detect_moderation_labels(self, Image):
+        time.sleep(self.latencia)
+        return {'ModerationLabels': []}
+
+
+class UrlsConVista:
+    """El URLconf del proyecto con el alta de productos servida por 'vista'."""
+    def __init__(self, vista):
+        self.urlpatterns = [
+            path(RUTA.lstrip('/'), vista),
+            path('ventas/', include('ventas.urls', namespace='ventas')),
+        ]
+
+
+def _imagenes(numero):
+    """Fotos JPEG distintas (la caché de moderación no debe ahorrar llamadas)."""
+    imagenes = []
+    for n in range(numero):
+        buffer = BytesIO()
+        Image.new('RGB', (1024, 768), (n % 256, n // 256 % 256, 120)).save(buffer, format='JPEG', quality=90)
+        imagenes.append(buffer.getvalue())
+    return imagenes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara cuántas altas de productos con imagen por segundo atienden las vistas síncronas '
+        '(con --workers hilos, como workers síncronos de gunicorn) y las asíncronas (un solo event '
+        'loop, como un worker de uvicorn, con hasta --concurrencia peticiones a la vez). S3 y '
+        'Rekognition se simulan con las latencias indicadas. Los productos creados se borran al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=100, help='Subidas por variante.')
+        parser.add_argument('--workers', type=int, default=4, help='Peticiones simultáneas de la variante síncrona.')
+        parser.add_argument('--concurrencia', type=int, default=50, help='Peticiones simultáneas de la variante asíncrona.')
+        parser.add_argument('--latencia-s3', type=int, default=120, help='Milisegundos de cada subida al storage.')
+        parser.add_argument('--latencia-moderacion', type=int, default=250, help='Milisegundos de cada llamada a Rekognition.')
+
+    def handle(self, *args, **options):
+        usuario, _ = User.objects.get_or_create(username=USUARIO)
+        imagenes = _imagenes(options['peticiones'])
+        almacen = {
+            'default': {
+                'BACKEND': f'{__name__}.AlmacenConLatencia',
+                'OPTIONS': {'latencia': options['latencia_s3'] / 1000},
+            },
+            'staticfiles': settings.STORAGES['staticfiles'],
+        }
+        registrar_cliente('rekognition', RekognitionConLatencia(options['latencia_moderacion'] / 1000))
+        try:
+            with override_settings(STORAGES=almacen, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                with override_settings(ROOT_URLCONF=UrlsConVista(views.crear_producto)):
+                    sincrona = self.medir_sincrona(usuario, imagenes, options['workers'])
+                self.limpiar(usuario, imagenes)
+                with override_settings(ROOT_URLCONF=UrlsConVista(views.crear_producto_async)):
+                    asincrona = asyncio.run(self.medir_asincrona(usuario, imagenes, options['concurrencia']))
+        finally:
+            self.limpiar(usuario, imagenes)
+            reiniciar_clientes()
+
+        self.stdout.write(f'{"variante":<28} {"subidas/s":>10} {"p50":>9} {"p95":>9} {"errores":>8}')
+        for nombre, resultado in (
+            (f'síncrona ({options["workers"]} workers)', sincrona),
+            (f'asíncrona (concurrencia {options["concurrencia"]})', asincrona),
+        ):
+            self.stdout.write(
+                f'{nombre:<28} {resultado["por_segundo"]:>10.1f} {resultado["p50_ms"]:>7.0f}ms '
+                f'{resultado["p95_ms"]:>7.0f}ms {resultado["errores"]:>8}'
+            )
+        self.stdout.write('La variante asíncrona además modera cada imagen durante la petición.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Asíncrona / síncrona: {asincrona["por_segundo"] / sincrona["por_segundo"]:.1f}x subidas por segundo.'
+        ))
+
+    def datos(self, n, imagen):
+        return {
+            'nombre': f'Subida {n}', 'precio': '10.00', 'stock': '1',
+            'imagen': SimpleUploadedFile(f'subida-{n}.jpg', imagen, content_type='image/jpeg'),
+        }
+
+    def medir_sincrona(self, usuario, imagenes, workers):
+        local = threading.local()
+
+        def subir(n):
+            if not hasattr(local, 'cliente'):
+                local.cliente = Client()
+                local.cliente.force_login(usuario)
+            inicio = time.perf_counter()
+            respuesta = local.cliente.post(RUTA, self.datos(n, imagenes[n]))
+            return time.perf_counter() - inicio, respuesta.status_code
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as grupo:
+            resultados = list(grupo.map(subir, range(len(imagenes))))
+        return self.resumir(resultados, time.perf_counter() - inicio)
+
+    async def medir_asincrona(self, usuario, imagenes, concurrencia):
+        cliente = AsyncClient()
+        await cliente.aforce_login(usuario)
+        limite = asyncio.Semaphore(concurrencia)
+
+        async def subir(n):
+            async with limite:
+                # Como hace el ASGIHandler con cada petición: su propio hilo para el código síncrono.
+                async with ThreadSensitiveContext():
+                    inicio = time.perf_counter()
+                    respuesta = await cliente.post(RUTA, self.datos(n, imagenes[n]))
+                    return time.perf_counter() - inicio, respuesta.status_code
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(subir(n) for n in range(len(imagenes))))
+        return self.resumir(resultados, time.perf_counter() - inicio)
+
+    def resumir(self, resultados, duracion):
+        tiempos = [segundos * 1000 for segundos, _ in resultados]
+        cortes = statistics.quantiles(tiempos, n=100, method='inclusive')
+        return {
+            'por_segundo': len(resultados) / duracion,
+            'p50_ms': cortes[49],
+            'p95_ms': cortes[94],
+            'errores': sum(1 for _, estado in resultados if estado != 302),
+        }
+
+    def limpiar(self, usuario, imagenes):
+        Producto.objects.filter(usuario=usuario).delete()
+        VeredictoModeracion.objects.filter(huella__in=[huella_contenido(imagen) for imagen in imagenes]).delete()
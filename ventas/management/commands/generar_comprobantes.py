@@ -0,0 +1,83 @@
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ventas.comprobantes import PdfNoDisponible, facturas_con_detalles, obtener_pdf
+from ventas.models import Factura
+
+
+def _iniciar_proceso():
+    # Con 'spawn' el proceso hijo arranca sin Django configurado; con 'fork' no hace nada.
+    django.setup()
+
+
+def _generar_lote(ids):
+    """Genera los PDF que falten de las facturas 'ids'. Se ejecuta en un proceso del pool."""
+    generados = existentes = 0
+    for factura in facturas_con_detalles('usuario__perfil').filter(pk__in=ids):
+        _, generado = obtener_pdf(factura)
+        if generado:
+            generados += 1
+        else:
+            existentes += 1
+    return generados, existentes
+
+
+def _fecha(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha no válida: "{valor}" (formato AAAA-MM-DD).')
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera por adelantado los comprobantes PDF de las facturas emitidas en un rango '
+        'de fechas, repartidos entre varios procesos. Los que ya están al día no se rehacen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help='Fecha de emisión inicial (AAAA-MM-DD).')
+        parser.add_argument('--hasta', type=_fecha, help='Fecha de emisión final (AAAA-MM-DD).')
+        parser.add_argument('--usuario', help='Solo las facturas de este usuario.')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos de generación (1 = sin pool).')
+        parser.add_argument('--lote', type=int, default=50, help='Facturas por tarea enviada a cada proceso.')
+
+    def handle(self, *args, **options):
+        facturas = Factura.objects.order_by('pk')
+        if options['desde']:
+            facturas = facturas.filter(fecha_emision__gte=options['desde'])
+        if options['hasta']:
+            facturas = facturas.filter(fecha_emision__lte=options['hasta'])
+        if options['usuario']:
+            facturas = facturas.filter(usuario__username=options['usuario'])
+        ids = list(facturas.values_list('pk', flat=True))
+        lotes = [ids[i:i + options['lote']] for i in range(0, len(ids), options['lote'])]
+
+        try:
+            if options['procesos'] <= 1:
+                generados, existentes = self._sumar(map(_generar_lote, lotes), len(ids), options['verbosity'])
+            else:
+                # Los procesos hijos no deben heredar la conexión abierta del padre.
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=options['procesos'], initializer=_iniciar_proceso) as pool:
+                    generados, existentes = self._sumar(pool.map(_generar_lote, lotes), len(ids), options['verbosity'])
+        except PdfNoDisponible as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids)} facturas: {generados} comprobantes generados, {existentes} ya estaban al día.'
+        ))
+
+    def _sumar(self, resultados, total, verbosity):
+        generados = existentes = 0
+        for hechos, ya_estaban in resultados:
+            generados += hechos
+            existentes += ya_estaban
+            if verbosity > 1:
+                self.stdout.write(f'{generados + existentes}/{total} facturas...')
+        return generados, existentes
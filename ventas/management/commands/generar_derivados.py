@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from ventas.cache import invalidar_tenant
+from ventas.imagenes import imagen_principal, publicar_derivados
+from ventas.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera las versiones responsive (96/240/640px, JPEG y WebP) de las imágenes '
+        'de productos que todavía no las tienen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Regenera también los productos que ya tienen versiones.')
+        parser.add_argument('--lote', type=int, default=200)
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(Q(imagen='') | Q(imagen__isnull=True)).exclude(estado_imagen__in=['PENDIENTE', 'PROCESANDO'])
+        if not options['todos']:
+            productos = productos.filter(imagenes_derivadas={})
+        productos = productos.only('id', 'usuario', 'imagen', 'imagen_original').order_by('pk')
+
+        generados = errores = 0
+        ultimo_id = 0
+        while True:
+            lote = list(productos.filter(pk__gt=ultimo_id)[:options['lote']])
+            if not lote:
+                break
+            ultimo_id = lote[-1].pk
+            for producto in lote:
+                # Se parte del original si se conserva; si no, de la imagen publicada.
+                fuente = producto.imagen_original or producto.imagen
+                try:
+                    with fuente.open('rb') as archivo:
+                        derivadas = publicar_derivados(archivo.read())
+                except Exception as e:
+                    errores += 1
+                    self.stderr.write(f'Producto #{producto.pk}: {e}')
+                    continue
+                Producto.objects.filter(pk=producto.pk).update(
+                    imagenes_derivadas=derivadas, imagen=imagen_principal(derivadas)
+                )
+                invalidar_tenant(producto.usuario_id)
+                generados += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{generados} productos con versiones nuevas, {errores} errores.'))
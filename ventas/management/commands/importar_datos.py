@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.importacion import TAMANO_LOTE, TIPOS, ArchivoNoValido, importar
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa clientes o productos de un usuario desde un archivo .csv o .xlsx, '
+        'en lotes, e informa de las filas que no pasan la validación.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(TIPOS))
+        parser.add_argument('archivo')
+        parser.add_argument('--usuario', required=True, help='Nombre del usuario dueño de los registros.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas validadas e insertadas por transacción.')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario "{options["usuario"]}".')
+
+        creados = con_errores = 0
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                for lote in importar(archivo, options['archivo'], options['tipo'], usuario, options['lote']):
+                    creados += lote.creados
+                    con_errores += len(lote.errores)
+                    for linea, mensajes in lote.errores:
+                        self.stderr.write(f'Fila {linea}: {"; ".join(mensajes)}')
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'{creados} {options["tipo"]} importados...')
+        except (ArchivoNoValido, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{creados} {options["tipo"]} importados, {con_errores} filas con errores.'
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ventas.cache import invalidar_tenant
+from ventas.models import Factura
+
+
+class Command(BaseCommand):
+    help = (
+        'Pasa a ATRASADA las facturas pendientes con alguna cuota vencida sin pagar, '
+        'de todos los usuarios, con UPDATE por lotes. Pensado para ejecutarse a diario (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10000, help='Facturas actualizadas por sentencia.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta las facturas vencidas.')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        # fecha_vencimiento es la de la primera cuota sin pagar (ver cuotas.proximo_vencimiento),
+        # así que usa el índice parcial factura_vencimiento_idx sin mirar las cuotas. Las ya marcadas dejan de cumplir
+        # la condición, así que cada lote toma las siguientes sin necesidad de ordenar.
+        vencidas = Factura.objects.filter(estado='PENDIENTE', fecha_vencimiento__lt=hoy, saldo_pendiente__gt=0)
+        if options['dry_run']:
+            self.stdout.write(f'{vencidas.count()} facturas vencidas pendientes de marcar.')
+            return
+
+        inicio = time.perf_counter()
+        marcadas = 0
+        while True:
+            lote = list(vencidas.values_list('pk', 'usuario_id')[:options['lote']])
+            if not lote:
+                break
+            # La condición se repite en el UPDATE por si alguna se pagó entre las dos sentencias.
+            marcadas += vencidas.filter(pk__in=[pk for pk, _ in lote]).update(
+                estado='ATRASADA', actualizado=timezone.now()
+            )
+            # update() no dispara señales: se invalida a mano la caché de los usuarios afectados.
+            for usuario_id in {usuario_id for _, usuario_id in lote}:
+                invalidar_tenant(usuario_id)
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{marcadas} facturas marcadas como ATRASADA en {segundos:.2f} s '
+            f'({marcadas / segundos if segundos else 0:,.0f} filas/s).'
+        ))
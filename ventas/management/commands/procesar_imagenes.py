@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ventas.imagenes import procesar_producto, reclamar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker de imágenes: modera, redimensiona y publica las imágenes de productos '
+        'pendientes. Con --continuo se queda esperando trabajo nuevo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='No termina al vaciar la cola.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas a la cola vacía.')
+        parser.add_argument('--lote', type=int, default=10, help='Productos reclamados por consulta.')
+
+    def handle(self, *args, **options):
+        procesados = 0
+        while True:
+            ids = reclamar_pendientes(options['lote'])
+            for producto_id in ids:
+                procesar_producto(producto_id)
+            procesados += len(ids)
+            if ids:
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+        self.stdout.write(self.style.SUCCESS(f'{procesados} imágenes procesadas.'))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ventas.imagenes import estadisticas_moderacion
+from ventas.models import VeredictoModeracion
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los veredictos de moderación caducados y, si quedan más de '
+        'VENTAS_MODERACION_MAXIMO, los más antiguos. Muestra aciertos y fallos de la caché.'
+    )
+
+    def handle(self, *args, **options):
+        caducados, _ = VeredictoModeracion.objects.filter(expira__lte=timezone.now()).delete()
+
+        maximo = getattr(settings, 'VENTAS_MODERACION_MAXIMO', 100000)
+        corte = VeredictoModeracion.objects.order_by('-expira').values_list('expira', flat=True)[maximo:maximo + 1].first()
+        desalojados = 0
+        if corte is not None:
+            desalojados, _ = VeredictoModeracion.objects.filter(expira__lte=corte).delete()
+
+        estadisticas = estadisticas_moderacion()
+        self.stdout.write(self.style.SUCCESS(
+            f'{caducados} caducados y {desalojados} desalojados. '
+            f"Aciertos: {estadisticas['aciertos']}, fallos: {estadisticas['fallos']}."
+        ))
@@ -0,0 +1,87 @@
+import decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ventas.models import DetalleFactura, Factura, Pago
+from ventas.cuotas import proximo_vencimiento, regenerar_cuotas
+from ventas.resumenes import acumular_factura
+from ventas.signals import totales_actualizados
+
+CENTAVO = decimal.Decimal('0.01')
+
+
+def _suma(queryset, expresion):
+    """Subquery con la suma de 'expresion' por factura (0 si no hay filas)."""
+    suma = queryset.filter(factura=OuterRef('pk')).values('factura').annotate(s=Sum(expresion)).values('s')
+    return Coalesce(
+        Subquery(suma),
+        Value(decimal.Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula total y saldo de todas las facturas a partir de sus detalles y pagos, '
+        'informa las que se han desviado de los valores incrementales y las repara.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa las diferencias, no guarda nada.')
+        parser.add_argument('--lote', type=int, default=1000, help='Facturas procesadas por consulta.')
+
+    def handle(self, *args, **options):
+        facturas = (
+            Factura.objects
+            .annotate(
+                total_real=_suma(DetalleFactura.objects, F('cantidad') * F('precio_unitario')),
+                pagado_real=_suma(Pago.objects, 'monto'),
+            )
+            .only('id', 'usuario', 'cliente', 'fecha_emision', 'fecha_vencimiento', 'numero_cuotas', 'total', 'saldo_pendiente', 'estado')
+            .order_by('pk')
+        )
+
+        revisadas = reparadas = 0
+        ultimo_id = 0
+        while True:
+            lote = list(facturas.filter(pk__gt=ultimo_id)[:options['lote']])
+            if not lote:
+                break
+            ultimo_id = lote[-1].pk
+            revisadas += len(lote)
+
+            corregidas, diferencias = [], []
+            for factura in lote:
+                total = decimal.Decimal(factura.total_real).quantize(CENTAVO)
+                saldo = (total - decimal.Decimal(factura.pagado_real)).quantize(CENTAVO)
+                vencimiento = proximo_vencimiento(factura.fecha_emision, factura.numero_cuotas, total, total - saldo)
+                estado = Factura.calcular_estado(total, saldo, vencimiento)
+                if (factura.total, factura.saldo_pendiente, factura.fecha_vencimiento, factura.estado) == (total, saldo, vencimiento, estado):
+                    continue
+                self.stdout.write(
+                    f'Factura #{factura.pk}: total {factura.total} -> {total}, '
+                    f'saldo {factura.saldo_pendiente} -> {saldo}, estado {factura.estado} -> {estado}'
+                )
+                # Lo que cambia se aplica también a los resúmenes de informes.
+                diferencias.append((factura, total - factura.total, saldo - factura.saldo_pendiente))
+                factura.total, factura.saldo_pendiente, factura.fecha_vencimiento, factura.estado = total, saldo, vencimiento, estado
+                factura.actualizado = timezone.now()
+                corregidas.append(factura)
+
+            if corregidas and not options['dry_run']:
+                with transaction.atomic():
+                    Factura.objects.bulk_update(corregidas, ['total', 'saldo_pendiente', 'fecha_vencimiento', 'estado', 'actualizado'])
+                    for factura, facturado, pendiente in diferencias:
+                        acumular_factura(factura.usuario_id, factura.cliente_id, factura.fecha_emision, facturado, pendiente)
+                        regenerar_cuotas(factura.pk, factura.usuario_id, factura.fecha_emision, factura.numero_cuotas,
+                                         factura.total, factura.total - factura.saldo_pendiente)
+                for factura in corregidas:
+                    totales_actualizados.send(sender=Factura, factura=factura)
+            reparadas += len(corregidas)
+
+        accion = 'con diferencias' if options['dry_run'] else 'reparadas'
+        self.stdout.write(self.style.SUCCESS(f'{revisadas} facturas revisadas, {reparadas} {accion}.'))
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+from ventas.models import DetalleFactura, Factura, Pago, ResumenDiario, ResumenProductoDiario
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenera desde cero los resúmenes diarios de los informes a partir de las '
+        'facturas, pagos y detalles. Los informes siguen viendo los datos anteriores '
+        'hasta que termina.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Solo los resúmenes de este usuario.')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas insertadas por consulta.')
+
+    def handle(self, *args, **options):
+        facturas, pagos, detalles = Factura.objects.all(), Pago.objects.all(), DetalleFactura.objects.all()
+        resumenes, resumenes_producto = ResumenDiario.objects.all(), ResumenProductoDiario.objects.all()
+        if options['usuario']:
+            facturas = facturas.filter(usuario__username=options['usuario'])
+            pagos = pagos.filter(factura__usuario__username=options['usuario'])
+            detalles = detalles.filter(factura__usuario__username=options['usuario'])
+            resumenes = resumenes.filter(usuario__username=options['usuario'])
+            resumenes_producto = resumenes_producto.filter(usuario__username=options['usuario'])
+
+        # Una fila por (usuario, cliente, día): facturado y saldo por fecha de emisión, cobrado por fecha de pago.
+        dias = defaultdict(dict)
+        for usuario_id, cliente_id, fecha, facturado, saldo in (
+            facturas.values('usuario', 'cliente', 'fecha_emision')
+            .annotate(facturado=Sum('total'), saldo=Sum('saldo_pendiente'))
+            .values_list('usuario', 'cliente', 'fecha_emision', 'facturado', 'saldo')
+            .iterator()
+        ):
+            dias[usuario_id, cliente_id, fecha].update(facturado=facturado, saldo=saldo)
+        for usuario_id, cliente_id, fecha, cobrado in (
+            pagos.annotate(dia=TruncDate('fecha_pago'))
+            .values('factura__usuario', 'factura__cliente', 'dia')
+            .annotate(cobrado=Sum('monto'))
+            .values_list('factura__usuario', 'factura__cliente', 'dia', 'cobrado')
+            .iterator()
+        ):
+            dias[usuario_id, cliente_id, fecha]['cobrado'] = cobrado
+
+        importe = ExpressionWrapper(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=14, decimal_places=2))
+        ventas_producto = (
+            detalles.values('factura__usuario', 'producto', 'factura__fecha_emision')
+            .annotate(unidades=Sum('cantidad'), importe=Sum(importe))
+            .values_list('factura__usuario', 'producto', 'factura__fecha_emision', 'unidades', 'importe')
+        )
+
+        with transaction.atomic():
+            resumenes.delete()
+            resumenes_producto.delete()
+            ResumenDiario.objects.bulk_create(
+                (ResumenDiario(usuario_id=usuario_id, cliente_id=cliente_id, fecha=fecha, **valores)
+                 for (usuario_id, cliente_id, fecha), valores in dias.items()),
+                batch_size=options['lote'],
+            )
+            creados_producto = ResumenProductoDiario.objects.bulk_create(
+                (ResumenProductoDiario(usuario_id=usuario_id, producto_id=producto_id, fecha=fecha, unidades=unidades, importe=total)
+                 for usuario_id, producto_id, fecha, unidades, total in ventas_producto.iterator()),
+                batch_size=options['lote'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(dias)} resúmenes diarios y {len(creados_producto)} resúmenes de producto regenerados.'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ventas.sembrado import sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra datos deterministas para los benchmarks: N usuarios <prefijo>_<n>, cada uno con '
+        'M clientes, productos y facturas con sus líneas, pagos, cuotas y resúmenes. Con la misma '
+        'semilla y tamaños se generan siempre los mismos datos; los usuarios que ya tienen facturas '
+        'no se tocan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=3)
+        parser.add_argument('--clientes', type=int, default=200, help='Clientes por usuario.')
+        parser.add_argument('--productos', type=int, default=500, help='Productos por usuario.')
+        parser.add_argument('--facturas', type=int, default=2000, help='Facturas por usuario.')
+        parser.add_argument('--lineas', type=int, default=3, help='Líneas por factura.')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--prefijo', default='bench', help='Prefijo del nombre de los usuarios.')
+
+    def handle(self, *args, **options):
+        usuarios = sembrar(
+            options['usuarios'], clientes=options['clientes'], productos=options['productos'],
+            facturas=options['facturas'], lineas=options['lineas'], semilla=options['semilla'],
+            prefijo=options['prefijo'], escribir=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(usuarios)} usuarios listos: {", ".join(usuario.username for usuario in usuarios)}.'
+        ))
@@ -0,0 +1,264 @@
+"""
+Métricas de rendimiento por vista, pensadas para estar activas en producción.
+
+MetricasMiddleware mide cada petición: tiempo total, número y tiempo de las
+consultas a la base de datos (un execute_wrapper que se instala en cada conexión
+al abrirla), tiempo de render
+de plantillas (el backend PlantillasMedidas) y tiempo de las llamadas a AWS
+(eventos de botocore, ver instrumentar_eventos). Lo devuelve en la cabecera
+Server-Timing (visible en las herramientas de desarrollo del navegador) y lo
+acumula por vista en histogramas de cubetas fijas que se consultan en
+/ventas/metricas/ (solo staff).
+
+La medición en curso va en una ContextVar, que asgiref copia a los hilos de
+sync_to_async: con ASGI también se cuentan las consultas y plantillas que las
+vistas asíncronas hacen en otros hilos (cada uno con su propia conexión).
+
+Cada medición es un par de perf_counter() y una suma; no hay E/S ni locks
+durante la petición salvo uno al final para acumular. Los histogramas viven en
+la memoria de cada proceso: con varios workers el endpoint muestra los del
+worker que atiende la petición (una muestra del total) y se reinician al
+reiniciar el proceso.
+
+Las respuestas en streaming (exportaciones CSV, PDF) se miden hasta que se
+devuelve la respuesta; lo que se consulte al recorrerla no se cuenta.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+# Límites superiores (en ms) de las cubetas de los histogramas; la última es "más".
+CUBETAS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """Lo que se lleva gastado en la petición en curso (tiempos en segundos)."""
+    __slots__ = ('consultas', 'tiempo_bd', 'tiempo_plantillas', 'llamadas_externas', 'tiempo_externo')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+        self.tiempo_plantillas = 0.0
+        self.llamadas_externas = 0
+        self.tiempo_externo = 0.0
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.tiempo_bd += time.perf_counter() - inicio
+        medicion.consultas += 1
+
+
+def _instrumentar_conexion(sender, connection, **kwargs):
+    # connection_created se emite en cada reconexión del mismo objeto.
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+connection_created.connect(_instrumentar_conexion)
+
+
+class Histograma:
+    __slots__ = ('cuentas', 'suma')
+
+    def __init__(self):
+        self.cuentas = [0] * (len(CUBETAS_MS) + 1)
+        self.suma = 0.0
+
+    def anotar(self, ms):
+        self.cuentas[bisect_left(CUBETAS_MS, ms)] += 1
+        self.suma += ms
+
+    def percentil(self, p):
+        """Límite superior de la cubeta donde cae el percentil p (None si cae en la última)."""
+        objetivo = sum(self.cuentas) * p / 100
+        acumulado = 0
+        for limite, cuenta in zip(CUBETAS_MS, self.cuentas):
+            acumulado += cuenta
+            if cuenta and acumulado >= objetivo:
+                return limite
+        return None
+
+    def resumen(self):
+        peticiones = sum(self.cuentas)
+        return {
+            'media': round(self.suma / peticiones, 2) if peticiones else 0,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99),
+            'cubetas': {f'<={limite}': cuenta for limite, cuenta in zip(CUBETAS_MS, self.cuentas)} | {'mas': self.cuentas[-1]},
+        }
+
+
+class EstadisticasVista:
+    def __init__(self):
+        self.peticiones = 0
+        self.total = Histograma()
+        self.bd = Histograma()
+        self.consultas = 0
+        self.plantillas = 0.0
+        self.externo = 0.0
+        self.llamadas_externas = 0
+
+    def resumen(self):
+        return {
+            'peticiones': self.peticiones,
+            'total_ms': self.total.resumen(),
+            'bd_ms': self.bd.resumen(),
+            'consultas_por_peticion': round(self.consultas / self.peticiones, 2),
+            'plantillas_ms_media': round(self.plantillas / self.peticiones, 2),
+            'externo_ms_media': round(self.externo / self.peticiones, 2),
+            'llamadas_externas': self.llamadas_externas,
+        }
+
+
+_estadisticas = {}
+_lock = threading.Lock()
+_desde = time.time()
+
+
+def registrar(vista, total, medicion):
+    with _lock:
+        estadisticas = _estadisticas.get(vista)
+        if estadisticas is None:
+            estadisticas = _estadisticas[vista] = EstadisticasVista()
+        estadisticas.peticiones += 1
+        estadisticas.total.anotar(total * 1000)
+        estadisticas.bd.anotar(medicion.tiempo_bd * 1000)
+        estadisticas.consultas += medicion.consultas
+        estadisticas.plantillas += medicion.tiempo_plantillas * 1000
+        estadisticas.externo += medicion.tiempo_externo * 1000
+        estadisticas.llamadas_externas += medicion.llamadas_externas
+
+
+def resumen():
+    """Estadísticas acumuladas en este proceso, por vista."""
+    with _lock:
+        vistas = {vista: estadisticas.resumen() for vista, estadisticas in sorted(_estadisticas.items())}
+    return {'pid': os.getpid(), 'desde': _desde, 'vistas': vistas}
+
+
+def reiniciar():
+    global _desde
+    with _lock:
+        _estadisticas.clear()
+        _desde = time.time()
+
+
+# ==============================================================================
+# MIDDLEWARE
+# ==============================================================================
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self.anotar(request, respuesta, time.perf_counter() - inicio, medicion)
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self.anotar(request, respuesta, time.perf_counter() - inicio, medicion)
+
+    def anotar(self, request, respuesta, total, medicion):
+        coincidencia = getattr(request, 'resolver_match', None)
+        registrar(coincidencia.view_name if coincidencia else '(sin vista)', total, medicion)
+        if getattr(settings, 'VENTAS_SERVER_TIMING', True):
+            respuesta['Server-Timing'] = server_timing(total, medicion)
+        return respuesta
+
+
+def server_timing(total, medicion):
+    return ', '.join([
+        f'total;dur={total * 1000:.1f}',
+        f'bd;dur={medicion.tiempo_bd * 1000:.1f};desc="{medicion.consultas} consultas"',
+        f'plantillas;dur={medicion.tiempo_plantillas * 1000:.1f}',
+        f'aws;dur={medicion.tiempo_externo * 1000:.1f};desc="{medicion.llamadas_externas} llamadas"',
+    ])
+
+
+# ==============================================================================
+# PLANTILLAS
+# ==============================================================================
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.tiempo_plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """
+    El backend de plantillas de Django, midiendo el render de cada plantilla que
+    se pide con render() / render_to_string() (los {% include %} van dentro).
+    """
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name).template, self)
+
+
+# ==============================================================================
+# LLAMADAS A AWS (BOTOCORE)
+# ==============================================================================
+def _antes_de_llamar(context, **kwargs):
+    if _medicion_actual.get() is not None:
+        context['metricas_inicio'] = time.perf_counter()
+
+
+def _despues_de_llamar(context, **kwargs):
+    inicio = context.pop('metricas_inicio', None)
+    medicion = _medicion_actual.get()
+    if inicio is not None and medicion is not None:
+        # Incluye los reintentos de botocore: es lo que espera la petición.
+        medicion.tiempo_externo += time.perf_counter() - inicio
+        medicion.llamadas_externas += 1
+
+
+def instrumentar_eventos(eventos):
+    """Mide las llamadas de un cliente (client.meta.events) o sesión (session.events) de boto3."""
+    # before-parameter-build se emite siempre; before-call no llega a los
+    # manejadores que van detrás de uno que ya devuelve respuesta (Stubber).
+    eventos.register('before-parameter-build', _antes_de_llamar, unique_id='ventas-metricas-inicio')
+    eventos.register('after-call', _despues_de_llamar, unique_id='ventas-metricas-fin')
+    eventos.register('after-call-error', _despues_de_llamar, unique_id='ventas-metricas-error')
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0003_perfil'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['usuario', 'id'], name='cliente_usuario_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['usuario', 'estado'], include=('saldo_pendiente',), name='factura_usuario_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['usuario', '-fecha_emision', 'id'], name='factura_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['usuario', 'fecha_emision'], name='factura_pendientes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['factura', 'fecha_pago'], name='pago_factura_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['usuario', 'id'], name='producto_usuario_id_idx'),
+        ),
+    ]
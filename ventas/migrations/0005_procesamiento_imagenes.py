@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_indices_por_usuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='error_imagen',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='estado_imagen',
+            field=models.CharField(blank=True, choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTA', 'Lista'), ('RECHAZADA', 'Rechazada'), ('ERROR', 'Error')], editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_original',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to='productos/originales/'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='procesando_desde',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
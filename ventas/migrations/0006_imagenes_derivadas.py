@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0005_procesamiento_imagenes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagenes_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
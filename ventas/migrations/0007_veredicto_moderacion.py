@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0006_imagenes_derivadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VeredictoModeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=64, unique=True)),
+                ('etiquetas', models.JSONField(default=list)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0008_factura_actualizado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('facturado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ventas.cliente')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='resumen_usuario_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'cliente', 'fecha'), name='resumen_diario_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.IntegerField(default=0)),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ventas.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='resumen_prod_usuario_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'producto', 'fecha'), name='resumen_producto_unico')],
+            },
+        ),
+    ]
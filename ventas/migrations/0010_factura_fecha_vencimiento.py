@@ -0,0 +1,49 @@
+from dateutil.relativedelta import relativedelta
+from django.db import migrations, models
+
+
+def rellenar_vencimientos(apps, schema_editor):
+    """fecha_vencimiento = fecha_emision + numero_cuotas meses (como Factura.calcular_vencimiento)."""
+    if schema_editor.connection.vendor == 'postgresql':
+        # En PostgreSQL la suma de meses ajusta a fin de mes igual que relativedelta: una sola sentencia.
+        schema_editor.execute(
+            "UPDATE ventas_factura SET fecha_vencimiento = "
+            "fecha_emision + GREATEST(numero_cuotas, 1) * INTERVAL '1 month'"
+        )
+        return
+
+    Factura = apps.get_model('ventas', 'Factura')
+    ultimo_id = 0
+    while True:
+        lote = list(Factura.objects.filter(pk__gt=ultimo_id).order_by('pk').only('fecha_emision', 'numero_cuotas')[:5000])
+        if not lote:
+            break
+        for factura in lote:
+            factura.fecha_vencimiento = factura.fecha_emision + relativedelta(months=max(factura.numero_cuotas, 1))
+        Factura.objects.bulk_update(lote, ['fecha_vencimiento'])
+        ultimo_id = lote[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0009_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='fecha_vencimiento',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(rellenar_vencimientos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='factura',
+            name='fecha_vencimiento',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['fecha_vencimiento'], name='factura_vencimiento_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:09
+
+import decimal
+
+import django.db.models.deletion
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import migrations, models
+
+
+def generar_cuotas(apps, schema_editor):
+    """Plan de cuotas de las facturas existentes (misma lógica que ventas.cuotas.regenerar_cuotas)."""
+    Factura = apps.get_model('ventas', 'Factura')
+    Cuota = apps.get_model('ventas', 'Cuota')
+    centavo = decimal.Decimal('0.01')
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Factura.objects.filter(pk__gt=ultimo_id, total__gt=0).order_by('pk')
+            .values_list('pk', 'usuario_id', 'fecha_emision', 'numero_cuotas', 'total', 'saldo_pendiente')[:2000]
+        )
+        if not lote:
+            break
+        cuotas = []
+        for factura_id, usuario_id, fecha_emision, numero_cuotas, total, saldo in lote:
+            numero_cuotas = max(numero_cuotas, 1)
+            base, resto = divmod(int(total / centavo), numero_cuotas)
+            restante = max(total - saldo, 0)
+            for i in range(numero_cuotas):
+                importe = (base + (1 if i < resto else 0)) * centavo
+                abonado = min(importe, restante)
+                restante -= abonado
+                cuotas.append(Cuota(
+                    factura_id=factura_id, usuario_id=usuario_id, numero=i + 1,
+                    fecha_vencimiento=fecha_emision + relativedelta(months=i + 1),
+                    importe=importe, pagado=abonado, estado='PAGADA' if abonado >= importe else 'PENDIENTE',
+                ))
+        Cuota.objects.bulk_create(cuotas)
+        ultimo_id = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0010_factura_fecha_vencimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField()),
+                ('fecha_vencimiento', models.DateField()),
+                ('importe', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('pagado', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PAGADA', 'Pagada')], default='PENDIENTE', max_length=10)),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cuotas', to='ventas.factura')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'fecha_vencimiento', 'estado'], name='cuota_usuario_vencimiento_idx')],
+                'constraints': [models.UniqueConstraint(fields=('factura', 'numero'), name='cuota_factura_numero_unica')],
+            },
+        ),
+        migrations.RunPython(generar_cuotas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Deben coincidir con ventas.busqueda.CAMPOS y CONFIGURACION.
+TEXTO_COMPLETO = {
+    'cliente': ('nombre', 'apellido', 'email', 'telefono'),
+    'producto': ('nombre', 'descripcion'),
+}
+TRIGRAMAS = {
+    'cliente': ('nombre', 'apellido', 'email'),
+    'producto': ('nombre',),
+}
+
+
+def _indices(apps):
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+    from django.db.models.functions import Upper
+
+    for nombre_modelo, campos in TEXTO_COMPLETO.items():
+        modelo = apps.get_model('ventas', nombre_modelo)
+        yield modelo, GinIndex(SearchVector(*campos, config='spanish'), name=f'{nombre_modelo}_busqueda_idx')
+        for campo in TRIGRAMAS[nombre_modelo]:
+            # UPPER(campo) es la expresión que usa Django para icontains en PostgreSQL.
+            indice = GinIndex(OpClass(Upper(campo), name='gin_trgm_ops'), name=f'{nombre_modelo}_{campo}_trgm_idx')
+            yield modelo, indice
+
+
+def crear_indices(apps, schema_editor):
+    """Índices GIN de búsqueda (ver ventas/busqueda.py). Solo existen en PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for modelo, indice in _indices(apps):
+        schema_editor.add_index(modelo, indice)
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for modelo, indice in _indices(apps):
+        schema_editor.remove_index(modelo, indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0011_cuotas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef, Subquery
+
+
+def vencimiento_primera_cuota(apps, schema_editor):
+    """fecha_vencimiento = vencimiento de la primera cuota sin pagar (como ventas.cuotas.proximo_vencimiento)."""
+    Factura = apps.get_model('ventas', 'Factura')
+    Cuota = apps.get_model('ventas', 'Cuota')
+    pendientes = Cuota.objects.filter(factura=OuterRef('pk'), estado='PENDIENTE')
+    # Las facturas sin cuotas pendientes (pagadas o sin total) conservan la fecha de la última cuota.
+    Factura.objects.filter(Exists(pendientes)).update(
+        fecha_vencimiento=Subquery(pendientes.order_by('numero').values('fecha_vencimiento')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0012_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(vencimiento_primera_cuota, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,18 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Q
 from django.contrib.auth.models import User
+import datetime
 import decimal
 
-# Importaciones para el procesamiento de imágenes
-from io import BytesIO
-from PIL import Image
-from django.core.files.base import ContentFile
 import os
 import uuid
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .signals import totales_actualizados
+
 class Cliente(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     nombre = models.CharField(max_length=100)
@@ -21,6 +22,12 @@ class Cliente(models.Model):
     direccion = models.CharField(max_length=255, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Listados por usuario paginados por id (ver paginacion.py).
+            models.Index(fields=['usuario', 'id'], name='cliente_usuario_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
@@ -32,30 +39,56 @@ class Producto(models.Model):
     stock = models.PositiveIntegerField(default=0)
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
 
+    # Procesamiento asíncrono de imágenes (ver ventas/imagenes.py y el comando procesar_imagenes):
+    # la subida se guarda tal cual en 'imagen_original' y un worker la modera, la
+    # redimensiona y la publica en 'imagen'.
+    ESTADO_IMAGEN_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('LISTA', 'Lista'),
+        ('RECHAZADA', 'Rechazada'),
+        ('ERROR', 'Error'),
+    ]
+    imagen_original = models.FileField(upload_to='productos/originales/', null=True, blank=True, editable=False)
+    estado_imagen = models.CharField(max_length=10, choices=ESTADO_IMAGEN_CHOICES, blank=True, editable=False)
+    error_imagen = models.CharField(max_length=255, blank=True, editable=False)
+    procesando_desde = models.DateTimeField(null=True, blank=True, editable=False)
+    # Versiones de la imagen por formato y ancho, p. ej. {"webp": {"96": "productos/derivados/…-96.webp"}}.
+    imagenes_derivadas = models.JSONField(default=dict, blank=True, editable=False)
+
     def save(self, *args, **kwargs):
-        # Si hay una imagen nueva, la procesamos ANTES de llamar al guardado principal.
-        if self.imagen and hasattr(self.imagen.file, 'content_type'):
-            img = Image.open(self.imagen)
-            max_width = 640
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            buffer = BytesIO()
-            img.save(buffer, format='JPEG', quality=85)
-            buffer.seek(0)
-            slug_nombre = slugify(self.nombre)
-            unique_id = uuid.uuid4()
-            nuevo_nombre = f"{slug_nombre}-{unique_id}.jpg"
-            
-            # Reemplazamos el archivo en memoria, sin guardar el modelo todavía (save=False).
-            self.imagen.save(nuevo_nombre, ContentFile(buffer.read()), save=False)
-
-        # Llamamos al método de guardado original UNA SOLA VEZ.
+        # Si llega una imagen nueva, NO se procesa aquí: se guarda el original y se
+        # deja en cola. Mientras tanto se sigue mostrando la imagen publicada anterior.
+        # _committed es falso solo si se acaba de asignar un archivo (sin abrir el ya publicado).
+        if self.imagen and not self.imagen._committed:
+            subida = self.imagen.file
+            self.imagen_original.save(self.nombre_original(subida.name), subida, save=False)
+            self.imagen = self.imagen_publicada()
+            self.encolar_imagen()
         super().save(*args, **kwargs)
 
+    def nombre_original(self, nombre_subida):
+        extension = os.path.splitext(nombre_subida)[1].lower()
+        return f"{slugify(self.nombre)}-{uuid.uuid4()}{extension}"
+
+    def imagen_publicada(self):
+        return Producto.objects.filter(pk=self.pk).values_list('imagen', flat=True).first() if self.pk else None
+
+    def encolar_imagen(self):
+        """Deja en cola la imagen_original ya guardada; hasta procesarla se sigue mostrando 'imagen'."""
+        self.estado_imagen = 'PENDIENTE'
+        self.error_imagen = ''
+        self.procesando_desde = None
+
+    @property
+    def imagen_en_proceso(self):
+        return self.estado_imagen in ('PENDIENTE', 'PROCESANDO')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'id'], name='producto_usuario_id_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
@@ -68,17 +101,153 @@ class Factura(models.Model):
     saldo_pendiente = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, editable=False)
     numero_cuotas = models.PositiveIntegerField(default=1)
     estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='PENDIENTE')
+    # Última modificación de la factura, sus detalles o sus pagos. Los UPDATE
+    # directos (aplicar_delta, actualizar_totales) lo ponen al día a mano; forma
+    # parte de la clave del PDF guardado del comprobante (ver comprobantes.py).
+    actualizado = models.DateTimeField(auto_now=True)
+    # Vencimiento de la primera cuota sin pagar (ver cuotas.proximo_vencimiento): una
+    # factura a 12 cuotas se atrasa cuando vence la primera impaga, no la última. Se
+    # recalcula con cada cambio del total o de lo pagado; el comando marcar_atrasadas
+    # pasa a ATRASADA las pendientes ya vencidas.
+    fecha_vencimiento = models.DateField(editable=False)
     
+    def save(self, *args, **kwargs):
+        from .cuotas import proximo_vencimiento
+
+        with transaction.atomic():
+            cliente_anterior_id = cuotas_anteriores = None
+            if self.pk:
+                cliente_anterior_id, cuotas_anteriores = (
+                    Factura.objects.filter(pk=self.pk).values_list('cliente_id', 'numero_cuotas').first() or (None, None)
+                )
+            # fecha_emision es auto_now_add: al crear todavía no tiene valor y Django usará date.today().
+            self.fecha_vencimiento = proximo_vencimiento(
+                self.fecha_emision or datetime.date.today(), self.numero_cuotas, self.total, self.total - self.saldo_pendiente
+            )
+            if self.estado in ('PENDIENTE', 'ATRASADA'):
+                self.estado = self.calcular_estado(self.total, self.saldo_pendiente, self.fecha_vencimiento)
+            super().save(*args, **kwargs)
+            if cliente_anterior_id is not None and cliente_anterior_id != self.cliente_id:
+                from .resumenes import cambiar_cliente
+                cambiar_cliente(self, cliente_anterior_id)
+            if cuotas_anteriores is not None and cuotas_anteriores != self.numero_cuotas:
+                from .cuotas import regenerar_cuotas
+                regenerar_cuotas(self.pk, self.usuario_id, self.fecha_emision, self.numero_cuotas,
+                                 self.total, self.total - self.saldo_pendiente)
+
+    @staticmethod
+    def calcular_vencimiento(fecha_emision, numero_cuotas):
+        # relativedelta ajusta al último día del mes cuando hace falta (31 ene + 1 mes = 28/29 feb).
+        return fecha_emision + relativedelta(months=max(numero_cuotas, 1))
+
+    @staticmethod
+    def calcular_estado(total, saldo_pendiente, fecha_vencimiento=None):
+        if saldo_pendiente <= 0 and total > 0:
+            return 'PAGADA'
+        if saldo_pendiente > 0 and fecha_vencimiento and fecha_vencimiento < timezone.localdate():
+            return 'ATRASADA'
+        return 'PENDIENTE'
+
     def actualizar_totales(self):
+        """
+        Recalcula total y saldo agregando TODOS los detalles y pagos de la factura.
+        Es la ruta de reparación (ver el comando recalcular_totales); los cambios
+        del día a día usan aplicar_delta.
+        """
+        from .cuotas import proximo_vencimiento, regenerar_cuotas
+        from .resumenes import acumular_factura
+
         total_detalles = self.detalles.aggregate(total=Sum(F('cantidad') * F('precio_unitario')))['total'] or decimal.Decimal('0.00')
         total_pagos = self.pagos.aggregate(total=Sum('monto'))['total'] or decimal.Decimal('0.00')
-        self.total = total_detalles
-        self.saldo_pendiente = self.total - total_pagos
-        if self.saldo_pendiente <= 0 and self.total > 0:
-            self.estado = 'PAGADA'
-        else:
-            self.estado = 'PENDIENTE'
-        self.save()
+        with transaction.atomic():
+            anterior = (
+                Factura.objects.select_for_update()
+                .values('total', 'saldo_pendiente', 'usuario_id', 'cliente_id', 'fecha_emision', 'numero_cuotas')
+                .get(pk=self.pk)
+            )
+            self.total = total_detalles
+            self.saldo_pendiente = self.total - total_pagos
+            self.fecha_vencimiento = proximo_vencimiento(anterior['fecha_emision'], anterior['numero_cuotas'], self.total, total_pagos)
+            self.estado = self.calcular_estado(self.total, self.saldo_pendiente, self.fecha_vencimiento)
+            # Un solo UPDATE con las columnas calculadas, sin volver a escribir toda la fila.
+            self.actualizado = timezone.now()
+            Factura.objects.filter(pk=self.pk).update(
+                total=self.total, saldo_pendiente=self.saldo_pendiente, fecha_vencimiento=self.fecha_vencimiento,
+                estado=self.estado, actualizado=self.actualizado,
+            )
+            acumular_factura(
+                anterior['usuario_id'], anterior['cliente_id'], anterior['fecha_emision'],
+                facturado=self.total - anterior['total'], saldo=self.saldo_pendiente - anterior['saldo_pendiente'],
+            )
+            regenerar_cuotas(self.pk, anterior['usuario_id'], anterior['fecha_emision'], anterior['numero_cuotas'],
+                             self.total, total_pagos)
+        totales_actualizados.send(sender=Factura, factura=self)
+
+    def aplicar_delta(self, delta_total=0, delta_pagos=0):
+        """
+        Ajusta total y saldo de forma incremental: 'delta_total' es la variación
+        en el importe de los detalles y 'delta_pagos' la variación en lo pagado.
+        La fila se bloquea con select_for_update y se actualiza con expresiones F(),
+        así el coste no crece con el número de detalles o pagos de la factura.
+        """
+        from .cuotas import asignar_pago, proximo_vencimiento, regenerar_cuotas
+        from .resumenes import acumular_factura
+
+        delta_total = decimal.Decimal(delta_total)
+        delta_pagos = decimal.Decimal(delta_pagos)
+        with transaction.atomic():
+            actual = (
+                Factura.objects.select_for_update()
+                .values('total', 'saldo_pendiente', 'usuario_id', 'cliente_id', 'fecha_emision', 'numero_cuotas')
+                .get(pk=self.pk)
+            )
+            total = actual['total'] + delta_total
+            saldo_pendiente = actual['saldo_pendiente'] + delta_total - delta_pagos
+            # Un pago que salda las cuotas vencidas la devuelve a PENDIENTE.
+            fecha_vencimiento = proximo_vencimiento(actual['fecha_emision'], actual['numero_cuotas'], total, total - saldo_pendiente)
+            estado = self.calcular_estado(total, saldo_pendiente, fecha_vencimiento)
+            actualizado = timezone.now()
+            Factura.objects.filter(pk=self.pk).update(
+                total=F('total') + delta_total,
+                saldo_pendiente=F('saldo_pendiente') + (delta_total - delta_pagos),
+                fecha_vencimiento=fecha_vencimiento,
+                estado=estado,
+                actualizado=actualizado,
+            )
+            acumular_factura(
+                actual['usuario_id'], actual['cliente_id'], actual['fecha_emision'],
+                facturado=delta_total, saldo=delta_total - delta_pagos,
+            )
+            # Si cambia el total se rehace el plan de cuotas; si solo cambia lo pagado, se reparte la diferencia.
+            if delta_total:
+                regenerar_cuotas(self.pk, actual['usuario_id'], actual['fecha_emision'], actual['numero_cuotas'],
+                                 total, total - saldo_pendiente)
+            elif delta_pagos:
+                asignar_pago(self.pk, actual['total'] - actual['saldo_pendiente'], delta_pagos)
+        self.total, self.saldo_pendiente, self.estado, self.actualizado = total, saldo_pendiente, estado, actualizado
+        self.fecha_vencimiento = fecha_vencimiento
+        totales_actualizados.send(sender=Factura, factura=self)
+
+    class Meta:
+        indexes = [
+            # Contadores del dashboard: filtra por usuario y estado y suma el saldo
+            # sin visitar la tabla (INCLUDE solo se aplica en PostgreSQL).
+            models.Index(fields=['usuario', 'estado'], include=['saldo_pendiente'], name='factura_usuario_estado_idx'),
+            # Listado y últimas facturas: orden por fecha descendente con id como desempate.
+            models.Index(fields=['usuario', '-fecha_emision', 'id'], name='factura_usuario_fecha_idx'),
+            # Índice parcial, solo con las facturas que quedan por cobrar.
+            models.Index(
+                fields=['usuario', 'fecha_emision'],
+                condition=Q(estado='PENDIENTE'),
+                name='factura_pendientes_idx',
+            ),
+            # marcar_atrasadas: pendientes por fecha de vencimiento (las demás no entran en el índice).
+            models.Index(
+                fields=['fecha_vencimiento'],
+                condition=Q(estado='PENDIENTE'),
+                name='factura_vencimiento_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Factura #{self.id} a {self.cliente} - Saldo: ${self.saldo_pendiente}"
@@ -89,11 +258,39 @@ class DetalleFactura(models.Model):
     cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
     
+    @property
+    def subtotal(self):
+        return self.cantidad * self.precio_unitario
+
     def save(self, *args, **kwargs):
         if self.precio_unitario is None:
             self.precio_unitario = self.producto.precio
-        super().save(*args, **kwargs)
-        self.factura.actualizar_totales()
+        from .resumenes import acumular_lineas
+        from .stock import mover_stock
+
+        with transaction.atomic():
+            anterior = decimal.Decimal('0.00')
+            lineas = []
+            if self.pk:
+                guardado = DetalleFactura.objects.filter(pk=self.pk).values_list('producto_id', 'cantidad', 'precio_unitario').first()
+                if guardado:
+                    anterior = guardado[1] * guardado[2]
+                    lineas.append((guardado[0], -guardado[1], -anterior))
+            mover_stock([(producto_id, unidades) for producto_id, unidades, _ in lineas] + [(self.producto_id, self.cantidad)])
+            super().save(*args, **kwargs)
+            self.factura.aplicar_delta(delta_total=self.subtotal - anterior)
+            acumular_lineas(self.factura, lineas + [(self.producto_id, self.cantidad, self.subtotal)])
+
+    def delete(self, *args, **kwargs):
+        from .resumenes import acumular_lineas
+        from .stock import mover_stock
+
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            mover_stock([(self.producto_id, -self.cantidad)])
+            self.factura.aplicar_delta(delta_total=-self.subtotal)
+            acumular_lineas(self.factura, [(self.producto_id, -self.cantidad, -self.subtotal)])
+        return resultado
 
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
@@ -106,15 +303,125 @@ class Pago(models.Model):
     metodo_pago = models.CharField(max_length=15, choices=METODO_CHOICES, default='EFECTIVO')
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.factura.actualizar_totales()
+        from .resumenes import acumular_pago
+
+        with transaction.atomic():
+            anterior = decimal.Decimal('0.00')
+            if self.pk:
+                anterior = Pago.objects.filter(pk=self.pk).values_list('monto', flat=True).first() or anterior
+            super().save(*args, **kwargs)
+            self.factura.aplicar_delta(delta_pagos=self.monto - anterior)
+            acumular_pago(self, self.monto - anterior)
+
+    def delete(self, *args, **kwargs):
+        from .resumenes import acumular_pago
+
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            self.factura.aplicar_delta(delta_pagos=-self.monto)
+            acumular_pago(self, -self.monto)
+        return resultado
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['factura', 'fecha_pago'], name='pago_factura_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Pago de ${self.monto} para Factura #{self.factura.id}"
 
+class Cuota(models.Model):
+    """
+    Plazo del plan de pagos de una factura: numero_cuotas plazos mensuales desde la
+    emisión. Se generan y se pagan desde Factura.aplicar_delta (ver ventas/cuotas.py).
+    """
+    ESTADO_CHOICES = [('PENDIENTE', 'Pendiente'), ('PAGADA', 'Pagada')]
+    factura = models.ForeignKey(Factura, related_name='cuotas', on_delete=models.CASCADE)
+    # Copia de factura.usuario para listar los vencimientos de un usuario sin join.
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    numero = models.PositiveIntegerField()
+    fecha_vencimiento = models.DateField()
+    importe = models.DecimalField(max_digits=10, decimal_places=2)
+    pagado = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='PENDIENTE')
+
+    @property
+    def pendiente(self):
+        return self.importe - self.pagado
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['factura', 'numero'], name='cuota_factura_numero_unica'),
+        ]
+        indexes = [
+            # Vencimientos de un usuario en un rango de fechas: una sola búsqueda por rango.
+            models.Index(fields=['usuario', 'fecha_vencimiento', 'estado'], name='cuota_usuario_vencimiento_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cuota {self.numero} de la Factura #{self.factura_id}"
+
 class Perfil(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)
     nombre_almacen = models.CharField(max_length=100, blank=True)
 
     def __str__(self):
-        return f"Perfil de {self.usuario.username}"
\ No newline at end of file
+        return f"Perfil de {self.usuario.username}"
+
+class VeredictoModeracion(models.Model):
+    """
+    Resultado de moderar una imagen, indexado por el hash de su contenido, para
+    no volver a enviar a Rekognition fotos idénticas (ver imagenes.moderar_con_cache).
+    """
+    huella = models.CharField(max_length=64, unique=True)
+    etiquetas = models.JSONField(default=list)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Veredicto {self.huella[:12]} ({'rechazada' if self.etiquetas else 'aprobada'})"
+
+# ==============================================================================
+# RESÚMENES DIARIOS PARA INFORMES (ver ventas/resumenes.py)
+# ==============================================================================
+class ResumenDiario(models.Model):
+    """
+    Totales de un cliente en un día. 'facturado' y 'saldo' se acumulan en la
+    fecha de emisión de las facturas y 'cobrado' en la fecha de cada pago.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
+    fecha = models.DateField()
+    facturado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cobrado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'cliente', 'fecha'], name='resumen_diario_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='resumen_usuario_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente} {self.fecha}: facturado ${self.facturado}, cobrado ${self.cobrado}"
+
+class ResumenProductoDiario(models.Model):
+    """Unidades e importe vendidos de un producto en facturas emitidas en un día."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    fecha = models.DateField()
+    unidades = models.IntegerField(default=0)
+    importe = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'producto', 'fecha'], name='resumen_producto_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='resumen_prod_usuario_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} {self.fecha}: {self.unidades} uds."
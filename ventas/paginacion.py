@@ -0,0 +1,136 @@
+"""
+Paginación por cursor (keyset) para los listados de la app.
+
+En lugar de OFFSET, cada página se pide con la clave de orden de la última (o
+primera) fila de la página anterior, así la página N cuesta lo mismo que la
+primera y el orden es estable aunque se inserten filas mientras se navega.
+"""
+import base64
+import binascii
+import json
+from functools import cached_property
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class PaginaKeyset:
+    """
+    Una página de 'queryset' ordenada por 'orden' (p. ej. ('-fecha_emision', 'id')).
+    El último campo del orden debe ser único para que el cursor no sea ambiguo.
+
+    La consulta se ejecuta de forma perezosa la primera vez que se recorre la
+    página o se pregunta por los cursores.
+    """
+    def __init__(self, queryset, orden, despues=None, antes=None, por_pagina=25):
+        self.queryset = queryset
+        self.orden = tuple(orden)
+        self.por_pagina = por_pagina
+        self.despues = despues
+        self.antes = antes
+
+    @classmethod
+    def desde_request(cls, request, queryset, orden, por_pagina=25):
+        """Lee los cursores ?despues= / ?antes= de la petición; si no son válidos empieza desde el principio."""
+        pagina = cls(queryset, orden, por_pagina=por_pagina)
+        try:
+            if request.GET.get('antes'):
+                pagina.antes = pagina._decodificar(request.GET['antes'])
+            elif request.GET.get('despues'):
+                pagina.despues = pagina._decodificar(request.GET['despues'])
+        except CursorInvalido:
+            pagina.antes = pagina.despues = None
+        return pagina
+
+    # --------------------------------------------------------------------------
+    # Codificación del cursor
+    # --------------------------------------------------------------------------
+    def _campos(self):
+        return [(campo.lstrip('-'), campo.startswith('-')) for campo in self.orden]
+
+    def _codificar(self, obj):
+        valores = [getattr(obj, nombre) for nombre, _ in self._campos()]
+        crudo = json.dumps(valores, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+    def _decodificar(self, cursor):
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            campos = self._campos()
+            if not isinstance(valores, list) or len(valores) != len(campos):
+                raise CursorInvalido(cursor)
+            opts = self.queryset.model._meta
+            return [opts.get_field(nombre).to_python(valor) for (nombre, _), valor in zip(campos, valores)]
+        # TypeError: un valor con el tipo equivocado (p. ej. una lista donde va una fecha).
+        except (binascii.Error, TypeError, ValueError, ValidationError) as e:
+            raise CursorInvalido(cursor) from e
+
+    # --------------------------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------------------------
+    def _despues_de(self, valores, invertir=False):
+        """
+        Condición "la fila va después de 'valores' en el orden", desarrollada como
+        (a < x) OR (a = x AND b < y) ... para que use el índice compuesto.
+        """
+        condicion = Q()
+        iguales = {}
+        for (nombre, descendente), valor in zip(self._campos(), valores):
+            operador = 'lt' if descendente != invertir else 'gt'
+            condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+            iguales[nombre] = valor
+        return condicion
+
+    @cached_property
+    def _resultado(self):
+        if self.antes is not None:
+            # Hacia atrás: se recorre el orden invertido y luego se da la vuelta.
+            orden = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in self.orden]
+            filas = list(self.queryset.filter(self._despues_de(self.antes, invertir=True)).order_by(*orden)[:self.por_pagina + 1])
+            hay_mas = len(filas) > self.por_pagina
+            return filas[:self.por_pagina][::-1], True, hay_mas
+
+        queryset = self.queryset.order_by(*self.orden)
+        if self.despues is not None:
+            queryset = queryset.filter(self._despues_de(self.despues))
+        filas = list(queryset[:self.por_pagina + 1])
+        return filas[:self.por_pagina], len(filas) > self.por_pagina, self.despues is not None
+
+    @property
+    def objetos(self):
+        return self._resultado[0]
+
+    @property
+    def hay_siguiente(self):
+        return self._resultado[1]
+
+    @property
+    def hay_anterior(self):
+        return self._resultado[2]
+
+    @property
+    def cursor_siguiente(self):
+        if self.hay_siguiente and self.objetos:
+            return self._codificar(self.objetos[-1])
+        return None
+
+    @property
+    def cursor_anterior(self):
+        if self.hay_anterior and self.objetos:
+            return self._codificar(self.objetos[0])
+        return None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __bool__(self):
+        return bool(self.objetos)
@@ -0,0 +1,129 @@
+"""
+Resúmenes diarios para los informes (ResumenDiario y ResumenProductoDiario).
+
+Los informes leen solo estas tablas, nunca las facturas, pagos y detalles. Se
+mantienen de forma incremental desde los mismos puntos que ajustan los totales
+de las facturas, dentro de su transacción:
+
+  - Factura.aplicar_delta / actualizar_totales: facturado y saldo del día de emisión,
+  - Pago.save / delete: cobrado del día del pago,
+  - DetalleFactura.save / delete y el formset de detalles: unidades e importe por producto,
+  - Factura.save (cambio de cliente) y pre_delete de Factura (ver signals.py).
+
+El comando reconstruir_resumenes las regenera desde cero si alguna vez se desvían.
+"""
+import decimal
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DetalleFactura, Pago, ResumenDiario, ResumenProductoDiario
+
+
+def _acumular(modelo, claves, **incrementos):
+    """Suma 'incrementos' a la fila de 'claves', creándola si no existe."""
+    incrementos = {campo: valor for campo, valor in incrementos.items() if valor}
+    if not incrementos:
+        return
+    actualizacion = {campo: F(campo) + valor for campo, valor in incrementos.items()}
+    if modelo.objects.filter(**claves).update(**actualizacion):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **incrementos)
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT.
+        modelo.objects.filter(**claves).update(**actualizacion)
+
+
+def acumular_factura(usuario_id, cliente_id, fecha, facturado=0, saldo=0):
+    _acumular(ResumenDiario, {'usuario_id': usuario_id, 'cliente_id': cliente_id, 'fecha': fecha},
+              facturado=facturado, saldo=saldo)
+
+
+def acumular_pago(pago, monto):
+    factura = pago.factura
+    _acumular(ResumenDiario, {'usuario_id': factura.usuario_id, 'cliente_id': factura.cliente_id,
+                              'fecha': timezone.localdate(pago.fecha_pago)},
+              cobrado=monto)
+
+
+def acumular_lineas(factura, lineas):
+    """
+    'lineas' es una lista de (producto_id, unidades, importe); las de un mismo
+    producto se suman. Se resuelve con un número fijo de consultas (leer las filas
+    existentes, un bulk_update y un bulk_create) sin importar cuántos productos haya.
+    """
+    por_producto = defaultdict(lambda: [0, decimal.Decimal('0.00')])
+    for producto_id, unidades, importe in lineas:
+        por_producto[producto_id][0] += unidades
+        por_producto[producto_id][1] += importe
+    por_producto = {producto_id: valores for producto_id, valores in por_producto.items() if any(valores)}
+    if not por_producto:
+        return
+
+    claves = {'usuario_id': factura.usuario_id, 'fecha': factura.fecha_emision}
+    with transaction.atomic():
+        existentes = list(
+            ResumenProductoDiario.objects.select_for_update()
+            .filter(**claves, producto_id__in=por_producto)
+            .only('pk', 'producto_id')
+        )
+        for resumen in existentes:
+            unidades, importe = por_producto.pop(resumen.producto_id)
+            resumen.unidades = F('unidades') + unidades
+            resumen.importe = F('importe') + importe
+        if existentes:
+            ResumenProductoDiario.objects.bulk_update(existentes, ['unidades', 'importe'])
+        if not por_producto:
+            return
+        try:
+            with transaction.atomic():
+                ResumenProductoDiario.objects.bulk_create([
+                    ResumenProductoDiario(**claves, producto_id=producto_id, unidades=unidades, importe=importe)
+                    for producto_id, (unidades, importe) in por_producto.items()
+                ])
+        except IntegrityError:
+            # Otra transacción creó alguna de las filas a la vez: se suman una a una.
+            for producto_id, (unidades, importe) in por_producto.items():
+                _acumular(ResumenProductoDiario, {**claves, 'producto_id': producto_id}, unidades=unidades, importe=importe)
+
+
+def _cobros_por_dia(factura):
+    return (
+        Pago.objects.filter(factura=factura)
+        .annotate(dia=TruncDate('fecha_pago'))
+        .values('dia')
+        .annotate(cobrado=Sum('monto'))
+        .values_list('dia', 'cobrado')
+    )
+
+
+def quitar_factura(factura):
+    """Resta de los resúmenes todo lo que aporta una factura que se va a borrar."""
+    acumular_factura(factura.usuario_id, factura.cliente_id, factura.fecha_emision,
+                     facturado=-factura.total, saldo=-factura.saldo_pendiente)
+    for dia, cobrado in _cobros_por_dia(factura):
+        _acumular(ResumenDiario, {'usuario_id': factura.usuario_id, 'cliente_id': factura.cliente_id, 'fecha': dia},
+                  cobrado=-cobrado)
+    lineas = (
+        DetalleFactura.objects.filter(factura=factura)
+        .values('producto')
+        .annotate(unidades=Sum('cantidad'), importe=Sum(F('cantidad') * F('precio_unitario')))
+        .values_list('producto', 'unidades', 'importe')
+    )
+    acumular_lineas(factura, [(producto_id, -unidades, -importe) for producto_id, unidades, importe in lineas])
+
+
+def cambiar_cliente(factura, cliente_anterior_id):
+    """Pasa lo facturado, cobrado y pendiente de la factura del cliente anterior al actual."""
+    cobros = list(_cobros_por_dia(factura))
+    for cliente_id, signo in ((cliente_anterior_id, -1), (factura.cliente_id, 1)):
+        acumular_factura(factura.usuario_id, cliente_id, factura.fecha_emision,
+                         facturado=signo * factura.total, saldo=signo * factura.saldo_pendiente)
+        for dia, cobrado in cobros:
+            _acumular(ResumenDiario, {'usuario_id': factura.usuario_id, 'cliente_id': cliente_id, 'fecha': dia},
+                      cobrado=signo * cobrado)
@@ -0,0 +1,116 @@
+"""
+Datos de prueba deterministas para los benchmarks (comandos sembrar_datos,
+benchmark y benchmark_indices).
+
+Con la misma semilla y los mismos tamaños se generan siempre los mismos
+usuarios, clientes, productos, facturas, líneas y pagos; las fechas se cuentan
+hacia atrás desde el día en que se siembra. Todo se inserta con bulk_create y
+lo derivado (totales, saldo, estado, vencimiento, cuotas y resúmenes) se
+calcula a la vez, así que queda igual que si se hubiera creado desde la
+aplicación.
+"""
+import datetime
+import decimal
+import random
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidar_tenant
+from .cuotas import construir_cuotas, proximo_vencimiento
+from .models import Cliente, Cuota, DetalleFactura, Factura, Pago, Producto
+
+LOTE = 2000
+# Días hacia atrás en los que se reparten las fechas de emisión.
+DIAS_HISTORIA = 1095
+# Stock inicial de los productos: suficiente para que los benchmarks vendan sin agotarlos.
+STOCK_INICIAL = 10 ** 6
+
+APELLIDOS = ['Pérez', 'Gómez', 'Rodríguez', 'López', 'Martínez', 'García', 'Hernández', 'Díaz', 'Torres', 'Ramírez']
+ARTICULOS = ['Camiseta', 'Pantalón', 'Zapato', 'Gorra', 'Chaqueta', 'Bufanda', 'Calcetín', 'Vestido', 'Falda', 'Cinturón']
+
+
+def sembrar(usuarios, clientes, productos, facturas, lineas=3, semilla=42, prefijo='bench', escribir=None):
+    """
+    Crea 'usuarios' usuarios '<prefijo>_<n>' con sus datos y los devuelve. Los
+    que ya tienen facturas se dejan como están (se siembran una sola vez).
+    """
+    creados = []
+    for n in range(usuarios):
+        usuario, _ = User.objects.get_or_create(username=f'{prefijo}_{n}')
+        creados.append(usuario)
+        if Factura.objects.filter(usuario=usuario).exists():
+            continue
+        if escribir:
+            escribir(f'Sembrando {facturas} facturas para {usuario.username}...')
+        # Un generador por usuario: sus datos no dependen de cuántos usuarios se siembren.
+        aleatorio = random.Random(f'{semilla}-{n}')
+        with transaction.atomic():
+            _sembrar_usuario(usuario, clientes, productos, facturas, lineas, aleatorio)
+        call_command('reconstruir_resumenes', usuario=usuario.username, stdout=StringIO())
+        invalidar_tenant(usuario.pk)
+    return creados
+
+
+def _sembrar_usuario(usuario, numero_clientes, numero_productos, numero_facturas, lineas, aleatorio):
+    hoy = timezone.localdate()
+    clientes = Cliente.objects.bulk_create(
+        Cliente(usuario=usuario, nombre=f'Cliente {n}', apellido=aleatorio.choice(APELLIDOS),
+                email=f'cliente{n}@{usuario.username}.test', telefono=f'300{aleatorio.randint(1000000, 9999999)}')
+        for n in range(max(numero_clientes, 1))
+    )
+    productos = Producto.objects.bulk_create(
+        Producto(usuario=usuario, nombre=f'{aleatorio.choice(ARTICULOS)} {n}',
+                 precio=decimal.Decimal(aleatorio.randint(100, 50000)) / 100, stock=STOCK_INICIAL)
+        for n in range(max(numero_productos, 1))
+    )
+
+    for inicio in range(0, numero_facturas, LOTE):
+        nuevas, emisiones, lineas_por_factura, pagado_por_factura = [], [], [], []
+        for _ in range(min(LOTE, numero_facturas - inicio)):
+            emision = hoy - datetime.timedelta(days=aleatorio.randint(0, DIAS_HISTORIA))
+            detalles = [
+                DetalleFactura(producto=producto, cantidad=aleatorio.randint(1, 5), precio_unitario=producto.precio)
+                for producto in aleatorio.sample(productos, min(lineas, len(productos)))
+            ]
+            total = sum((detalle.subtotal for detalle in detalles), decimal.Decimal('0.00'))
+            # Un tercio pagadas, un tercio con un pago parcial y un tercio sin pagos.
+            pagado = aleatorio.choice([total, (total / 2).quantize(decimal.Decimal('0.01')), decimal.Decimal('0.00')])
+            numero_cuotas = aleatorio.choice([1, 1, 1, 3, 6, 12])
+            vencimiento = proximo_vencimiento(emision, numero_cuotas, total, pagado)
+            nuevas.append(Factura(
+                usuario=usuario, cliente=aleatorio.choice(clientes), numero_cuotas=numero_cuotas,
+                total=total, saldo_pendiente=total - pagado, fecha_vencimiento=vencimiento,
+                estado=Factura.calcular_estado(total, total - pagado, vencimiento),
+            ))
+            emisiones.append(emision)
+            lineas_por_factura.append(detalles)
+            pagado_por_factura.append(pagado)
+
+        creadas = Factura.objects.bulk_create(nuevas)
+        # fecha_emision y fecha_pago son auto_now_add: se fijan después de insertar.
+        for factura, emision in zip(creadas, emisiones):
+            factura.fecha_emision = emision
+        Factura.objects.bulk_update(creadas, ['fecha_emision'])
+
+        detalles, pagos, cuotas = [], [], []
+        for factura, lineas_factura, pagado in zip(creadas, lineas_por_factura, pagado_por_factura):
+            for detalle in lineas_factura:
+                detalle.factura = factura
+                detalles.append(detalle)
+            if pagado:
+                pagos.append(Pago(factura=factura, monto=pagado, metodo_pago=aleatorio.choice(['EFECTIVO', 'TRANSFERENCIA'])))
+            cuotas.extend(construir_cuotas(factura.pk, usuario.pk, factura.fecha_emision, factura.numero_cuotas,
+                                           factura.total, pagado))
+        DetalleFactura.objects.bulk_create(detalles)
+        Cuota.objects.bulk_create(cuotas)
+        pagos = Pago.objects.bulk_create(pagos)
+        for pago in pagos:
+            dias = aleatorio.randint(0, 30)
+            pago.fecha_pago = timezone.make_aware(datetime.datetime.combine(
+                min(pago.factura.fecha_emision + datetime.timedelta(days=dias), hoy), datetime.time(12)
+            ))
+        Pago.objects.bulk_update(pagos, ['fecha_pago'])
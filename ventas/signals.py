@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+# Se envía cuando total, saldo o estado de una factura cambian con un UPDATE
+# directo (aplicar_delta, actualizar_totales, recalcular_totales), que no
+# dispara post_save. Argumentos: factura.
+totales_actualizados = Signal()
+
+
+# ==============================================================================
+# INVALIDACIÓN DE LA CACHÉ DEL USUARIO (ver ventas/cache.py)
+# ==============================================================================
+# Los pagos y los detalles siempre terminan en totales_actualizados, así que no
+# necesitan receptores propios.
+@receiver(post_save, sender='ventas.Cliente')
+@receiver(post_delete, sender='ventas.Cliente')
+@receiver(post_save, sender='ventas.Producto')
+@receiver(post_delete, sender='ventas.Producto')
+@receiver(post_save, sender='ventas.Factura')
+@receiver(post_delete, sender='ventas.Factura')
+def _invalidar_cache_por_instancia(sender, instance, **kwargs):
+    from .cache import invalidar_tenant
+    invalidar_tenant(instance.usuario_id)
+
+
+@receiver(totales_actualizados)
+def _invalidar_cache_por_totales(sender, factura, **kwargs):
+    from .cache import invalidar_tenant
+    invalidar_tenant(factura.usuario_id)
+
+
+# ==============================================================================
+# RESÚMENES DIARIOS (ver ventas/resumenes.py)
+# ==============================================================================
+# Al borrar una factura sus pagos y detalles se borran en cascada sin pasar por
+# Pago.delete() ni DetalleFactura.delete(): se resta todo lo que aportaba antes.
+@receiver(pre_delete, sender='ventas.Factura')
+def _quitar_factura_de_resumenes(sender, instance, **kwargs):
+    from .resumenes import quitar_factura
+    quitar_factura(instance)
+
+
+# ==============================================================================
+# STOCK DE PRODUCTOS (ver ventas/stock.py)
+# ==============================================================================
+# Por el mismo motivo, las unidades de los detalles borrados en cascada vuelven
+# al stock aquí, en un solo UPDATE.
+@receiver(pre_delete, sender='ventas.Factura')
+def _devolver_stock_de_factura(sender, instance, **kwargs):
+    from django.db.models import Sum
+    from .models import DetalleFactura
+    from .stock import mover_stock
+    unidades = (
+        DetalleFactura.objects.filter(factura=instance)
+        .values('producto')
+        .annotate(unidades=Sum('cantidad'))
+        .values_list('producto', 'unidades')
+    )
+    mover_stock([(producto_id, -total) for producto_id, total in unidades])
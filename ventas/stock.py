@@ -0,0 +1,62 @@
+"""
+Existencias de los productos vendidos en las facturas.
+
+Todas las líneas de una factura (o de un cambio en ella) se descuentan con un
+solo UPDATE condicional:
+
+    UPDATE producto SET stock = stock - CASE id WHEN ... END
+    WHERE (id = a AND stock >= n_a) OR (id = b AND stock >= n_b) ...
+
+La comprobación y el descuento ocurren en la misma sentencia sobre la fila ya
+bloqueada, así que dos facturas simultáneas no pueden vender la misma unidad
+(no hay lectura previa del stock que pueda quedar obsoleta). Si alguna línea
+no tiene existencias suficientes se lanza StockInsuficiente y la transacción
+de la factura entera se deshace.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from .models import Producto
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, productos):
+        self.productos = productos
+        nombres = ', '.join(f'{nombre} (quedan {stock})' for nombre, stock in productos)
+        super().__init__(f'No hay existencias suficientes de: {nombres}.')
+
+
+def mover_stock(cambios):
+    """
+    Aplica 'cambios', una lista de (producto_id, unidades): unidades positivas se
+    descuentan del stock y negativas lo devuelven. Las de un mismo producto se
+    suman. Todo en un UPDATE; lanza StockInsuficiente si alguna no alcanza.
+    """
+    por_producto = defaultdict(int)
+    for producto_id, unidades in cambios:
+        por_producto[producto_id] += unidades
+    por_producto = {producto_id: unidades for producto_id, unidades in por_producto.items() if unidades}
+    if not por_producto:
+        return
+
+    # Las devoluciones (unidades negativas) siempre cumplen la condición.
+    condicion = reduce(or_, (Q(pk=producto_id, stock__gte=unidades) for producto_id, unidades in por_producto.items()))
+    try:
+        with transaction.atomic():
+            actualizados = Producto.objects.filter(condicion).update(
+                stock=F('stock') - Case(*[When(pk=producto_id, then=Value(unidades)) for producto_id, unidades in por_producto.items()])
+            )
+            if actualizados != len(por_producto):
+                # Se deshacen también los productos que sí se descontaron.
+                raise StockInsuficiente([])
+    except StockInsuficiente:
+        faltan = (
+            Producto.objects
+            .filter(reduce(or_, (Q(pk=producto_id, stock__lt=unidades) for producto_id, unidades in por_producto.items())))
+            .values_list('nombre', 'stock')
+        )
+        raise StockInsuficiente(list(faltan))
@@ -0,0 +1,111 @@
+"""
+Subida directa de las imágenes de productos del navegador al storage.
+
+En lugar de enviar la foto con el formulario (Django la recibe entera, la
+guarda en disco o memoria y la vuelve a subir a S3), el navegador:
+
+  1. pide a preparar_subida() (vista preparar_subida) un POST prefirmado de S3
+     para una clave nueva en productos/originales/, válido solo para ese
+     tipo de imagen y hasta TAMANO_MAXIMO bytes;
+  2. envía el archivo directamente al bucket con esos campos;
+  3. envía el formulario del producto con el token que recibió en el paso 1
+     (campo oculto imagen_subida) en lugar del archivo. ProductoForm comprueba
+     el token con clave_subida() y deja el original en cola para el worker
+     (ver imagenes.py), como con una subida normal.
+
+Así las peticiones a Django pesan lo mismo sea cual sea la foto. Los originales
+subidos así son privados: solo el worker los lee.
+
+Con un storage que no es S3 (desarrollo y pruebas) la vista subida_local hace
+de bucket: acepta el mismo formulario que S3 (los campos y el archivo al
+final), comprueba la política firmada y guarda el archivo en el storage.
+
+El bucket necesita una regla CORS que permita POST desde el dominio de la
+aplicación.
+"""
+import os
+import uuid
+
+from botocore.exceptions import ClientError
+from django.core import signing
+from django.core.files.storage import default_storage, storages
+from django.urls import reverse
+from django.utils.text import slugify
+from storages.backends.s3boto3 import S3Boto3Storage
+
+# Mismo límite que la subida por formulario (ProductoForm.clean_imagen).
+TAMANO_MAXIMO = 5 * 1024 * 1024
+TIPOS = {'image/jpeg': '.jpg', 'image/png': '.png'}
+CARPETA = 'productos/originales/'
+# Segundos para empezar la subida al storage y para enviar después el formulario.
+CADUCIDAD_SUBIDA = 10 * 60
+CADUCIDAD_TOKEN = 24 * 60 * 60
+SAL_TOKEN = 'ventas.subidas.token'
+SAL_POLITICA = 'ventas.subidas.politica'
+
+
+class SubidaNoValida(Exception):
+    pass
+
+
+def usa_s3():
+    return isinstance(storages['default'], S3Boto3Storage)
+
+
+def preparar_subida(usuario, nombre_archivo, tipo):
+    """Devuelve {'url', 'campos', 'token'} para subir un archivo de tipo 'tipo' directamente al storage."""
+    if tipo not in TIPOS:
+        raise SubidaNoValida('Tipo de archivo no válido. Solo se permiten imágenes .jpg, .jpeg o .png.')
+    base = slugify(os.path.splitext(nombre_archivo)[0])[:50] or 'imagen'
+    clave = f'{CARPETA}{base}-{uuid.uuid4()}{TIPOS[tipo]}'
+
+    if usa_s3():
+        almacen = storages['default']
+        firmado = almacen.bucket.meta.client.generate_presigned_post(
+            almacen.bucket_name,
+            almacen._normalize_name(clave),
+            Fields={'Content-Type': tipo},
+            Conditions=[{'Content-Type': tipo}, ['content-length-range', 1, TAMANO_MAXIMO]],
+            ExpiresIn=CADUCIDAD_SUBIDA,
+        )
+        url, campos = firmado['url'], firmado['fields']
+    else:
+        politica = signing.dumps({'clave': clave, 'tipo': tipo}, salt=SAL_POLITICA)
+        url, campos = reverse('ventas:subida_local'), {'key': clave, 'Content-Type': tipo, 'policy': politica}
+
+    token = signing.dumps({'usuario': usuario.pk, 'clave': clave}, salt=SAL_TOKEN)
+    return {'url': url, 'campos': campos, 'token': token}
+
+
+def clave_subida(usuario, token):
+    """Clave en el storage de una subida terminada de 'usuario'; SubidaNoValida si no lo es."""
+    try:
+        datos = signing.loads(token, salt=SAL_TOKEN, max_age=CADUCIDAD_TOKEN)
+    except signing.BadSignature:
+        raise SubidaNoValida('La subida de la imagen caducó o no es válida. Vuelve a elegir la imagen.')
+    if datos['usuario'] != usuario.pk:
+        raise SubidaNoValida('La subida de la imagen no es válida. Vuelve a elegir la imagen.')
+    clave = datos['clave']
+    # En S3 el tamaño ya lo limita la política; es una sola petición HEAD.
+    try:
+        tamano = default_storage.size(clave)
+    except (FileNotFoundError, OSError, ClientError):
+        raise SubidaNoValida('La imagen no terminó de subirse. Vuelve a elegirla.')
+    if tamano > TAMANO_MAXIMO:
+        raise SubidaNoValida('La imagen no puede pesar más de 5MB.')
+    return clave
+
+
+def recibir_subida_local(campos, archivo):
+    """Hace de bucket de S3 cuando el storage no lo es: comprueba la política y guarda el archivo."""
+    try:
+        politica = signing.loads(campos.get('policy', ''), salt=SAL_POLITICA, max_age=CADUCIDAD_SUBIDA)
+    except signing.BadSignature:
+        raise SubidaNoValida('Política no válida o caducada.')
+    if campos.get('key') != politica['clave'] or campos.get('Content-Type') != politica['tipo']:
+        raise SubidaNoValida('Los campos no coinciden con la política.')
+    if archivo is None or not 1 <= archivo.size <= TAMANO_MAXIMO:
+        raise SubidaNoValida('El archivo falta o supera el tamaño permitido.')
+    if default_storage.exists(politica['clave']):
+        raise SubidaNoValida('La clave ya existe.')
+    default_storage.save(politica['clave'], archivo)
@@ -0,0 +1,34 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+def _srcset(versiones):
+    return ', '.join(f'{default_storage.url(nombre)} {ancho}w' for ancho, nombre in sorted(versiones.items(), key=lambda v: int(v[0])))
+
+
+@register.simple_tag
+def imagen_responsive(producto, sizes='100vw', clase=''):
+    """
+    <picture> con las versiones de la imagen del producto: WebP para los
+    navegadores que lo soportan y JPEG como respaldo, ambas con srcset para que
+    el navegador descargue solo el ancho que necesita según 'sizes'.
+    Los productos sin versiones (aún no migrados) caen a la imagen original.
+    """
+    derivadas = producto.imagenes_derivadas or {}
+    if not derivadas.get('jpeg'):
+        if not producto.imagen:
+            return ''
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', producto.imagen.url, producto.nombre, clase)
+
+    jpeg = derivadas['jpeg']
+    fuentes = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((f'image/{formato}', _srcset(versiones), sizes) for formato, versiones in derivadas.items() if formato != 'jpeg'),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async"></picture>',
+        fuentes, default_storage.url(jpeg[max(jpeg, key=int)]), _srcset(jpeg), sizes, producto.nombre, clase,
+    )
@@ -1,3 +1,1308 @@
-from django.test import TestCase
+import csv
+import datetime
+import decimal
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from dateutil.relativedelta import relativedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .forms import DetalleFacturaFormSet
+from .models import Cliente, Producto, Factura, DetalleFactura, Pago, Cuota, ResumenDiario, ResumenProductoDiario
+from .paginacion import PaginaKeyset
+from .stock import StockInsuficiente
+
+# Las plantillas usan {% static %}; en las pruebas no existe el manifiesto de collectstatic.
+STORAGES_PRUEBAS = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class DatosBaseMixin:
+    """Crea un usuario con un cliente y varios productos para las pruebas."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('tendero', password='clave-segura')
+        self.cliente = Cliente.objects.create(
+            usuario=self.usuario, nombre='Ana', apellido='Pérez', email='ana@example.com'
+        )
+        self.productos = [
+            Producto.objects.create(usuario=self.usuario, nombre=f'Producto {i}', precio=decimal.Decimal('10.00') + i,
+                                    stock=1000)
+            for i in range(40)
+        ]
+
+    def crear_factura(self):
+        return Factura.objects.create(usuario=self.usuario, cliente=self.cliente)
+
+    def datos_formset(self, lineas, factura=None):
+        existentes = list(factura.detalles.all()) if factura else []
+        datos = {
+            'detalles-TOTAL_FORMS': str(len(lineas)),
+            'detalles-INITIAL_FORMS': str(len(existentes)),
+            'detalles-MIN_NUM_FORMS': '0',
+            'detalles-MAX_NUM_FORMS': '1000',
+        }
+        for i, (producto, cantidad) in enumerate(lineas):
+            datos[f'detalles-{i}-producto'] = str(producto.pk)
+            datos[f'detalles-{i}-cantidad'] = str(cantidad)
+            if i < len(existentes):
+                datos[f'detalles-{i}-id'] = str(existentes[i].pk)
+        return datos
+
+
+class DetalleFacturaFormSetTests(DatosBaseMixin, TestCase):
+
+    def queries_al_guardar(self, numero_lineas):
+        factura = self.crear_factura()
+        formset = DetalleFacturaFormSet(
+            self.datos_formset([(p, 2) for p in self.productos[:numero_lineas]]), instance=factura
+        )
+        self.assertTrue(formset.is_valid(), formset.errors)
+        with CaptureQueriesContext(connection) as contexto:
+            formset.save()
+        return len(contexto.captured_queries)
+
+    def test_numero_de_queries_no_depende_del_numero_de_lineas(self):
+        # La primera venta del día crea las filas de los resúmenes; se compara con ellas ya creadas.
+        self.queries_al_guardar(40)
+        self.assertEqual(self.queries_al_guardar(2), self.queries_al_guardar(40))
+
+    def test_guardado_en_bloque_actualiza_totales(self):
+        factura = self.crear_factura()
+        formset = DetalleFacturaFormSet(
+            self.datos_formset([(self.productos[0], 2), (self.productos[1], 3)]), instance=factura
+        )
+        self.assertTrue(formset.is_valid(), formset.errors)
+        formset.save()
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, decimal.Decimal('53.00'))
+        self.assertEqual(factura.saldo_pendiente, decimal.Decimal('53.00'))
+        self.assertEqual(factura.estado, 'PENDIENTE')
+        self.assertEqual(factura.detalles.count(), 2)
+
+    def test_edicion_actualiza_y_borra_lineas(self):
+        factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=1)
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[1], cantidad=1)
+
+        datos = self.datos_formset([(self.productos[0], 5), (self.productos[1], 1)], factura=factura)
+        datos['detalles-1-DELETE'] = 'on'
+        formset = DetalleFacturaFormSet(datos, instance=factura)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        formset.save()
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, decimal.Decimal('50.00'))
+        self.assertEqual(list(factura.detalles.values_list('cantidad', flat=True)), [5])
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class AdminFacturaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.usuario.pk).update(is_staff=True, is_superuser=True)
+        self.client.force_login(self.usuario)
+
+    def test_alta_y_edicion_con_lineas(self):
+        self.assertEqual(self.client.get('/admin/ventas/factura/add/').status_code, 200)
+
+        datos = {'cliente': self.cliente.pk, 'numero_cuotas': 1, 'estado': 'PENDIENTE', '_save': 'Guardar'}
+        datos.update(self.datos_formset([(self.productos[0], 2), (self.productos[1], 1)]))
+        respuesta = self.client.post('/admin/ventas/factura/add/', datos)
+        self.assertEqual(respuesta.status_code, 302)
+        factura = Factura.objects.get(usuario=self.usuario)
+        self.assertEqual(factura.total, decimal.Decimal('31.00'))
+
+        respuesta = self.client.get(f'/admin/ventas/factura/{factura.pk}/change/')
+        self.assertContains(respuesta, 'data-autocompletar')
+
+        # Las líneas solo admiten productos del usuario.
+        ajeno = Producto.objects.create(usuario=User.objects.create_user('otro'), nombre='Ajeno', precio=1, stock=10)
+        datos = {'cliente': self.cliente.pk, 'numero_cuotas': 1, 'estado': 'PENDIENTE', '_save': 'Guardar'}
+        datos.update(self.datos_formset([(ajeno, 1)]))
+        respuesta = self.client.post('/admin/ventas/factura/add/', datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(Factura.objects.count(), 1)
+
+
+class TotalesIncrementalesTests(DatosBaseMixin, TestCase):
+
+    def test_pagos_ajustan_saldo_y_estado(self):
+        factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=3)
+        pago = Pago.objects.create(factura=factura, monto=decimal.Decimal('10.00'))
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, decimal.Decimal('30.00'))
+        self.assertEqual(factura.saldo_pendiente, decimal.Decimal('20.00'))
+
+        Pago.objects.create(factura=factura, monto=decimal.Decimal('20.00'))
+        factura.refresh_from_db()
+        self.assertEqual(factura.saldo_pendiente, decimal.Decimal('0.00'))
+        self.assertEqual(factura.estado, 'PAGADA')
+
+        pago.delete()
+        factura.refresh_from_db()
+        self.assertEqual(factura.saldo_pendiente, decimal.Decimal('10.00'))
+        self.assertEqual(factura.estado, 'PENDIENTE')
+
+    def test_editar_detalle_aplica_solo_la_diferencia(self):
+        factura = self.crear_factura()
+        detalle = DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=1)
+        detalle.cantidad = 4
+        detalle.save()
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, decimal.Decimal('40.00'))
+
+    def test_recalcular_totales_repara_desviaciones(self):
+        factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=2)
+        Factura.objects.filter(pk=factura.pk).update(total=999, saldo_pendiente=0, estado='PAGADA')
+
+        salida = StringIO()
+        call_command('recalcular_totales', stdout=salida)
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, decimal.Decimal('20.00'))
+        self.assertEqual(factura.saldo_pendiente, decimal.Decimal('20.00'))
+        self.assertEqual(factura.estado, 'PENDIENTE')
+        self.assertIn('1 reparadas', salida.getvalue())
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class ConsultasVistasFacturaTests(DatosBaseMixin, TestCase):
+    """El número de consultas de cada vista no debe crecer con el número de filas."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def factura_con_lineas(self, numero_lineas):
+        factura = self.crear_factura()
+        for producto in self.productos[:numero_lineas]:
+            DetalleFactura.objects.create(factura=factura, producto=producto, cantidad=2)
+            Pago.objects.create(factura=factura, monto=decimal.Decimal('1.00'))
+        return factura
+
+    def test_lista_facturas(self):
+        # Sesión, usuario y la página de facturas: el filtro de cliente no lista los clientes.
+        for _ in range(3):
+            self.crear_factura()
+        with self.assertNumQueries(3):
+            self.client.get('/ventas/facturas/')
+        for _ in range(20):
+            self.crear_factura()
+        Cliente.objects.create(usuario=self.usuario, nombre='Zoe', apellido='Sin Facturas')
+        with self.assertNumQueries(3):
+            respuesta = self.client.get('/ventas/facturas/')
+        self.assertContains(respuesta, 'Factura #', count=23)
+        self.assertNotContains(respuesta, 'Sin Facturas')
+
+        # Con un cliente elegido solo se lee ese cliente.
+        with self.assertNumQueries(4):
+            respuesta = self.client.get('/ventas/facturas/', {'cliente': self.cliente.pk})
+        self.assertContains(respuesta, f'<option value="{self.cliente.pk}" selected>')
+
+    def test_detalle_factura(self):
+        for numero_lineas in (1, 20):
+            factura = self.factura_con_lineas(numero_lineas)
+            with self.assertNumQueries(5):
+                respuesta = self.client.get(f'/ventas/facturas/{factura.pk}/')
+        self.assertContains(respuesta, 'Producto 19')
+        self.assertContains(respuesta, '$58')
+
+    def test_comprobante(self):
+        for numero_lineas in (1, 20):
+            factura = self.factura_con_lineas(numero_lineas)
+            with self.assertNumQueries(5):
+                respuesta = self.client.get(f'/ventas/facturas/{factura.pk}/comprobante/')
+        self.assertContains(respuesta, 'Producto 19')
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class PaginacionKeysetTests(DatosBaseMixin, TestCase):
+
+    def recorrer(self, queryset, orden, por_pagina):
+        """Devuelve las páginas hacia adelante y luego hacia atrás desde la última."""
+        adelante, pagina = [], PaginaKeyset(queryset, orden, por_pagina=por_pagina)
+        while True:
+            adelante.append([obj.pk for obj in pagina])
+            if not pagina.hay_siguiente:
+                break
+            pagina = PaginaKeyset(queryset, orden, despues=pagina._decodificar(pagina.cursor_siguiente), por_pagina=por_pagina)
+        atras = [[obj.pk for obj in pagina]]
+        while pagina.hay_anterior:
+            pagina = PaginaKeyset(queryset, orden, antes=pagina._decodificar(pagina.cursor_anterior), por_pagina=por_pagina)
+            atras.append([obj.pk for obj in pagina])
+        return adelante, atras[::-1]
+
+    def test_recorrido_estable_en_ambos_sentidos(self):
+        facturas = [self.crear_factura() for _ in range(11)]
+        # Varias facturas comparten fecha: el id desempata.
+        Factura.objects.filter(pk__in=[f.pk for f in facturas[:4]]).update(fecha_emision='2025-01-01')
+
+        queryset = Factura.objects.filter(usuario=self.usuario)
+        adelante, atras = self.recorrer(queryset, ('-fecha_emision', 'id'), por_pagina=3)
+
+        esperado = list(queryset.order_by('-fecha_emision', 'id').values_list('pk', flat=True))
+        self.assertEqual(sum(adelante, []), esperado)
+        self.assertEqual(adelante, atras)
+        self.assertEqual([len(p) for p in adelante], [3, 3, 3, 2])
+
+    def test_filtros_y_cursor_invalido(self):
+        self.client.force_login(self.usuario)
+        pagada = self.crear_factura()
+        Factura.objects.filter(pk=pagada.pk).update(estado='PAGADA')
+        self.crear_factura()
+
+        # El segundo es un JSON válido, [[],1], con una lista donde va la fecha.
+        for cursor in ('no-es-un-cursor', 'W1tdLDFd'):
+            respuesta = self.client.get('/ventas/facturas/', {'estado': 'PAGADA', 'despues': cursor})
+            self.assertEqual([f.pk for f in respuesta.context['facturas']], [pagada.pk])
+
+    def test_enlaces_de_paginacion(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get('/ventas/productos/')
+        self.assertEqual(len(respuesta.context['productos']), 25)
+        cursor = respuesta.context['pagina'].cursor_siguiente
+        self.assertContains(respuesta, f'?despues={cursor}')
+
+        respuesta = self.client.get('/ventas/productos/', {'despues': cursor})
+        self.assertEqual([p.nombre for p in respuesta.context['productos']][0], 'Producto 25')
+        self.assertContains(respuesta, '?antes=')
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class DashboardTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_resumen_en_cache_e_invalidado_por_pagos(self):
+        factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=3)
+
+        # Sesión, usuario, agregado de facturas, conteo de clientes y últimas facturas.
+        with self.assertNumQueries(5):
+            respuesta = self.client.get('/ventas/')
+        self.assertEqual(respuesta.context['facturas_pendientes'], 1)
+        self.assertEqual(respuesta.context['total_por_cobrar'], decimal.Decimal('30.00'))
+
+        # Con el resumen y el fragmento de últimas facturas en caché solo quedan sesión y usuario.
+        with self.assertNumQueries(2):
+            self.client.get('/ventas/')
+
+        Pago.objects.create(factura=factura, monto=decimal.Decimal('30.00'))
+        respuesta = self.client.get('/ventas/')
+        self.assertEqual(respuesta.context['facturas_pendientes'], 0)
+        self.assertEqual(respuesta.context['total_por_cobrar'], decimal.Decimal('0.00'))
+
+    def test_nuevo_cliente_invalida_resumen(self):
+        self.assertEqual(self.client.get('/ventas/').context['total_clientes'], 1)
+        Cliente.objects.create(usuario=self.usuario, nombre='Luis', apellido='Gómez', email='luis@example.com')
+        self.assertEqual(self.client.get('/ventas/').context['total_clientes'], 2)
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class CacheFragmentosTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_fragmento_de_productos_se_invalida_al_guardar(self):
+        self.client.get('/ventas/productos/')
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/ventas/productos/')
+        self.assertContains(respuesta, 'Producto 0')
+
+        producto = self.productos[0]
+        producto.nombre = 'Café de origen'
+        producto.save()
+        self.assertContains(self.client.get('/ventas/productos/'), 'Café de origen')
+
+    @override_settings(VENTAS_CACHE_COMPARTIDA=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'fragmentos': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+    def test_sin_cache_compartida_no_se_reutiliza_nada(self):
+        from .cache import resumen_dashboard
+
+        # Los cambios sin señales simulan los hechos en otro worker, que sube su propia versión.
+        self.client.get('/ventas/productos/')
+        Producto.objects.filter(pk=self.productos[0].pk).update(nombre='Cambiado en otro worker')
+        self.assertContains(self.client.get('/ventas/productos/'), 'Cambiado en otro worker')
+
+        resumen_dashboard(self.usuario)
+        Cliente.objects.bulk_create([Cliente(usuario=self.usuario, nombre='Luis', apellido='Gil')])
+        self.assertEqual(resumen_dashboard(self.usuario)['total_clientes'], 2)
+
+    def test_fragmentos_separados_por_usuario(self):
+        self.client.get('/ventas/productos/')
+        otro = User.objects.create_user('vecino', password='clave-segura')
+        Producto.objects.create(usuario=otro, nombre='Producto ajeno', precio=1)
+        self.client.force_login(otro)
+        respuesta = self.client.get('/ventas/productos/')
+        self.assertContains(respuesta, 'Producto ajeno')
+        self.assertNotContains(respuesta, 'Producto 0')
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class RespuestasCondicionalesTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_304_sin_ejecutar_la_vista_hasta_que_cambian_los_datos(self):
+        factura = self.crear_factura()
+        ruta = f'/ventas/facturas/{factura.pk}/'
+        respuesta = self.client.get(ruta)
+        etag = respuesta['ETag']
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+
+        # Solo la sesión y el usuario.
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(ruta, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((respuesta.status_code, respuesta.content), (304, b''))
+
+        self.cliente.save()
+        respuesta = self.client.get(ruta, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_con_mensajes_pendientes_la_pagina_no_se_guarda(self):
+        self.crear_factura()
+        etag = self.client.get('/ventas/clientes/')['ETag']
+
+        # El cliente tiene facturas: no se borra, solo deja un mensaje de error.
+        self.client.post(f'/ventas/clientes/{self.cliente.pk}/borrar/')
+        respuesta = self.client.get('/ventas/clientes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(respuesta, 'No se puede eliminar')
+        self.assertIn('no-store', respuesta['Cache-Control'])
+        self.assertFalse(respuesta.has_header('ETag'))
+
+        self.assertEqual(self.client.get('/ventas/clientes/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_etag_separado_por_usuario(self):
+        etag = self.client.get('/ventas/productos/')['ETag']
+        self.client.force_login(User.objects.create_user('vecino'))
+        self.assertEqual(self.client.get('/ventas/productos/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sin_cache_compartida_no_hay_etag(self):
+        etag = self.client.get('/ventas/productos/')['ETag']
+        with override_settings(VENTAS_CACHE_COMPARTIDA=False):
+            respuesta = self.client.get('/ventas/productos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('no-store', respuesta['Cache-Control'])
+        self.assertFalse(respuesta.has_header('ETag'))
+
+
+class CacheUrlTests(TestCase):
+
+    def test_backends(self):
+        from core_config.cache_url import parse
+
+        self.assertEqual(parse('locmem://')['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(parse('file:///tmp/cache')['LOCATION'], '/tmp/cache')
+        redis = parse('redis://cache:6379/1?timeout=60&prefijo=ventas')
+        self.assertEqual(redis['LOCATION'], 'redis://cache:6379/1')
+        self.assertEqual((redis['TIMEOUT'], redis['KEY_PREFIX']), (60, 'ventas'))
+        self.assertEqual(parse('file:///tmp/cache?max_entradas=10000')['OPTIONS'], {'MAX_ENTRIES': 10000})
+
+
+def imagen_png(ancho=1200, alto=600, nombre='foto.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (ancho, alto), (200, 30, 30)).save(buffer, format='PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class ProcesamientoImagenesTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def crear_con_imagen(self):
+        respuesta = self.client.post('/ventas/productos/crear/', {
+            'nombre': 'Camiseta', 'precio': '25.00', 'stock': '3', 'imagen': imagen_png(),
+        })
+        self.assertRedirects(respuesta, '/ventas/productos/', fetch_redirect_response=False)
+        return Producto.objects.get(nombre='Camiseta')
+
+    def test_la_subida_queda_en_cola_sin_procesar(self):
+        with mock.patch('ventas.imagenes.moderar') as moderar:
+            producto = self.crear_con_imagen()
+        moderar.assert_not_called()
+        self.assertEqual(producto.estado_imagen, 'PENDIENTE')
+        self.assertFalse(producto.imagen)
+        self.assertTrue(producto.imagen_original.name.startswith('productos/originales/camiseta-'))
+        self.assertContains(self.client.get(f'/ventas/productos/{producto.pk}/'), 'se está procesando')
+
+    def test_worker_publica_imagen_redimensionada(self):
+        producto = self.crear_con_imagen()
+        with mock.patch('ventas.imagenes.moderar', return_value=[]):
+            call_command('procesar_imagenes', stdout=StringIO())
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'LISTA')
+        with producto.imagen.open('rb') as publicada:
+            img = Image.open(publicada)
+            self.assertEqual((img.format, img.width, img.height), ('JPEG', 640, 320))
+        self.assertEqual(sorted(producto.imagenes_derivadas), ['jpeg', 'webp'])
+        self.assertEqual(sorted(producto.imagenes_derivadas['webp'], key=int), ['96', '240', '640'])
+
+        respuesta = self.client.get(f'/ventas/productos/{producto.pk}/')
+        self.assertContains(respuesta, '<source type="image/webp"')
+        self.assertContains(respuesta, '-96.webp 96w')
+
+    def test_worker_rechaza_contenido_inapropiado(self):
+        producto = self.crear_con_imagen()
+        with mock.patch('ventas.imagenes.moderar', return_value=[{'Name': 'Violence'}]):
+            call_command('procesar_imagenes', stdout=StringIO())
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'RECHAZADA')
+        self.assertFalse(producto.imagen)
+        self.assertFalse(producto.imagen_original)
+
+    def test_derivados_deterministas_y_backfill(self):
+        from .imagenes import generar_derivados
+
+        contenido = imagen_png(ancho=200, alto=100).read()
+        derivados = generar_derivados(contenido)
+        # Una imagen de 200px no se amplía: 96, 200 (en lugar de 240 y 640).
+        self.assertEqual(sorted({ancho for _, ancho in derivados}), [96, 200])
+        self.assertEqual(
+            [nombre for nombre, _ in derivados.values()],
+            [nombre for nombre, _ in generar_derivados(contenido).values()],
+        )
+
+        # Un producto antiguo con imagen publicada y sin versiones.
+        producto = self.productos[0]
+        nombre = default_storage.save('productos/antigua.jpg', imagen_png(nombre='antigua.png'))
+        Producto.objects.filter(pk=producto.pk).update(imagen=nombre)
+        call_command('generar_derivados', stdout=StringIO())
+
+        producto.refresh_from_db()
+        self.assertEqual(sorted(producto.imagenes_derivadas['jpeg'], key=int), ['96', '240', '640'])
+        self.assertTrue(producto.imagen.name.endswith('-640.jpg'))
+
+
+class ClientesAwsTests(TestCase):
+
+    def setUp(self):
+        from .aws import reiniciar_clientes
+        reiniciar_clientes()
+        self.addCleanup(reiniciar_clientes)
+
+    @override_settings(VENTAS_AWS_FABRICA='unittest.mock.MagicMock')
+    def test_un_solo_cliente_por_servicio_entre_hilos(self):
+        import threading
+        from .aws import obtener_cliente
+
+        clientes = []
+        hilos = [threading.Thread(target=lambda: clientes.append(obtener_cliente('rekognition'))) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len({id(cliente) for cliente in clientes}), 1)
+        self.assertIsNot(obtener_cliente('s3'), clientes[0])
+
+    def test_moderacion_con_cliente_simulado(self):
+        import boto3
+        from botocore.stub import Stubber
+        from .aws import registrar_cliente
+        from .imagenes import moderar
+
+        cliente = boto3.client('rekognition', region_name='us-east-1', aws_access_key_id='x', aws_secret_access_key='x')
+        registrar_cliente('rekognition', cliente)
+        with Stubber(cliente) as stub:
+            stub.add_response('detect_moderation_labels', {'ModerationLabels': [{'Name': 'Violence'}]}, {'Image': {'Bytes': b'foto'}})
+            self.assertEqual(moderar(b'foto'), [{'Name': 'Violence'}])
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class VistasAsincronasTests(DatosBaseMixin, TestCase):
+
+    def peticion(self, ruta, datos):
+        from django.contrib.messages.storage.cookie import CookieStorage
+        from django.test import AsyncRequestFactory
+
+        request = AsyncRequestFactory().post(ruta, datos)
+
+        async def auser():
+            return self.usuario
+        request.user, request.auser = self.usuario, auser
+        request._messages = CookieStorage(request)
+        return request
+
+    async def test_crear_modera_durante_la_peticion_y_el_worker_reutiliza_el_veredicto(self):
+        from asgiref.sync import sync_to_async
+        from .views import crear_producto_async
+
+        datos = {'nombre': 'Camiseta', 'precio': '25.00', 'stock': '3', 'imagen': imagen_png()}
+        with mock.patch('ventas.imagenes.moderar', return_value=[]) as moderar:
+            respuesta = await crear_producto_async(self.peticion('/ventas/productos/crear/', datos))
+        self.assertEqual(respuesta.status_code, 302)
+        moderar.assert_called_once()
+        producto = await Producto.objects.aget(nombre='Camiseta')
+        self.assertEqual(producto.estado_imagen, 'PENDIENTE')
+        self.assertTrue(producto.imagen_original.name.startswith('productos/originales/camiseta-'))
+
+        with mock.patch('ventas.imagenes.moderar') as moderar:
+            await sync_to_async(call_command)('procesar_imagenes', stdout=StringIO())
+        moderar.assert_not_called()
+        await producto.arefresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'LISTA')
+
+    async def test_imagen_rechazada_no_guarda_nada(self):
+        from .views import crear_producto_async
+
+        datos = {'nombre': 'Camiseta', 'precio': '25.00', 'stock': '3', 'imagen': imagen_png()}
+        originales = default_storage.listdir('productos/originales')[1] if default_storage.exists('productos/originales') else []
+        with mock.patch('ventas.imagenes.moderar', return_value=[{'Name': 'Violence'}]):
+            respuesta = await crear_producto_async(self.peticion('/ventas/productos/crear/', datos))
+        self.assertContains(respuesta, 'fue rechazada')
+        self.assertFalse(await Producto.objects.filter(nombre='Camiseta').aexists())
+        self.assertEqual(default_storage.listdir('productos/originales')[1], originales)
+
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    async def test_middleware_asincrono_mide_consultas_y_sirve_estaticos(self):
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self.async_client.get('/ventas/productos/')
+        # Las consultas de la vista síncrona ocurren en otro hilo y también se cuentan.
+        self.assertRegex(respuesta['Server-Timing'], r'bd;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+        respuesta = await self.async_client.get('/static/js/autocompletar.js')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'data-autocompletar', respuesta.content)
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class SubidaDirectaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def preparar(self, tipo='image/png'):
+        return self.client.post('/ventas/productos/subidas/', {'nombre': 'Mi Foto.png', 'tipo': tipo, 'tamano': 1000},
+                                content_type='application/json')
+
+    def test_subida_al_storage_y_formulario_solo_con_el_token(self):
+        firmado = self.preparar().json()
+        self.assertEqual(firmado['url'], '/ventas/subidas/local/')
+        clave = firmado['campos']['key']
+        self.assertRegex(clave, r'^productos/originales/mi-foto-[0-9a-f-]{36}\.png$')
+
+        respuesta = self.client.post(firmado['url'], {**firmado['campos'], 'file': imagen_png()})
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertTrue(default_storage.exists(clave))
+
+        respuesta = self.client.post('/ventas/productos/crear/', {
+            'nombre': 'Camiseta', 'precio': '25.00', 'stock': '3', 'imagen_subida': firmado['token'],
+        })
+        self.assertRedirects(respuesta, '/ventas/productos/', fetch_redirect_response=False)
+        producto = Producto.objects.get(nombre='Camiseta')
+        self.assertEqual((producto.imagen_original.name, producto.estado_imagen), (clave, 'PENDIENTE'))
+
+        with mock.patch('ventas.imagenes.moderar', return_value=[]):
+            call_command('procesar_imagenes', stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'LISTA')
+
+    def test_rechazos(self):
+        self.assertEqual(self.preparar(tipo='image/gif').status_code, 400)
+
+        firmado = self.preparar().json()
+        alterados = {**firmado['campos'], 'key': 'productos/otra.png', 'file': imagen_png()}
+        self.assertEqual(self.client.post(firmado['url'], alterados).status_code, 403)
+
+        # Sin haber subido el archivo, y con el token de otro usuario.
+        datos = {'nombre': 'Camiseta', 'precio': '25.00', 'stock': '3', 'imagen_subida': firmado['token']}
+        self.assertContains(self.client.post('/ventas/productos/crear/', datos), 'no terminó de subirse')
+        self.client.post(firmado['url'], {**firmado['campos'], 'file': imagen_png()})
+        self.client.force_login(User.objects.create_user('otro'))
+        self.assertContains(self.client.post('/ventas/productos/crear/', datos), 'no es válida')
+
+    def test_post_prefirmado_de_s3(self):
+        import base64
+        import json
+        from .subidas import preparar_subida
+
+        s3 = {
+            'BACKEND': 'ventas.aws.AlmacenS3',
+            'OPTIONS': {'bucket_name': 'tienda', 'location': 'media', 'region_name': 'us-east-1',
+                        'access_key': 'x', 'secret_key': 'y'},
+        }
+        with override_settings(STORAGES={**STORAGES_PRUEBAS, 'default': s3}):
+            firmado = preparar_subida(self.usuario, 'foto.jpg', 'image/jpeg')
+            self.assertEqual(self.client.post('/ventas/subidas/local/').status_code, 404)
+        self.assertIn('tienda', firmado['url'])
+        self.assertTrue(firmado['campos']['key'].startswith('media/productos/originales/foto-'))
+        politica = json.loads(base64.b64decode(firmado['campos']['policy']))
+        self.assertIn(['content-length-range', 1, 5 * 1024 * 1024], politica['conditions'])
+
+
+class CacheModeracionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_imagenes_identicas_solo_se_moderan_una_vez(self):
+        from .imagenes import estadisticas_moderacion, moderar_con_cache
+
+        with mock.patch('ventas.imagenes.moderar', return_value=[]) as moderar:
+            for _ in range(3):
+                self.assertEqual(moderar_con_cache(b'misma foto'), [])
+            moderar_con_cache(b'otra foto')
+        self.assertEqual(moderar.call_count, 2)
+        self.assertEqual(estadisticas_moderacion(), {'aciertos': 2, 'fallos': 2})
+
+    def test_veredicto_caducado_se_vuelve_a_consultar(self):
+        from .imagenes import huella_contenido, moderar_con_cache
+        from .models import VeredictoModeracion
+
+        VeredictoModeracion.objects.create(huella=huella_contenido(b'foto'), etiquetas=[], expira='2000-01-01T00:00:00Z')
+        with mock.patch('ventas.imagenes.moderar', return_value=[{'Name': 'Violence'}]) as moderar:
+            self.assertEqual(moderar_con_cache(b'foto'), [{'Name': 'Violence'}])
+        moderar.assert_called_once()
+
+        call_command('purgar_moderacion', stdout=StringIO())
+        self.assertEqual(VeredictoModeracion.objects.count(), 1)
+
+    def test_espera_a_la_moderacion_en_vuelo(self):
+        from django.utils import timezone
+        from .imagenes import huella_contenido, moderar_con_cache
+        from .models import VeredictoModeracion
+
+        huella = huella_contenido(b'foto')
+        cache.set(f'ventas:moderacion:en_vuelo:{huella}', True)
+
+        def otro_worker_termina(segundos):
+            VeredictoModeracion.objects.create(huella=huella, etiquetas=[], expira=timezone.now() + datetime.timedelta(days=1))
+            cache.delete(f'ventas:moderacion:en_vuelo:{huella}')
+
+        with mock.patch('ventas.imagenes.time.sleep', side_effect=otro_worker_termina), \
+                mock.patch('ventas.imagenes.moderar') as moderar:
+            self.assertEqual(moderar_con_cache(b'foto'), [])
+        moderar.assert_not_called()
+
+    def test_quien_se_cansa_de_esperar_no_borra_la_marca_ajena(self):
+        from .imagenes import huella_contenido, moderar_con_cache
+
+        clave = f'ventas:moderacion:en_vuelo:{huella_contenido(b"foto")}'
+        cache.set(clave, True)
+        with mock.patch('ventas.imagenes.ESPERA_MODERACION', 0), \
+                mock.patch('ventas.imagenes.moderar', return_value=[]) as moderar:
+            self.assertEqual(moderar_con_cache(b'foto'), [])
+        moderar.assert_called_once()
+        self.assertTrue(cache.get(clave))
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class ImportacionTests(DatosBaseMixin, TestCase):
+
+    def test_subida_csv_crea_validos_e_informa_errores(self):
+        self.client.force_login(self.usuario)
+        contenido = (
+            'Nombre;Apellido;Email;Telefono\n'
+            'Luis;Gómez;luis@example.com;600111222\n'
+            'Sin;Correo;no-es-un-email;\n'
+            'Marta;Ruiz;marta@example.com;\n'
+        ).encode('utf-8-sig')
+        respuesta = self.client.post('/ventas/importar/', {
+            'tipo': 'clientes',
+            'archivo': SimpleUploadedFile('clientes.csv', contenido, content_type='text/csv'),
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['informe']['creados'], 2)
+        [(linea, mensajes)] = respuesta.context['informe']['errores']
+        self.assertEqual(linea, 3)
+        self.assertTrue(mensajes[0].startswith('email:'))
+        self.assertTrue(Cliente.objects.filter(usuario=self.usuario, email='marta@example.com').exists())
+
+    def test_subida_xlsx(self):
+        import openpyxl
+
+        libro = openpyxl.Workbook()
+        hoja = libro.active
+        hoja.append(['Nombre', 'Precio', 'Stock'])
+        hoja.append(['Hoja de cálculo', 12.5, 3])
+        hoja.append(['Sin precio', None, 1])
+        buffer = BytesIO()
+        libro.save(buffer)
+
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post('/ventas/importar/', {
+            'tipo': 'productos',
+            'archivo': SimpleUploadedFile('productos.xlsx', buffer.getvalue()),
+        })
+        self.assertEqual(respuesta.context['informe']['creados'], 1)
+        self.assertEqual([linea for linea, _ in respuesta.context['informe']['errores']], [3])
+        producto = Producto.objects.get(usuario=self.usuario, nombre='Hoja de cálculo')
+        self.assertEqual((producto.precio, producto.stock), (decimal.Decimal('12.50'), 3))
+
+    def test_archivos_corruptos_son_un_error_del_formulario(self):
+        import zipfile
+
+        sin_libro = BytesIO()
+        with zipfile.ZipFile(sin_libro, 'w') as comprimido:
+            comprimido.writestr('hola.txt', 'no es un libro')
+        casos = [
+            ('productos.xlsx', b'un CSV renombrado a .xlsx', 'no es un .xlsx válido'),
+            ('productos.xlsx', sin_libro.getvalue(), 'no es un .xlsx válido'),
+            ('productos.csv', b'nombre,precio,stock\n"' + b'x' * 200000 + b'",1,1\n', 'El archivo CSV no es válido'),
+        ]
+        self.client.force_login(self.usuario)
+        for nombre, contenido, mensaje in casos:
+            respuesta = self.client.post('/ventas/importar/', {
+                'tipo': 'productos', 'archivo': SimpleUploadedFile(nombre, contenido),
+            })
+            self.assertContains(respuesta, mensaje)
+            self.assertIsNone(respuesta.context['informe'])
+
+    def test_comando_inserta_por_lotes(self):
+        from .importacion import importar
+
+        filas = ''.join(f'Importado {i},{i}.50,{i}\n' for i in range(10))
+        archivo = BytesIO(f'nombre,precio,stock\n{filas}Roto,-1,2\n'.encode())
+        with CaptureQueriesContext(connection) as consultas:
+            lotes = list(importar(archivo, 'productos.csv', 'productos', self.usuario, tamano_lote=4))
+        self.assertEqual([lote.creados for lote in lotes], [4, 4, 2])
+        self.assertEqual(lotes[-1].errores[0][0], 12)
+        # Un INSERT por lote, no uno por fila.
+        self.assertEqual(sum('INSERT' in q['sql'] for q in consultas.captured_queries), 3)
+        self.assertEqual(Producto.objects.filter(usuario=self.usuario, nombre__startswith='Importado').count(), 10)
+
+        with self.assertRaises(CommandError):
+            call_command('importar_datos', 'productos', 'no-existe.csv', usuario='tendero')
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class ExportacionCsvTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.facturas = []
+        for i in range(3):
+            factura = self.crear_factura()
+            DetalleFactura.objects.create(factura=factura, producto=self.productos[i], cantidad=2)
+            self.facturas.append(factura)
+        Pago.objects.create(factura=self.facturas[0], monto=self.facturas[0].total)
+
+    def leer(self, respuesta):
+        self.assertTrue(respuesta.streaming)
+        return list(csv.reader(StringIO(b''.join(respuesta.streaming_content).decode('utf-8-sig'))))
+
+    def test_exporta_facturas_filtradas(self):
+        respuesta = self.client.get('/ventas/facturas/exportar/facturas/', {'estado': 'PENDIENTE'})
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        filas = self.leer(respuesta)
+        self.assertEqual(filas[0][0], 'Factura')
+        self.assertEqual(sorted(int(fila[0]) for fila in filas[1:]), [f.pk for f in self.facturas[1:]])
+
+    def test_exporta_pagos_y_detalles_sin_instanciar_modelos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            filas = self.leer(self.client.get('/ventas/facturas/exportar/detalles/'))
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(decimal.Decimal(filas[1][-1]), self.productos[0].precio * 2)
+        # Sesión, usuario y una sola consulta para todas las filas.
+        self.assertEqual(len(consultas), 3)
+
+        # La fecha del pago sale en la hora de Bogotá (UTC-5), no en UTC.
+        Pago.objects.update(fecha_pago=datetime.datetime(2025, 3, 1, 2, 30, tzinfo=datetime.timezone.utc))
+        filas = self.leer(self.client.get('/ventas/facturas/exportar/pagos/'))
+        self.assertEqual([(fila[1], fila[2]) for fila in filas[1:]], [(str(self.facturas[0].pk), '2025-02-28 21:30:00')])
+        self.assertEqual(self.client.get('/ventas/facturas/exportar/clientes/').status_code, 404)
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class ComprobantePdfTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=self.factura, producto=self.productos[0], cantidad=3)
+
+    def test_pdf_se_guarda_y_se_regenera_al_cambiar_la_factura(self):
+        from . import comprobantes
+
+        url = f'/ventas/facturas/{self.factura.pk}/comprobante/pdf/'
+        with mock.patch('ventas.comprobantes.generar_pdf', wraps=comprobantes.generar_pdf) as generar:
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+            self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+            self.client.get(url)
+            self.assertEqual(generar.call_count, 1)
+
+            Pago.objects.create(factura=self.factura, monto=decimal.Decimal('5.00'))
+            self.client.get(url)
+            self.assertEqual(generar.call_count, 2)
+
+            # Lo impreso que no cambia Factura.actualizado también cuenta.
+            Producto.objects.filter(pk=self.productos[0].pk).update(nombre='Producto renombrado')
+            self.client.get(url)
+            self.assertEqual(generar.call_count, 3)
+        # La versión anterior se borra al generar la nueva.
+        self.assertEqual(len(default_storage.listdir(f'comprobantes/{self.factura.pk}')[1]), 1)
+
+    def test_comando_pregenera_por_rango_de_fechas(self):
+        salida = StringIO()
+        call_command('generar_comprobantes', desde='2000-01-01', procesos=1, stdout=salida)
+        self.assertIn('1 comprobantes generados', salida.getvalue())
+        call_command('generar_comprobantes', hasta='2000-01-01', procesos=1, stdout=salida)
+        self.assertIn('0 facturas', salida.getvalue())
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class ResumenesDiariosTests(DatosBaseMixin, TestCase):
+
+    def foto(self):
+        diarios = ResumenDiario.objects.filter(usuario=self.usuario).exclude(facturado=0, cobrado=0, saldo=0)
+        productos = ResumenProductoDiario.objects.filter(usuario=self.usuario).exclude(unidades=0, importe=0)
+        return (
+            sorted(diarios.values_list('cliente', 'fecha', 'facturado', 'cobrado', 'saldo')),
+            sorted(productos.values_list('producto', 'fecha', 'unidades', 'importe')),
+        )
+
+    def test_incrementales_coinciden_con_reconstruccion(self):
+        otro_cliente = Cliente.objects.create(usuario=self.usuario, nombre='Luis', apellido='Gil', email='luis@example.com')
+        factura = self.crear_factura()
+        detalle = DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=2)
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[1], cantidad=1)
+        detalle.producto, detalle.cantidad = self.productos[2], 3
+        detalle.save()
+        pago = Pago.objects.create(factura=factura, monto=decimal.Decimal('15.00'))
+        pago.monto = decimal.Decimal('20.00')
+        pago.save()
+        factura.cliente = otro_cliente
+        factura.save()
+
+        borrada = self.crear_factura()
+        DetalleFactura.objects.create(factura=borrada, producto=self.productos[0], cantidad=5)
+        Pago.objects.create(factura=borrada, monto=decimal.Decimal('1.00'))
+        borrada.delete()
+
+        incremental = self.foto()
+        self.assertEqual(incremental[1], [(self.productos[1].pk, factura.fecha_emision, 1, decimal.Decimal('11.00')),
+                                          (self.productos[2].pk, factura.fecha_emision, 3, decimal.Decimal('30.00'))])
+        call_command('reconstruir_resumenes', stdout=StringIO())
+        self.assertEqual(self.foto(), incremental)
+
+    def test_informes_leen_solo_los_resumenes(self):
+        factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=2)
+        Pago.objects.create(factura=factura, monto=decimal.Decimal('5.00'))
+        homonimo = Cliente.objects.create(usuario=self.usuario, nombre='Ana', apellido='Pérez', email='otra@example.com')
+        DetalleFactura.objects.create(
+            factura=Factura.objects.create(usuario=self.usuario, cliente=homonimo), producto=self.productos[0], cantidad=1
+        )
+        self.client.force_login(self.usuario)
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/ventas/informes/')
+        tablas = ' '.join(q['sql'] for q in consultas.captured_queries)
+        self.assertNotIn('"ventas_factura"', tablas)
+        self.assertNotIn('"ventas_pago"', tablas)
+        self.assertEqual(respuesta.context['antiguedad']['hasta_30'], decimal.Decimal('25.00'))
+        tasas = {fila['cliente_id']: fila['tasa'] for fila in respuesta.context['cobro_por_cliente']}
+        self.assertEqual(tasas, {self.cliente.pk: 25, homonimo.pk: 0})
+
+
+class FacturasAtrasadasTests(DatosBaseMixin, TestCase):
+
+    def test_vencimiento_segun_cuotas(self):
+        factura = Factura.objects.create(usuario=self.usuario, cliente=self.cliente, numero_cuotas=3)
+        self.assertEqual(factura.fecha_vencimiento, Factura.calcular_vencimiento(factura.fecha_emision, 1))
+        self.assertEqual(Factura.calcular_vencimiento(datetime.date(2024, 1, 31), 1), datetime.date(2024, 2, 29))
+
+        # Vence la primera cuota sin pagar; pagada entera, la última.
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=3)  # 30.00
+        Pago.objects.create(factura=factura, monto=decimal.Decimal('10.00'))
+        factura.refresh_from_db()
+        self.assertEqual(factura.fecha_vencimiento, Factura.calcular_vencimiento(factura.fecha_emision, 2))
+        self.assertEqual(factura.fecha_vencimiento, factura.cuotas.filter(estado='PENDIENTE').order_by('numero')[0].fecha_vencimiento)
+        Pago.objects.create(factura=factura, monto=decimal.Decimal('20.00'))
+        factura.refresh_from_db()
+        self.assertEqual(factura.fecha_vencimiento, Factura.calcular_vencimiento(factura.fecha_emision, 3))
+
+    def test_se_atrasa_con_la_primera_cuota_vencida(self):
+        D = decimal.Decimal
+        factura = Factura.objects.create(usuario=self.usuario, cliente=self.cliente, numero_cuotas=12)
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=12)  # 120.00, 12 cuotas de 10.00
+        # Emitida hace dos meses y medio: dos cuotas vencidas y diez por vencer.
+        emision = datetime.date.today() - relativedelta(months=2, days=15)
+        Factura.objects.filter(pk=factura.pk).update(fecha_emision=emision)
+        # recalcular_totales pone al día el vencimiento y rehace el plan desde la nueva emisión.
+        call_command('recalcular_totales', stdout=StringIO())
+        factura.refresh_from_db()
+        self.assertEqual(factura.fecha_vencimiento, Factura.calcular_vencimiento(emision, 1))
+
+        call_command('marcar_atrasadas', stdout=StringIO())
+        factura.refresh_from_db()
+        self.assertEqual(factura.estado, 'ATRASADA')
+
+        # Saldadas las dos cuotas vencidas vuelve a PENDIENTE y el comando ya no la toma.
+        Pago.objects.create(factura=factura, monto=D('20.00'))
+        factura.refresh_from_db()
+        self.assertEqual((factura.estado, factura.fecha_vencimiento), ('PENDIENTE', Factura.calcular_vencimiento(emision, 3)))
+        salida = StringIO()
+        call_command('marcar_atrasadas', stdout=salida)
+        self.assertIn('0 facturas marcadas', salida.getvalue())
+
+    def test_comando_marca_vencidas_por_lotes(self):
+        vencidas = []
+        for i in range(5):
+            factura = self.crear_factura()
+            DetalleFactura.objects.create(factura=factura, producto=self.productos[i], cantidad=1)
+            vencidas.append(factura)
+        al_dia = self.crear_factura()
+        DetalleFactura.objects.create(factura=al_dia, producto=self.productos[0], cantidad=1)
+        vacia = self.crear_factura()
+        ayer = datetime.date.today() - datetime.timedelta(days=1)
+        Factura.objects.filter(pk__in=[f.pk for f in vencidas] + [vacia.pk]).update(
+            fecha_emision=ayer - relativedelta(months=1), fecha_vencimiento=ayer,
+        )
+
+        salida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('marcar_atrasadas', lote=2, stdout=salida)
+        self.assertIn('5 facturas marcadas como ATRASADA', salida.getvalue())
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "ventas_factura"') for q in consultas.captured_queries), 3)
+        self.assertEqual(
+            dict(Factura.objects.values_list('pk', 'estado')),
+            {**{f.pk: 'ATRASADA' for f in vencidas}, al_dia.pk: 'PENDIENTE', vacia.pk: 'PENDIENTE'},
+        )
+
+        # Un abono parcial la deja atrasada; al saldarla pasa a PAGADA.
+        factura = vencidas[0]
+        Pago.objects.create(factura=factura, monto=decimal.Decimal('1.00'))
+        factura.refresh_from_db()
+        self.assertEqual(factura.estado, 'ATRASADA')
+        Pago.objects.create(factura=factura, monto=factura.saldo_pendiente)
+        factura.refresh_from_db()
+        self.assertEqual(factura.estado, 'PAGADA')
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class CuotasTests(DatosBaseMixin, TestCase):
+
+    def plan(self, factura):
+        return list(factura.cuotas.order_by('numero').values_list('importe', 'pagado', 'estado'))
+
+    def test_plan_y_reparto_incremental_de_pagos(self):
+        factura = Factura.objects.create(usuario=self.usuario, cliente=self.cliente, numero_cuotas=3)
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[0], cantidad=1)  # 10.00
+        D = decimal.Decimal
+        self.assertEqual(self.plan(factura), [(D('3.34'), 0, 'PENDIENTE'), (D('3.33'), 0, 'PENDIENTE'), (D('3.33'), 0, 'PENDIENTE')])
+        self.assertEqual(factura.cuotas.first().fecha_vencimiento, Factura.objects.get(pk=factura.pk).fecha_vencimiento)
+
+        pago = Pago.objects.create(factura=factura, monto=D('5.00'))
+        self.assertEqual(self.plan(factura), [(D('3.34'), D('3.34'), 'PAGADA'), (D('3.33'), D('1.66'), 'PENDIENTE'), (D('3.33'), 0, 'PENDIENTE')])
+        Pago.objects.create(factura=factura, monto=D('2.00'))
+        pago.delete()
+        # Al borrar el primer pago se vacían primero las cuotas más recientes.
+        self.assertEqual(self.plan(factura), [(D('3.34'), D('2.00'), 'PENDIENTE'), (D('3.33'), 0, 'PENDIENTE'), (D('3.33'), 0, 'PENDIENTE')])
+
+        factura.numero_cuotas = 2
+        factura.save()
+        self.assertEqual(self.plan(factura), [(D('5.00'), D('2.00'), 'PENDIENTE'), (D('5.00'), 0, 'PENDIENTE')])
+
+    def test_cuotas_de_la_semana_en_una_consulta(self):
+        for i in range(3):
+            factura = self.crear_factura()
+            DetalleFactura.objects.create(factura=factura, producto=self.productos[i], cantidad=1)
+        Cuota.objects.filter(usuario=self.usuario).update(fecha_vencimiento=datetime.date.today())
+        self.client.force_login(self.usuario)
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/ventas/cuotas/')
+        self.assertEqual(len(respuesta.context['cuotas']), 3)
+        # Sesión, usuario y las cuotas con su factura y cliente.
+        self.assertEqual(len(consultas), 3)
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class StockTests(DatosBaseMixin, TestCase):
+
+    def stock(self, *productos):
+        return list(Producto.objects.filter(pk__in=[p.pk for p in productos]).order_by('pk').values_list('stock', flat=True))
+
+    def guardar_lineas(self, factura, lineas):
+        formset = DetalleFacturaFormSet(self.datos_formset(lineas), instance=factura)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        formset.save()
+
+    def test_descuenta_devuelve_y_no_vende_de_mas(self):
+        p0, p1 = self.productos[:2]
+        Producto.objects.filter(pk=p1.pk).update(stock=5)
+        factura = self.crear_factura()
+        self.guardar_lineas(factura, [(p0, 3), (p1, 5)])
+        self.assertEqual(self.stock(p0, p1), [997, 0])
+
+        # Cambiar la cantidad devuelve o descuenta solo la diferencia.
+        detalle = factura.detalles.get(producto=p0)
+        detalle.cantidad = 1
+        detalle.save()
+        self.assertEqual(self.stock(p0, p1), [999, 0])
+
+        # Sin existencias no se guarda nada, tampoco las líneas que sí alcanzaban.
+        otra = self.crear_factura()
+        with self.assertRaises(StockInsuficiente) as error:
+            self.guardar_lineas(otra, [(p0, 1), (p1, 1)])
+        self.assertEqual(error.exception.productos, [('Producto 1', 0)])
+        self.assertEqual(self.stock(p0, p1), [999, 0])
+        self.assertFalse(otra.detalles.exists())
+
+        factura.delete()
+        self.assertEqual(self.stock(p0, p1), [1000, 5])
+
+    def test_vista_muestra_el_error_y_no_crea_la_factura(self):
+        Producto.objects.filter(pk=self.productos[0].pk).update(stock=1)
+        self.client.force_login(self.usuario)
+        datos = self.datos_formset([(self.productos[0], 2)])
+        datos.update({'cliente': self.cliente.pk, 'numero_cuotas': 1})
+        respuesta = self.client.post('/ventas/facturas/crear/', datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'No hay existencias suficientes')
+        self.assertFalse(Factura.objects.exists())
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class BusquedaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camiseta = Producto.objects.create(usuario=self.usuario, nombre='Camiseta Roja', precio=20,
+                                                descripcion='Algodón, talla M')
+        otro = User.objects.create_user('ajeno', password='clave-segura')
+        Producto.objects.create(usuario=otro, nombre='Camiseta ajena', precio=5)
+        self.client.force_login(self.usuario)
+
+    def buscar(self, q, tipo='productos', **extra):
+        respuesta = self.client.get('/ventas/buscar/', {'q': q, 'tipo': tipo, **extra})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.context['resultados']
+
+    def test_busca_sin_tildes_ni_mayusculas_y_solo_del_usuario(self):
+        self.assertEqual(list(self.buscar('camis')), [self.camiseta])
+        # Todas las palabras, en cualquier campo y orden.
+        self.assertEqual(list(self.buscar('algodon roja')), [self.camiseta])
+        self.assertEqual(list(self.buscar('PEREZ', tipo='clientes')), [self.cliente])
+        self.assertFalse(self.buscar('azul'))
+
+        # El índice en memoria se rehace cuando cambian los datos del usuario.
+        nueva = Producto.objects.create(usuario=self.usuario, nombre='Camisa azul', precio=15)
+        self.assertEqual(list(self.buscar('azul')), [nueva])
+
+    def test_facturas_por_cliente_o_numero_y_paginadas(self):
+        facturas = [self.crear_factura() for _ in range(30)]
+        self.assertEqual(list(self.buscar(f'#{facturas[3].pk}', tipo='facturas')), [facturas[3]])
+        pagina = self.buscar('ana', tipo='facturas')
+        self.assertEqual(len(pagina), 25)
+        self.assertTrue(pagina.hay_siguiente)
+        siguiente = self.buscar('ana', tipo='facturas', despues=pagina.cursor_siguiente)
+        self.assertEqual(len(siguiente), 5)
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class AutocompletarTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ajeno = Producto.objects.create(usuario=User.objects.create_user('ajeno'), nombre='Producto ajeno', precio=1)
+        self.client.force_login(self.usuario)
+
+    def test_endpoint_solo_del_usuario_y_limitado(self):
+        datos = self.client.get('/ventas/autocompletar/productos/', {'q': 'producto'}).json()['resultados']
+        self.assertEqual(len(datos), 20)
+        self.assertNotIn(self.ajeno.pk, [fila['id'] for fila in datos])
+        datos = self.client.get('/ventas/autocompletar/clientes/', {'q': 'ana'}).json()['resultados']
+        self.assertEqual(datos, [{'id': self.cliente.pk, 'texto': 'Ana Pérez'}])
+        self.assertEqual(self.client.get('/ventas/autocompletar/facturas/').status_code, 404)
+
+    def test_formulario_no_incluye_todos_los_productos(self):
+        factura = self.crear_factura()
+        DetalleFactura.objects.create(factura=factura, producto=self.productos[5], cantidad=1)
+        respuesta = self.client.get(f'/ventas/facturas/{factura.pk}/editar/')
+        self.assertContains(respuesta, 'Producto 5')
+        self.assertNotContains(respuesta, 'Producto 6')
+        self.assertContains(respuesta, 'data-autocompletar="/ventas/autocompletar/productos/"')
+
+    def test_valida_las_lineas_con_una_consulta_y_rechaza_productos_ajenos(self):
+        factura = self.crear_factura()
+        formset = DetalleFacturaFormSet(self.datos_formset([(p, 1) for p in self.productos[:10]]),
+                                        instance=factura, user=self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(formset.is_valid(), formset.errors)
+        # Las líneas guardadas de la factura y los productos elegidos.
+        self.assertEqual(len(consultas), 2)
+
+        formset = DetalleFacturaFormSet(self.datos_formset([(self.ajeno, 1)]), instance=factura, user=self.usuario)
+        self.assertFalse(formset.is_valid())
+        self.assertIn('producto', formset.errors[0])
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class MetricasTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        from . import metricas
+        metricas.reiniciar()
+        self.client.force_login(self.usuario)
+
+    def test_server_timing_y_resumen_por_vista_solo_para_staff(self):
+        respuesta = self.client.get('/ventas/productos/')
+        cabecera = respuesta['Server-Timing']
+        self.assertRegex(cabecera, r'^total;dur=[\d.]+, bd;dur=[\d.]+;desc="\d+ consultas", plantillas;dur=[\d.]+')
+        self.assertNotIn('plantillas;dur=0.0,', cabecera)
+
+        self.assertEqual(self.client.get('/ventas/metricas/').status_code, 302)
+        User.objects.filter(pk=self.usuario.pk).update(is_staff=True)
+        datos = self.client.get('/ventas/metricas/').json()
+        vista = datos['vistas']['ventas:lista_productos']
+        self.assertEqual(vista['peticiones'], 1)
+        self.assertGreater(vista['consultas_por_peticion'], 0)
+        self.assertEqual(sum(vista['total_ms']['cubetas'].values()), 1)
+
+    def test_mide_llamadas_de_boto3(self):
+        import boto3
+        from botocore.stub import Stubber
+        from .metricas import Medicion, _medicion_actual, instrumentar_eventos
+
+        cliente = boto3.client('s3', region_name='us-east-1', aws_access_key_id='x', aws_secret_access_key='x')
+        instrumentar_eventos(cliente.meta.events)
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        try:
+            with Stubber(cliente) as stub:
+                stub.add_response('list_buckets', {'Buckets': []})
+                cliente.list_buckets()
+        finally:
+            _medicion_actual.reset(token)
+        self.assertEqual(medicion.llamadas_externas, 1)
+        self.assertGreater(medicion.tiempo_externo, 0)
+
+
+@override_settings(STORAGES=STORAGES_PRUEBAS)
+class BenchmarkTests(TestCase):
+
+    def test_sembrado_determinista(self):
+        from .sembrado import sembrar
+
+        primero, = sembrar(1, clientes=5, productos=10, facturas=30, semilla=7, prefijo='a')
+        segundo, = sembrar(1, clientes=5, productos=10, facturas=30, semilla=7, prefijo='b')
+        campos = ('total', 'saldo_pendiente', 'estado', 'fecha_emision', 'numero_cuotas')
+        self.assertEqual(
+            list(Factura.objects.filter(usuario=primero).order_by('pk').values_list(*campos)),
+            list(Factura.objects.filter(usuario=segundo).order_by('pk').values_list(*campos)),
+        )
+        self.assertEqual(Cuota.objects.filter(usuario=primero).count(), Cuota.objects.filter(usuario=segundo).count())
+        # Sembrar de nuevo no duplica.
+        sembrar(1, clientes=5, productos=10, facturas=30, semilla=7, prefijo='a')
+        self.assertEqual(Factura.objects.filter(usuario=primero).count(), 30)
+
+    def test_benchmark_indices_no_toca_una_base_de_datos_cualquiera(self):
+        with self.assertRaisesMessage(CommandError, 'no parece de benchmark'):
+            call_command('benchmark_indices', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+
+    def test_benchmark_guarda_resultados_y_deja_los_datos_como_estaban(self):
+        import json
+        import tempfile
+        from .sembrado import sembrar
+
+        usuario, = sembrar(1, clientes=5, productos=10, facturas=30, lineas=2)
+        antes = list(Producto.objects.filter(usuario=usuario).order_by('pk').values_list('stock', flat=True))
+        with tempfile.NamedTemporaryFile(suffix='.json') as salida, tempfile.NamedTemporaryFile(suffix='.json') as base:
+            call_command('benchmark', usuario=usuario.username, peticiones=3, calentamiento=1, lineas=2,
+                         salida=salida.name, stdout=StringIO())
+            with open(salida.name, encoding='utf-8') as archivo:
+                informe = json.load(archivo)
+
+            # Una base imposible de igualar, en el mismo archivo que la salida: se compara con
+            # ella y no con la ejecución que la sobrescribe.
+            rapida = {nombre: {**r, 'p95_ms': 0.001, 'consultas_por_peticion': 0} for nombre, r in informe['escenarios'].items()}
+            with open(base.name, 'w', encoding='utf-8') as archivo:
+                json.dump({'escenarios': rapida}, archivo)
+            salida_comparada = StringIO()
+            call_command('benchmark', usuario=usuario.username, peticiones=3, calentamiento=1, lineas=2,
+                         salida=base.name, comparar=base.name, stdout=salida_comparada)
+            with open(base.name, encoding='utf-8') as archivo:
+                self.assertNotEqual(json.load(archivo)['escenarios'], rapida)
+
+        self.assertEqual(set(informe['escenarios']), {'dashboard', 'lista_facturas', 'detalle_factura', 'crear_factura', 'añadir_pago'})
+        for resultado in informe['escenarios'].values():
+            self.assertEqual(resultado['errores'], 0)
+            self.assertEqual(resultado['peticiones'], 3)
+        self.assertEqual(salida_comparada.getvalue().count('posible regresión'), 5)
+        self.assertEqual(Factura.objects.filter(usuario=usuario).count(), 30)
+        self.assertEqual(list(Producto.objects.filter(usuario=usuario).order_by('pk').values_list('stock', flat=True)), antes)
+
+
+class StockConcurrenteTests(TransactionTestCase):
+    """Varios hilos venden a la vez el mismo producto: nunca se venden más unidades de las que hay."""
+
+    HILOS = 8
+    VENTAS_POR_HILO = 10
+
+    def vender(self, producto, cliente, vendidas, sin_stock):
+        try:
+            for _ in range(self.VENTAS_POR_HILO):
+                while True:
+                    try:
+                        with transaction.atomic():
+                            factura = Factura.objects.create(usuario=producto.usuario, cliente=cliente)
+                            DetalleFactura.objects.create(factura=factura, producto=producto, cantidad=1)
+                    except StockInsuficiente:
+                        sin_stock.append(1)
+                    except OperationalError:
+                        # SQLite bloquea la base entera mientras otro hilo escribe: se reintenta.
+                        time.sleep(0.001)
+                        continue
+                    else:
+                        vendidas.append(1)
+                    break
+        finally:
+            connections.close_all()
+
+    def test_no_vende_mas_unidades_de_las_que_hay(self):
+        usuario = User.objects.create_user('tendero', password='clave-segura')
+        cliente = Cliente.objects.create(usuario=usuario, nombre='Ana', apellido='Pérez', email='ana@example.com')
+        producto = Producto.objects.create(usuario=usuario, nombre='Último', precio=10, stock=25)
+        vendidas, sin_stock = [], []
+        hilos = [threading.Thread(target=self.vender, args=(producto, cliente, vendidas, sin_stock)) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(vendidas), 25)
+        self.assertEqual(len(sin_stock), self.HILOS * self.VENTAS_POR_HILO - 25)
+        self.assertEqual(Producto.objects.get(pk=producto.pk).stock, 0)
+        self.assertEqual(Factura.objects.count(), 25)
@@ -1,4 +1,5 @@
 # ventas/urls.py
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
@@ -8,6 +9,13 @@ from .forms import CustomAuthenticationForm
 # Todas las URL definidas aquí tendrán el prefijo 'ventas:', por ejemplo: 'ventas:dashboard'
 app_name = 'ventas'
 
+# Servida con ASGI (ver core_config/asgi.py), el alta y la edición de productos
+# usan las vistas asíncronas: esperar a S3 y a Rekognition no ocupa el worker.
+if settings.VENTAS_VISTAS_ASYNC:
+    crear_producto, editar_producto = views.crear_producto_async, views.editar_producto_async
+else:
+    crear_producto, editar_producto = views.crear_producto, views.editar_producto
+
 urlpatterns = [
     # ==========================================================================
     # URL PRINCIPAL (DASHBOARD)
@@ -37,19 +45,45 @@ urlpatterns = [
     # URLS DE PRODUCTOS
     # ==========================================================================
     path('productos/', views.lista_productos, name='lista_productos'),
-    path('productos/crear/', views.crear_producto, name='crear_producto'),
+    path('productos/crear/', crear_producto, name='crear_producto'),
     path('productos/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
-    path('productos/<int:producto_id>/editar/', views.editar_producto, name='editar_producto'),
+    path('productos/<int:producto_id>/editar/', editar_producto, name='editar_producto'),
     path('productos/<int:producto_id>/borrar/', views.borrar_producto, name='borrar_producto'),
+    path('productos/subidas/', views.preparar_subida, name='preparar_subida'),
+    path('subidas/local/', views.subida_local, name='subida_local'),
 
     # ==========================================================================
     # URLS DE FACTURAS Y PAGOS
     # ==========================================================================
     path('facturas/', views.lista_facturas, name='lista_facturas'),
     path('facturas/crear/', views.crear_factura, name='crear_factura'),
+    path('facturas/exportar/<str:tipo>/', views.exportar_csv, name='exportar_csv'),
     path('facturas/<int:factura_id>/', views.detalle_factura, name='detalle_factura'),
     path('facturas/<int:factura_id>/editar/', views.editar_factura, name='editar_factura'),
     path('facturas/<int:factura_id>/borrar/', views.borrar_factura, name='borrar_factura'),
     path('facturas/<int:factura_id>/pago/', views.añadir_pago, name='añadir_pago'),
     path('facturas/<int:factura_id>/comprobante/', views.vista_comprobante, name='vista_comprobante'),
-]
\ No newline at end of file
+    path('facturas/<int:factura_id>/comprobante/pdf/', views.comprobante_pdf, name='comprobante_pdf'),
+    path('cuotas/', views.cuotas_por_vencer, name='cuotas_por_vencer'),
+
+    # ==========================================================================
+    # URL DE IMPORTACIÓN MASIVA
+    # ==========================================================================
+    path('importar/', views.importar_datos, name='importar_datos'),
+
+    # ==========================================================================
+    # URL DE INFORMES
+    # ==========================================================================
+    path('informes/', views.informes, name='informes'),
+
+    # ==========================================================================
+    # URL DE BÚSQUEDA
+    # ==========================================================================
+    path('buscar/', views.buscar, name='buscar'),
+    path('autocompletar/<str:tipo>/', views.autocompletar, name='autocompletar'),
+
+    # ==========================================================================
+    # URL DE MÉTRICAS (SOLO STAFF)
+    # ==========================================================================
+    path('metricas/', views.ver_metricas, name='metricas'),
+]
@@ -1,33 +1,60 @@
 # Django Imports
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db.models import Sum, Count, ProtectedError
-from django.http import HttpResponse
-from django.conf import settings
-
-# AWS SDK
-import boto3
+from django.db import transaction
+from django.db.models import Sum, ProtectedError, Q
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+import datetime
+import json
 
 # Local Imports
-from .models import Cliente, Producto, Factura, Pago, DetalleFactura
-from .forms import ClienteForm, ProductoForm, FacturaForm, DetalleFacturaFormSet, PagoForm
+from .models import Cliente, Producto, Factura, Pago, DetalleFactura, Cuota, ResumenDiario, ResumenProductoDiario
+from .forms import ClienteForm, ProductoForm, FacturaForm, DetalleFacturaFormSet, PagoForm, FiltroFacturasForm, ImportacionForm
+from .paginacion import PaginaKeyset
+from .cache import pagina_condicional, resumen_dashboard
+from .importacion import ArchivoNoValido, importar
+from .exportacion import COLUMNAS, consulta, lineas_csv
+from .comprobantes import PdfNoDisponible, facturas_con_detalles, obtener_pdf
+from .stock import StockInsuficiente
+from .busqueda import TIPOS as TIPOS_BUSQUEDA, buscar as buscar_objetos
+from .imagenes import ImagenRechazada, guardar_con_moderacion
+from . import subidas
+from . import metricas
+
+# Filas por página en los listados (paginación por cursor, ver paginacion.py)
+POR_PAGINA = 25
+# Periodos (en días) que se pueden elegir en los informes
+PERIODOS_INFORME = (7, 30, 90, 365)
+# Errores de importación que se muestran en pantalla (el comando importar_datos los lista todos)
+MAX_ERRORES_IMPORTACION = 100
 
 # ==============================================================================
 # VISTA PRINCIPAL (DASHBOARD)
 # ==============================================================================
 @login_required
 def dashboard(request):
-    total_clientes = Cliente.objects.filter(usuario=request.user).count()
-    facturas_pendientes = Factura.objects.filter(usuario=request.user, estado='PENDIENTE').count()
-    total_por_cobrar = Factura.objects.filter(usuario=request.user, estado='PENDIENTE').aggregate(Sum('saldo_pendiente'))['saldo_pendiente__sum'] or 0
-    ultimas_facturas = Factura.objects.filter(usuario=request.user).order_by('-fecha_emision')[:5]
+    # Los contadores salen de un resumen por usuario en caché (ver ventas/cache.py).
+    resumen = resumen_dashboard(request.user)
+    ultimas_facturas = (
+        Factura.objects
+        .filter(usuario=request.user)
+        .select_related('cliente')
+        .only('fecha_emision', 'total', 'saldo_pendiente', 'estado', 'cliente__nombre', 'cliente__apellido')
+        .order_by('-fecha_emision', 'id')[:5]
+    )
 
     contexto = {
-        'total_clientes': total_clientes,
-        'facturas_pendientes': facturas_pendientes,
-        'total_por_cobrar': total_por_cobrar,
+        'total_clientes': resumen['total_clientes'],
+        'facturas_pendientes': resumen['facturas_pendientes'],
+        'total_por_cobrar': resumen['total_por_cobrar'],
         'ultimas_facturas': ultimas_facturas,
     }
     return render(request, 'ventas/dashboard.html', contexto)
@@ -36,10 +63,10 @@ def dashboard(request):
 # VISTAS DE CLIENTES
 # ==============================================================================
 @login_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@pagina_condicional
 def lista_clientes(request):
-    clientes = Cliente.objects.filter(usuario=request.user)
-    return render(request, 'ventas/lista_clientes.html', {'clientes': clientes})
+    clientes = PaginaKeyset.desde_request(request, Cliente.objects.filter(usuario=request.user), ('id',), POR_PAGINA)
+    return render(request, 'ventas/lista_clientes.html', {'clientes': clientes, 'pagina': clientes})
 
 @login_required
 def crear_cliente(request):
@@ -50,13 +77,13 @@ def crear_cliente(request):
             cliente.usuario = request.user
             cliente.save()
             messages.success(request, f'Cliente "{cliente.nombre}" creado con éxito.')
-            return redirect('lista_clientes')
+            return redirect('ventas:lista_clientes')
     else:
         form = ClienteForm()
     return render(request, 'ventas/crear_cliente.html', {'form': form})
 
 @login_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@pagina_condicional
 def detalle_cliente(request, cliente_id):
     cliente = get_object_or_404(Cliente, id=cliente_id, usuario=request.user)
     return render(request, 'ventas/detalle_cliente.html', {'cliente': cliente})
@@ -69,7 +96,7 @@ def editar_cliente(request, cliente_id):
         if form.is_valid():
             form.save()
             messages.success(request, 'Cliente actualizado con éxito.')
-            return redirect('detalle_cliente', cliente_id=cliente.id)
+            return redirect('ventas:detalle_cliente', cliente_id=cliente.id)
     else:
         form = ClienteForm(instance=cliente)
     return render(request, 'ventas/editar_cliente.html', {'form': form, 'cliente': cliente})
@@ -82,82 +109,57 @@ def borrar_cliente(request, cliente_id):
             nombre_cliente = cliente.nombre
             cliente.delete()
             messages.success(request, f'Cliente "{nombre_cliente}" eliminado con éxito.')
-            return redirect('lista_clientes')
+            return redirect('ventas:lista_clientes')
         except ProtectedError:
             messages.error(request, f'Error: No se puede eliminar "{cliente.nombre}" porque tiene facturas asociadas.')
-            return redirect('detalle_cliente', cliente_id=cliente.id)
+            return redirect('ventas:detalle_cliente', cliente_id=cliente.id)
     return render(request, 'ventas/borrar_cliente.html', {'cliente': cliente})
 
 # ==============================================================================
-# VISTAS DE PRODUCTOS (CON SEGURIDAD DE REKOGNITION)
+# VISTAS DE PRODUCTOS (LAS IMÁGENES SE MODERAN EN SEGUNDO PLANO)
 # ==============================================================================
 @login_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@pagina_condicional
 def lista_productos(request):
-    productos = Producto.objects.filter(usuario=request.user)
-    return render(request, 'ventas/lista_productos.html', {'productos': productos})
+    productos = PaginaKeyset.desde_request(request, Producto.objects.filter(usuario=request.user), ('id',), POR_PAGINA)
+    return render(request, 'ventas/lista_productos.html', {'productos': productos, 'pagina': productos})
 
 @login_required
 def crear_producto(request):
     if request.method == 'POST':
-        form = ProductoForm(request.POST, request.FILES)
+        form = ProductoForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
-            imagen = request.FILES.get('imagen')
-            if imagen:
-                # --- INICIO: VERIFICACIÓN CON AWS REKOGNITION ---
-                rekognition = boto3.client('rekognition', region_name=settings.AWS_S3_REGION_NAME)
-                imagen.seek(0)
-                image_bytes = imagen.read()
-                try:
-                    response = rekognition.detect_moderation_labels(Image={'Bytes': image_bytes})
-                    if response.get('ModerationLabels'):
-                        form.add_error('imagen', 'La imagen contiene contenido inapropiado y fue rechazada.')
-                        return render(request, 'ventas/producto_form.html', {'form': form})
-                except Exception as e:
-                    form.add_error(None, f'Hubo un error al analizar la imagen: {e}')
-                    return render(request, 'ventas/producto_form.html', {'form': form})
-                # --- FIN: VERIFICACIÓN CON AWS REKOGNITION ---
-
             producto = form.save(commit=False)
             producto.usuario = request.user
             producto.save()
-            messages.success(request, '¡Producto creado con éxito!')
-            return redirect('lista_productos')
+            if producto.imagen_en_proceso:
+                # La moderación y el redimensionado corren en segundo plano (ver ventas/imagenes.py).
+                messages.success(request, '¡Producto creado con éxito! La imagen se está procesando.')
+            else:
+                messages.success(request, '¡Producto creado con éxito!')
+            return redirect('ventas:lista_productos')
     else:
-        form = ProductoForm()
+        form = ProductoForm(user=request.user)
     return render(request, 'ventas/producto_form.html', {'form': form})
 
 @login_required
 def editar_producto(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id, usuario=request.user)
     if request.method == 'POST':
-        form = ProductoForm(request.POST, request.FILES, instance=producto)
+        form = ProductoForm(request.POST, request.FILES, instance=producto, user=request.user)
         if form.is_valid():
-            imagen = request.FILES.get('imagen')
-            if imagen:
-                # --- INICIO: VERIFICACIÓN CON AWS REKOGNITION ---
-                rekognition = boto3.client('rekognition', region_name=settings.AWS_S3_REGION_NAME)
-                imagen.seek(0)
-                image_bytes = imagen.read()
-                try:
-                    response = rekognition.detect_moderation_labels(Image={'Bytes': image_bytes})
-                    if response.get('ModerationLabels'):
-                        form.add_error('imagen', 'La imagen contiene contenido inapropiado y fue rechazada.')
-                        return render(request, 'ventas/producto_form.html', {'form': form, 'producto': producto})
-                except Exception as e:
-                    form.add_error(None, f'Hubo un error al analizar la imagen: {e}')
-                    return render(request, 'ventas/producto_form.html', {'form': form, 'producto': producto})
-                # --- FIN: VERIFICACIÓN CON AWS REKOGNITION ---
-            
             form.save()
-            messages.success(request, 'Producto actualizado con éxito.')
-            return redirect('detalle_producto', producto_id=producto.id)
+            if request.FILES.get('imagen') or form.cleaned_data['imagen_subida']:
+                messages.success(request, 'Producto actualizado con éxito. La nueva imagen se está procesando.')
+            else:
+                messages.success(request, 'Producto actualizado con éxito.')
+            return redirect('ventas:detalle_producto', producto_id=producto.id)
     else:
-        form = ProductoForm(instance=producto)
+        form = ProductoForm(instance=producto, user=request.user)
     return render(request, 'ventas/producto_form.html', {'form': form, 'producto': producto})
 
 @login_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@pagina_condicional
 def detalle_producto(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id, usuario=request.user)
     return render(request, 'ventas/detalle_producto.html', {'producto': producto})
@@ -170,43 +172,151 @@ def borrar_producto(request, producto_id):
             nombre_producto = producto.nombre
             producto.delete()
             messages.success(request, f'El producto "{nombre_producto}" ha sido eliminado con éxito.')
-            return redirect('lista_productos')
+            return redirect('ventas:lista_productos')
         except ProtectedError:
             messages.error(request, f'Error: No se puede eliminar "{producto.nombre}" porque ya está siendo usado en una o más facturas.')
-            return redirect('detalle_producto', producto_id=producto.id)
+            return redirect('ventas:detalle_producto', producto_id=producto.id)
     return render(request, 'ventas/borrar_producto.html', {'producto': producto})
 
+# ==============================================================================
+# VISTAS ASÍNCRONAS DE PRODUCTOS (ASGI)
+# ==============================================================================
+# Las usa urls.py cuando la aplicación se sirve con ASGI (ver core_config/asgi.py).
+# Validar el formulario (Pillow abre y verifica la imagen) y renderizar van a un
+# hilo; la subida y la moderación se esperan sin ocupar el worker.
+
+@login_required
+async def crear_producto_async(request):
+    usuario = await request.auser()
+    form = ProductoForm(request.POST, request.FILES, user=usuario) if request.method == 'POST' else ProductoForm(user=usuario)
+    if request.method == 'POST' and await sync_to_async(form.is_valid)():
+        producto = form.save(commit=False)
+        producto.usuario = usuario
+        try:
+            await guardar_con_moderacion(producto)
+        except ImagenRechazada as e:
+            form.add_error('imagen', str(e))
+        else:
+            if producto.imagen_en_proceso:
+                messages.success(request, '¡Producto creado con éxito! La imagen se está procesando.')
+            else:
+                messages.success(request, '¡Producto creado con éxito!')
+            return redirect('ventas:lista_productos')
+    return await sync_to_async(render)(request, 'ventas/producto_form.html', {'form': form})
+
+@login_required
+async def editar_producto_async(request, producto_id):
+    usuario = await request.auser()
+    producto = await aget_object_or_404(Producto, id=producto_id, usuario=usuario)
+    if request.method == 'POST':
+        form = ProductoForm(request.POST, request.FILES, instance=producto, user=usuario)
+    else:
+        form = ProductoForm(instance=producto, user=usuario)
+    if request.method == 'POST' and await sync_to_async(form.is_valid)():
+        try:
+            await guardar_con_moderacion(form.save(commit=False))
+        except ImagenRechazada as e:
+            form.add_error('imagen', str(e))
+        else:
+            if request.FILES.get('imagen') or form.cleaned_data['imagen_subida']:
+                messages.success(request, 'Producto actualizado con éxito. La nueva imagen se está procesando.')
+            else:
+                messages.success(request, 'Producto actualizado con éxito.')
+            return redirect('ventas:detalle_producto', producto_id=producto.id)
+    return await sync_to_async(render)(request, 'ventas/producto_form.html', {'form': form, 'producto': producto})
+
+# ==============================================================================
+# SUBIDA DIRECTA DE IMÁGENES AL STORAGE (ver ventas/subidas.py)
+# ==============================================================================
+@login_required
+@require_POST
+def preparar_subida(request):
+    # El navegador envía {"nombre", "tipo", "tamano"} del archivo elegido.
+    try:
+        datos = json.loads(request.body)
+        if int(datos.get('tamano', 0)) > subidas.TAMANO_MAXIMO:
+            raise subidas.SubidaNoValida('La imagen no puede pesar más de 5MB.')
+        firmado = subidas.preparar_subida(request.user, str(datos.get('nombre', '')), datos.get('tipo', ''))
+    except subidas.SubidaNoValida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Petición no válida.'}, status=400)
+    return JsonResponse(firmado)
+
+@csrf_exempt
+@require_POST
+def subida_local(request):
+    # Hace de bucket cuando el storage no es S3; la política firmada sustituye al token CSRF, como en S3.
+    if subidas.usa_s3():
+        raise Http404
+    try:
+        subidas.recibir_subida_local(request.POST, request.FILES.get('file'))
+    except subidas.SubidaNoValida as e:
+        return HttpResponse(str(e), status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(status=204)
+
 # ==============================================================================
 # VISTAS DE FACTURAS Y PAGOS
 # ==============================================================================
+def _factura_con_detalles(request, factura_id, *relacionados):
+    """Factura del usuario con cliente, detalles y pagos en un número fijo de consultas."""
+    return get_object_or_404(facturas_con_detalles(*relacionados), id=factura_id, usuario=request.user)
+
 @login_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@pagina_condicional
 def lista_facturas(request):
-    facturas = Factura.objects.filter(usuario=request.user).order_by('-fecha_emision')
-    return render(request, 'ventas/lista_facturas.html', {'facturas': facturas})
+    facturas = (
+        Factura.objects
+        .filter(usuario=request.user)
+        .select_related('cliente')
+        .only('fecha_emision', 'total', 'saldo_pendiente', 'estado', 'cliente__nombre', 'cliente__apellido')
+    )
+    filtros = FiltroFacturasForm(request.GET or None, user=request.user)
+    facturas = PaginaKeyset.desde_request(request, filtros.filtrar(facturas), ('-fecha_emision', 'id'), POR_PAGINA)
+    contexto = {'facturas': facturas, 'pagina': facturas, 'filtros': filtros}
+    return render(request, 'ventas/lista_facturas.html', contexto)
+
+@login_required
+def exportar_csv(request, tipo):
+    # Exporta facturas, pagos o detalles con los mismos filtros que el listado de facturas.
+    if tipo not in COLUMNAS:
+        raise Http404
+    filtros = FiltroFacturasForm(request.GET or None, user=request.user)
+    respuesta = StreamingHttpResponse(
+        lineas_csv(tipo, consulta(tipo, request.user, filtros)), content_type='text/csv; charset=utf-8'
+    )
+    respuesta['Content-Disposition'] = f'attachment; filename="{tipo}-{timezone.localdate():%Y%m%d}.csv"'
+    return respuesta
 
 @login_required
 def crear_factura(request):
     # Pasamos el usuario al formulario para filtrar los clientes
     form = FacturaForm(request.POST or None, user=request.user)
-    formset = DetalleFacturaFormSet(request.POST or None)
+    formset = DetalleFacturaFormSet(request.POST or None, user=request.user)
 
     if request.method == 'POST' and form.is_valid() and formset.is_valid():
         factura = form.save(commit=False)
         factura.usuario = request.user
-        factura.save()
-        formset.instance = factura
-        formset.save()
-        messages.success(request, f'Factura #{factura.id} creada con éxito.')
-        return redirect('detalle_factura', factura_id=factura.id)
+        try:
+            # La factura y sus líneas se guardan juntas: si falta stock no queda nada.
+            with transaction.atomic():
+                factura.save()
+                formset.instance = factura
+                formset.save()
+        except StockInsuficiente as e:
+            factura.pk = None
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f'Factura #{factura.id} creada con éxito.')
+            return redirect('ventas:detalle_factura', factura_id=factura.id)
 
     contexto = {'form': form, 'formset': formset}
     return render(request, 'ventas/factura_form.html', contexto)
 
 @login_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@pagina_condicional
 def detalle_factura(request, factura_id):
-    factura = get_object_or_404(Factura, id=factura_id, usuario=request.user)
+    factura = _factura_con_detalles(request, factura_id)
     return render(request, 'ventas/detalle_factura.html', {'factura': factura})
 
 @login_required
@@ -214,15 +324,20 @@ def editar_factura(request, factura_id):
     factura = get_object_or_404(Factura, id=factura_id, usuario=request.user)
     if request.method == 'POST':
         form = FacturaForm(request.POST, user=request.user, instance=factura)
-        formset = DetalleFacturaFormSet(request.POST, instance=factura)
+        formset = DetalleFacturaFormSet(request.POST, instance=factura, user=request.user)
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
-            messages.success(request, f'Factura #{factura.id} actualizada con éxito.')
-            return redirect('detalle_factura', factura_id=factura.id)
+            try:
+                with transaction.atomic():
+                    form.save()
+                    formset.save()
+            except StockInsuficiente as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f'Factura #{factura.id} actualizada con éxito.')
+                return redirect('ventas:detalle_factura', factura_id=factura.id)
     else:
         form = FacturaForm(user=request.user, instance=factura)
-        formset = DetalleFacturaFormSet(instance=factura)
+        formset = DetalleFacturaFormSet(instance=factura, user=request.user)
     contexto = {'form': form, 'formset': formset, 'factura': factura}
     return render(request, 'ventas/factura_form.html', contexto)
 
@@ -231,11 +346,11 @@ def borrar_factura(request, factura_id):
     factura = get_object_or_404(Factura, id=factura_id, usuario=request.user)
     if factura.pagos.exists():
         messages.error(request, '¡Acción no permitida! No se puede borrar una factura que ya tiene pagos registrados.')
-        return redirect('detalle_factura', factura_id=factura.id)
+        return redirect('ventas:detalle_factura', factura_id=factura.id)
     if request.method == 'POST':
         factura.delete()
         messages.success(request, f'La factura #{factura.id} ha sido eliminada con éxito.')
-        return redirect('lista_facturas')
+        return redirect('ventas:lista_facturas')
     return render(request, 'ventas/borrar_factura.html', {'factura': factura})
 
 @login_required
@@ -248,12 +363,167 @@ def añadir_pago(request, factura_id):
             pago.factura = factura
             pago.save()
             messages.success(request, 'Pago registrado con éxito.')
-            return redirect('detalle_factura', factura_id=factura.id)
+            return redirect('ventas:detalle_factura', factura_id=factura.id)
     else:
         form = PagoForm()
     return render(request, 'ventas/pago_form.html', {'form': form, 'factura': factura})
 
+@login_required
+@pagina_condicional
+def cuotas_por_vencer(request):
+    # Cuotas sin pagar que vencen en los próximos 7 días o ya vencidas: una búsqueda
+    # por rango en el índice (usuario, fecha_vencimiento, estado).
+    hoy = timezone.localdate()
+    cuotas = (
+        Cuota.objects
+        .filter(usuario=request.user, fecha_vencimiento__lte=hoy + datetime.timedelta(days=7), estado='PENDIENTE')
+        .select_related('factura__cliente')
+        .only('numero', 'fecha_vencimiento', 'importe', 'pagado', 'factura__numero_cuotas',
+              'factura__cliente__nombre', 'factura__cliente__apellido')
+    )
+    cuotas = PaginaKeyset.desde_request(request, cuotas, ('fecha_vencimiento', 'id'), POR_PAGINA)
+    return render(request, 'ventas/cuotas_por_vencer.html', {'cuotas': cuotas, 'pagina': cuotas, 'hoy': hoy})
+
 @login_required
 def vista_comprobante(request, factura_id):
-    factura = get_object_or_404(Factura, id=factura_id, usuario=request.user)
-    return render(request, 'ventas/comprobante.html', {'factura': factura})
\ No newline at end of file
+    factura = _factura_con_detalles(request, factura_id, 'usuario__perfil')
+    return render(request, 'ventas/comprobante.html', {'factura': factura})
+
+@login_required
+def comprobante_pdf(request, factura_id):
+    # Se sirve la copia guardada del PDF; solo se genera si la factura cambió desde la última vez.
+    factura = _factura_con_detalles(request, factura_id, 'usuario__perfil')
+    try:
+        ruta, _ = obtener_pdf(factura)
+    except PdfNoDisponible as e:
+        messages.error(request, str(e))
+        return redirect('ventas:detalle_factura', factura_id=factura.id)
+    return FileResponse(
+        default_storage.open(ruta, 'rb'), content_type='application/pdf', filename=f'factura-{factura.id}.pdf'
+    )
+
+# ==============================================================================
+# IMPORTACIÓN MASIVA DE CLIENTES Y PRODUCTOS
+# ==============================================================================
+@login_required
+def importar_datos(request):
+    informe = None
+    if request.method == 'POST':
+        form = ImportacionForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            informe = {'tipo': form.cleaned_data['tipo'], 'creados': 0, 'con_errores': 0, 'errores': []}
+            try:
+                for lote in importar(archivo, archivo.name, informe['tipo'], request.user):
+                    informe['creados'] += lote.creados
+                    informe['con_errores'] += len(lote.errores)
+                    hueco = MAX_ERRORES_IMPORTACION - len(informe['errores'])
+                    informe['errores'].extend(lote.errores[:max(hueco, 0)])
+            except ArchivoNoValido as e:
+                form.add_error('archivo', str(e))
+                informe = None
+            else:
+                if informe['con_errores']:
+                    messages.warning(request, f'Se importaron {informe["creados"]} {informe["tipo"]}; {informe["con_errores"]} filas tienen errores.')
+                else:
+                    messages.success(request, f'Se importaron {informe["creados"]} {informe["tipo"]} con éxito.')
+    else:
+        form = ImportacionForm(initial={'tipo': request.GET.get('tipo', 'clientes')})
+    return render(request, 'ventas/importar.html', {'form': form, 'informe': informe, 'max_errores': MAX_ERRORES_IMPORTACION})
+
+# ==============================================================================
+# INFORMES (SOLO LEEN LOS RESÚMENES DIARIOS, VER ventas/resumenes.py)
+# ==============================================================================
+@login_required
+def informes(request):
+    dias = request.GET.get('dias', '30')
+    dias = int(dias) if dias.isdigit() and int(dias) in PERIODOS_INFORME else 30
+    hoy = timezone.localdate()
+    desde = hoy - datetime.timedelta(days=dias - 1)
+    resumenes = ResumenDiario.objects.filter(usuario=request.user)
+
+    ventas_por_dia = (
+        resumenes.filter(fecha__gte=desde)
+        .values('fecha')
+        .annotate(facturado=Sum('facturado'), cobrado=Sum('cobrado'))
+        .order_by('-fecha')
+    )
+    productos_top = (
+        ResumenProductoDiario.objects.filter(usuario=request.user, fecha__gte=desde)
+        .values('producto_id', 'producto__nombre')
+        .annotate(unidades=Sum('unidades'), importe=Sum('importe'))
+        .filter(unidades__gt=0)
+        .order_by('-importe')[:10]
+    )
+    # Se agrupa por id: dos clientes con el mismo nombre son filas distintas; el nombre solo se muestra.
+    cobro_por_cliente = list(
+        resumenes.values('cliente_id', 'cliente__nombre', 'cliente__apellido')
+        .annotate(facturado=Sum('facturado'), cobrado=Sum('cobrado'), saldo=Sum('saldo'))
+        .filter(facturado__gt=0)
+        .order_by('-saldo')[:20]
+    )
+    for fila in cobro_por_cliente:
+        fila['tasa'] = fila['cobrado'] * 100 / fila['facturado']
+    # Antigüedad del saldo pendiente según la fecha de emisión de las facturas.
+    antiguedad = resumenes.aggregate(
+        hasta_30=Sum('saldo', filter=Q(fecha__gt=hoy - datetime.timedelta(days=30))),
+        de_31_a_60=Sum('saldo', filter=Q(fecha__gt=hoy - datetime.timedelta(days=60), fecha__lte=hoy - datetime.timedelta(days=30))),
+        de_61_a_90=Sum('saldo', filter=Q(fecha__gt=hoy - datetime.timedelta(days=90), fecha__lte=hoy - datetime.timedelta(days=60))),
+        mas_de_90=Sum('saldo', filter=Q(fecha__lte=hoy - datetime.timedelta(days=90))),
+    )
+
+    contexto = {
+        'dias': dias,
+        'periodos': PERIODOS_INFORME,
+        'ventas_por_dia': ventas_por_dia,
+        'productos_top': productos_top,
+        'cobro_por_cliente': cobro_por_cliente,
+        'antiguedad': antiguedad,
+    }
+    return render(request, 'ventas/informes.html', contexto)
+
+# ==============================================================================
+# BÚSQUEDA DE CLIENTES, PRODUCTOS Y FACTURAS (VER ventas/busqueda.py)
+# ==============================================================================
+# Mismo orden que los listados de cada tipo, para que el cursor use sus índices.
+ORDEN_BUSQUEDA = {'productos': ('id',), 'clientes': ('id',), 'facturas': ('-fecha_emision', 'id')}
+
+@login_required
+@pagina_condicional
+def buscar(request):
+    texto = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo')
+    if tipo not in TIPOS_BUSQUEDA:
+        tipo = 'productos'
+    resultados = buscar_objetos(request.user, texto, tipo)
+    if tipo == 'facturas':
+        resultados = resultados.select_related('cliente').only(
+            'fecha_emision', 'total', 'saldo_pendiente', 'estado', 'cliente__nombre', 'cliente__apellido'
+        )
+    resultados = PaginaKeyset.desde_request(request, resultados, ORDEN_BUSQUEDA[tipo], POR_PAGINA)
+    contexto = {'q': texto, 'tipo': tipo, 'tipos': TIPOS_BUSQUEDA, 'resultados': resultados, 'pagina': resultados}
+    return render(request, 'ventas/buscar.html', contexto)
+
+# Opciones de los selectores con autocompletado de la factura (ver CampoAutocompletar en forms.py).
+AUTOCOMPLETAR = {
+    'clientes': (('nombre', 'apellido', 'id'), ('id', 'nombre', 'apellido')),
+    'productos': (('nombre', 'id'), ('id', 'nombre')),
+}
+MAX_AUTOCOMPLETAR = 20
+
+@login_required
+def autocompletar(request, tipo):
+    if tipo not in AUTOCOMPLETAR:
+        raise Http404
+    orden, campos = AUTOCOMPLETAR[tipo]
+    filas = buscar_objetos(request.user, request.GET.get('q', ''), tipo).order_by(*orden).values_list(*campos)
+    resultados = [{'id': pk, 'texto': ' '.join(resto)} for pk, *resto in filas[:MAX_AUTOCOMPLETAR]]
+    return JsonResponse({'resultados': resultados})
+
+# ==============================================================================
+# MÉTRICAS DE RENDIMIENTO (SOLO STAFF, VER ventas/metricas.py)
+# ==============================================================================
+@staff_member_required
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+def ver_metricas(request):
+    return JsonResponse(metricas.resumen(), json_dumps_params={'indent': 2})